@@ -0,0 +1,208 @@
+"""
+Admissão - Controle de Concorrência e Descarte de Carga por Classe de Rota
+Cada classe (auth, leitura, escrita, relatorio) tem um limite de requisições
+simultâneas, uma fila de espera limitada e um prazo máximo de espera.
+Com a fila cheia (ou o prazo estourado) a requisição falha na hora com 503 e
+Retry-After, em vez de ficar presa atrás das travas do SQLite.
+
+Limites configuráveis por variável de ambiente, no formato limite,fila,prazo_segundos:
+    FLOWFIT_ADMISSAO_AUTH=4,16,5
+    FLOWFIT_ADMISSAO_LEITURA=16,64,10
+    FLOWFIT_ADMISSAO_ESCRITA=4,64,10
+    FLOWFIT_ADMISSAO_RELATORIO=2,8,15
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+# Prioridades dentro da fila (menor = atendida primeiro)
+PRIORIDADE_ALTA = 0     # balcão: registrar pagamento, cadastrar cliente/pagamento
+PRIORIDADE_NORMAL = 1
+PRIORIDADE_BAIXA = 2    # relatórios, histórico do sistema, exportações
+
+# Rotas sem controle (monitoramento não pode ficar preso atrás da carga que mede;
+# o stream de eventos é longo e já tem limite próprio de assinantes; cada item
+# do /api/batch passa pela admissão da sua própria rota)
+ROTAS_LIVRES = ('/api/status', '/api/metrics', '/api/eventos', '/api/batch')
+
+# Prefixos de rotas pesadas (relatórios e exportações)
+ROTAS_RELATORIO = ('/api/relatorios', '/api/analises', '/api/inadimplentes',
+                   '/api/admin', '/api/pagamentos/mes-atual')
+
+_PADROES = {
+    'auth': (4, 16, 5),
+    'leitura': (16, 64, 10),
+    'escrita': (4, 64, 10),
+    'relatorio': (2, 8, 15),
+}
+
+
+class ErroSobrecarga(Exception):
+    """
+    Requisição descartada: fila cheia ou prazo de espera esgotado
+    """
+
+    def __init__(self, classe, motivo, retry_after):
+        super().__init__(f"Servidor ocupado ({classe}: {motivo})")
+        self.classe = classe
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ClasseRota:
+    """
+    Semáforo com fila de espera por prioridade, tamanho máximo e prazo
+    """
+
+    def __init__(self, nome, limite, fila_max, prazo):
+        self.nome = nome
+        self.limite = limite
+        self.fila_max = fila_max
+        self.prazo = prazo
+
+        self.ativos = 0
+        self.atendidas = 0
+        self.descartadas_fila = 0
+        self.descartadas_prazo = 0
+        self.tempo_medio = 0.05  # média móvel do tempo de atendimento (s)
+
+        self._fila = []  # heap de [prioridade, ordem de chegada]
+        self._ordem = itertools.count()
+        self._cond = threading.Condition()
+
+    def _retry_after(self):
+        # Estimativa de quanto tempo a fila atual leva para andar
+        espera = self.tempo_medio * (len(self._fila) + 1) / self.limite
+        return max(1, math.ceil(espera))
+
+    def entrar(self, prioridade=PRIORIDADE_NORMAL):
+        """
+        Ocupa uma vaga, esperando na fila se preciso; levanta ErroSobrecarga se não der
+        """
+        with self._cond:
+            if self.ativos < self.limite and not self._fila:
+                self.ativos += 1
+                return
+
+            # Prioridade baixa só pode ocupar metade da fila: sobra espaço para o balcão
+            fila_max = self.fila_max if prioridade < PRIORIDADE_BAIXA else self.fila_max // 2
+            if len(self._fila) >= fila_max:
+                self.descartadas_fila += 1
+                raise ErroSobrecarga(self.nome, 'fila cheia', self._retry_after())
+
+            senha = [prioridade, next(self._ordem)]
+            heapq.heappush(self._fila, senha)
+            prazo_final = time.monotonic() + self.prazo
+
+            while True:
+                if self._fila[0] is senha and self.ativos < self.limite:
+                    heapq.heappop(self._fila)
+                    self.ativos += 1
+                    # Pode haver mais vagas livres para o próximo da fila
+                    self._cond.notify_all()
+                    return
+
+                restante = prazo_final - time.monotonic()
+                if restante <= 0:
+                    self._fila.remove(senha)
+                    heapq.heapify(self._fila)
+                    self.descartadas_prazo += 1
+                    self._cond.notify_all()
+                    raise ErroSobrecarga(self.nome, 'prazo de espera esgotado', self._retry_after())
+                self._cond.wait(restante)
+
+    def sair(self, duracao):
+        """
+        Libera a vaga e atualiza o tempo médio de atendimento
+        """
+        with self._cond:
+            self.ativos -= 1
+            self.atendidas += 1
+            self.tempo_medio = 0.9 * self.tempo_medio + 0.1 * duracao
+            self._cond.notify_all()
+
+    def situacao(self):
+        with self._cond:
+            return {
+                "classe": self.nome,
+                "limite": self.limite,
+                "fila_max": self.fila_max,
+                "prazo_segundos": self.prazo,
+                "ativos": self.ativos,
+                "na_fila": len(self._fila),
+                "atendidas": self.atendidas,
+                "descartadas_fila": self.descartadas_fila,
+                "descartadas_prazo": self.descartadas_prazo,
+                "tempo_medio_ms": round(self.tempo_medio * 1000, 2)
+            }
+
+
+def _carregar_classes():
+    classes = {}
+    for nome, padrao in _PADROES.items():
+        valor = os.environ.get(f'FLOWFIT_ADMISSAO_{nome.upper()}')
+        limite, fila_max, prazo = padrao
+        if valor:
+            partes = valor.split(',')
+            limite, fila_max, prazo = int(partes[0]), int(partes[1]), float(partes[2])
+        classes[nome] = ClasseRota(nome, limite, fila_max, prazo)
+    return classes
+
+CLASSES = _carregar_classes()
+
+# ==================== CLASSIFICAÇÃO ====================
+
+def classificar(metodo, caminho):
+    """
+    Define (classe, prioridade) de uma requisição; None para rotas sem controle
+    """
+    if metodo == 'OPTIONS' or caminho in ROTAS_LIVRES or not caminho.startswith('/api/'):
+        return None
+
+    if caminho.startswith('/api/auth/'):
+        return 'auth', PRIORIDADE_ALTA
+
+    if caminho.startswith(ROTAS_RELATORIO) or caminho == '/api/historico':
+        return 'relatorio', PRIORIDADE_BAIXA
+
+    if metodo == 'GET':
+        return 'leitura', PRIORIDADE_NORMAL
+
+    # Registrar pagamento e cadastros feitos no balcão passam na frente
+    if caminho.endswith('/pagar') or caminho in ('/api/pagamentos', '/api/clientes'):
+        return 'escrita', PRIORIDADE_ALTA
+    return 'escrita', PRIORIDADE_NORMAL
+
+# ==================== EXPORTAÇÃO ====================
+
+def situacao():
+    """
+    Situação de todas as classes (profundidade da fila e descartes)
+    """
+    return [classe.situacao() for classe in CLASSES.values()]
+
+def exportar_prometheus():
+    """
+    Métricas de admissão no formato do Prometheus
+    """
+    linhas = []
+    metricas = (
+        ('flowfit_admissao_ativos', 'gauge', 'ativos', 'Requisições em atendimento por classe'),
+        ('flowfit_admissao_fila', 'gauge', 'na_fila', 'Requisições esperando na fila por classe'),
+        ('flowfit_admissao_descartes_total', 'counter', None, 'Requisições descartadas com 503'),
+    )
+    estados = situacao()
+    for nome, tipo, campo, ajuda in metricas:
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for estado in estados:
+            if campo:
+                linhas.append(f'{nome}{{classe="{estado["classe"]}"}} {estado[campo]}')
+            else:
+                linhas.append(f'{nome}{{classe="{estado["classe"]}",motivo="fila"}} {estado["descartadas_fila"]}')
+                linhas.append(f'{nome}{{classe="{estado["classe"]}",motivo="prazo"}} {estado["descartadas_prazo"]}')
+    return '\n'.join(linhas) + '\n'
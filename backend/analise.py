@@ -0,0 +1,350 @@
+"""
+Análise - Comportamento de Pagamento e Churn por Coorte
+Calcula, em lote e com NumPy, indicadores de cada cliente sobre todo o histórico
+de pagamentos (atraso médio, taxa em dia, maior sequência de atrasos, risco)
+e a evasão por mês de cadastro. Os resultados ficam nas tabelas scores_clientes
+e coortes_churn e são servidos pelas rotas /api/analises/*
+
+Recalcular manualmente:
+    python analise.py
+Conferir a conversão de datas (dias julianos -> mês) contra o SQLite:
+    python analise.py verificar
+"""
+
+import itertools
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from database import init_db, get_connection_leitura, snapshot_leitura
+import escrita
+
+# Códigos de status usados nos arrays
+STATUS_PENDENTE = 0
+STATUS_PAGO = 1
+STATUS_OUTROS = 2  # cancelado ou desconhecido: fora da análise
+
+# Cliente sem vencimento nos últimos N dias (ou inativo) conta como evadido
+DIAS_CHURN = 60
+
+# Pesos do score de risco (somam 100)
+PESO_TAXA_ATRASO = 40       # fração de pagamentos fora do prazo
+PESO_ATRASO_MEDIO = 30      # atraso médio, saturando em 30 dias
+PESO_SEQUENCIA = 20         # maior sequência de atrasos, saturando em 3 meses
+PESO_EM_ABERTO = 10         # tem pendência vencida agora
+
+# ==================== CARGA DOS DADOS ====================
+
+def _carregar_colunas(cursor, sql, colunas):
+    """
+    Executa a consulta uma única vez e devolve cada coluna como array int64
+    (as datas já vêm do SQLite como número do dia juliano)
+    """
+    cursor.row_factory = None  # tuplas simples são bem mais rápidas que sqlite3.Row
+    cursor.execute(sql)
+    linhas = cursor.fetchall()
+    quantidade = len(linhas)
+    if quantidade == 0:
+        return [np.empty(0, dtype=np.int64) for _ in range(colunas)]
+
+    dados = np.fromiter(itertools.chain.from_iterable(linhas), dtype=np.int64,
+                        count=quantidade * colunas)
+    dados = dados.reshape(quantidade, colunas)
+    return [dados[:, i] for i in range(colunas)]
+
+def _carregar_pagamentos(cursor):
+    # Sem WHERE de propósito: a varredura sequencial é mais rápida que ir pelo
+    # idx_status e buscar linha a linha; cancelados/datas inválidas saem no NumPy
+    colunas = _carregar_colunas(cursor, '''
+        SELECT cliente_id,
+               COALESCE(CAST(julianday(vencimento) AS INTEGER), -1),
+               COALESCE(CAST(julianday(data_pagamento) AS INTEGER), -1),
+               CASE status WHEN 'pago' THEN 1 WHEN 'pendente' THEN 0 ELSE 2 END
+        FROM pagamentos
+    ''', 4)
+    validos = (colunas[3] != STATUS_OUTROS) & (colunas[1] >= 0)
+    return [coluna[validos] for coluna in colunas]
+
+def _carregar_clientes(cursor):
+    return _carregar_colunas(cursor, '''
+        SELECT id,
+               COALESCE(CAST(strftime('%Y', data_cadastro) AS INTEGER) * 12
+                        + CAST(strftime('%m', data_cadastro) AS INTEGER) - 1, -1),
+               COALESCE(ativo, 1)
+        FROM clientes
+    ''', 3)
+
+# ==================== CÁLCULOS ====================
+
+def calcular_scores(cliente_id, vencimento, data_pagamento, status, hoje):
+    """
+    Indicadores por cliente a partir das colunas de pagamentos
+
+    Considera os pagamentos já pagos e os pendentes já vencidos (pendentes ainda
+    dentro do prazo não dizem nada sobre o comportamento do cliente)
+    Retorna um dict de arrays alinhados com "cliente_id"
+    """
+    pago = status == STATUS_PAGO
+    vencido_aberto = (status == STATUS_PENDENTE) & (vencimento < hoje)
+    considerar = pago | vencido_aberto
+
+    cliente_id = cliente_id[considerar]
+    vencimento = vencimento[considerar]
+    pago = pago[considerar]
+    vencido_aberto = vencido_aberto[considerar]
+
+    if cliente_id.size == 0:
+        vazio = np.empty(0)
+        return {"cliente_id": np.empty(0, dtype=np.int64), "total": vazio, "media_atraso": vazio,
+                "taxa_em_dia": vazio, "maior_sequencia": vazio, "em_aberto": vazio, "risco": vazio}
+
+    # Dias de atraso: pago -> data do pagamento; em aberto -> até hoje
+    fim = np.where(pago, data_pagamento[considerar], hoje)
+    atraso = np.maximum(fim - vencimento, 0)
+    atrasado = atraso > 0
+
+    # Ordena por cliente e vencimento para as sequências mensais
+    # (uma chave única cliente|vencimento ordena bem mais rápido que lexsort)
+    deslocamento = vencimento - vencimento.min()
+    bits = max(int(deslocamento.max()).bit_length(), 1)
+    ordem = np.argsort((cliente_id << bits) | deslocamento)
+    cliente_id = cliente_id[ordem]
+    atraso = atraso[ordem]
+    atrasado = atrasado[ordem]
+    vencido_aberto = vencido_aberto[ordem]
+
+    inicio_grupo = np.flatnonzero(np.r_[True, cliente_id[1:] != cliente_id[:-1]])
+    ids = cliente_id[inicio_grupo]
+    grupo = np.repeat(np.arange(ids.size), np.diff(np.r_[inicio_grupo, cliente_id.size]))
+
+    total = np.bincount(grupo, minlength=ids.size).astype(np.float64)
+    media_atraso = np.bincount(grupo, weights=atraso, minlength=ids.size) / total
+    taxa_em_dia = np.bincount(grupo, weights=(~atrasado).astype(np.float64), minlength=ids.size) / total
+    em_aberto = np.bincount(grupo, weights=vencido_aberto.astype(np.float64), minlength=ids.size)
+
+    # Maior sequência de atrasos consecutivos: a soma acumulada de "atrasado" menos
+    # o valor dela no último ponto de quebra (pagamento em dia ou troca de cliente)
+    acumulado = np.cumsum(atrasado)
+    quebra = ~atrasado
+    quebra[inicio_grupo] = True
+    base = np.where(quebra, acumulado - atrasado, 0)
+    base = np.maximum.accumulate(base)
+    sequencia = acumulado - base
+    maior_sequencia = np.maximum.reduceat(sequencia, inicio_grupo).astype(np.float64)
+
+    risco = (PESO_TAXA_ATRASO * (1 - taxa_em_dia)
+             + PESO_ATRASO_MEDIO * np.minimum(media_atraso / 30, 1)
+             + PESO_SEQUENCIA * np.minimum(maior_sequencia / 3, 1)
+             + PESO_EM_ABERTO * (em_aberto > 0))
+
+    return {
+        "cliente_id": ids,
+        "total": total,
+        "media_atraso": media_atraso,
+        "taxa_em_dia": taxa_em_dia,
+        "maior_sequencia": maior_sequencia,
+        "em_aberto": em_aberto,
+        "risco": risco
+    }
+
+def calcular_coortes(clientes, mes_cadastro, ativo, pag_cliente_id, pag_vencimento, hoje):
+    """
+    Evasão por mês de cadastro
+
+    Um cliente é considerado retido se está ativo e teve vencimento nos últimos
+    DIAS_CHURN dias (ou tem vencimento futuro). Permanência = meses entre o cadastro
+    e o último vencimento
+    """
+    if clientes.size == 0:
+        return []
+
+    # Último vencimento de cada cliente (pagos e pendentes)
+    ordem = np.argsort(clientes)
+    clientes_ordenados = clientes[ordem]
+    posicao = np.searchsorted(clientes_ordenados, pag_cliente_id)
+    posicao = np.minimum(posicao, clientes.size - 1)
+    valido = clientes_ordenados[posicao] == pag_cliente_id
+    ultimo = np.full(clientes.size, -1, dtype=np.int64)
+    np.maximum.at(ultimo, posicao[valido], pag_vencimento[valido])
+    ultimo_vencimento = np.empty_like(ultimo)
+    ultimo_vencimento[ordem] = ultimo
+
+    retido = (ativo == 1) & (ultimo_vencimento >= hoje - DIAS_CHURN)
+
+    # Meses de permanência a partir do dia juliano do último vencimento
+    ultimo_mes = np.where(ultimo_vencimento >= 0, _dia_juliano_para_mes(ultimo_vencimento), mes_cadastro)
+    permanencia = np.maximum(ultimo_mes - mes_cadastro, 0)
+
+    com_cadastro = mes_cadastro >= 0
+    coortes, indice = np.unique(mes_cadastro[com_cadastro], return_inverse=True)
+    quantidade = np.bincount(indice, minlength=coortes.size)
+    retidos = np.bincount(indice, weights=retido[com_cadastro].astype(np.float64), minlength=coortes.size)
+    soma_permanencia = np.bincount(indice, weights=permanencia[com_cadastro], minlength=coortes.size)
+
+    resultado = []
+    for mes, qtd, ret, perm in zip(coortes.tolist(), quantidade.tolist(),
+                                   retidos.tolist(), soma_permanencia.tolist()):
+        resultado.append({
+            "mes_cadastro": f'{mes // 12:04d}-{mes % 12 + 1:02d}',
+            "clientes": qtd,
+            "retidos": int(ret),
+            "evadidos": qtd - int(ret),
+            "taxa_churn": round((qtd - ret) / qtd, 4),
+            "permanencia_media_meses": round(perm / qtd, 2)
+        })
+    return resultado
+
+def _dia_juliano_para_mes(dias):
+    """
+    Converte dias julianos (inteiros) em índice de mês (ano * 12 + mês - 1)
+    """
+    # CAST(julianday('1970-01-01') AS INTEGER) = 2440587 (época do datetime64)
+    datas = (dias - EPOCA_JULIANA).astype('datetime64[D]')
+    meses = datas.astype('datetime64[M]').astype(np.int64)
+    return meses + 1970 * 12
+
+def _dia_juliano(data):
+    # Mesmo valor de CAST(julianday(data) AS INTEGER) no SQLite
+    return data.toordinal() + 1721424
+
+EPOCA_JULIANA = _dia_juliano(date(1970, 1, 1))
+
+def verificar_datas():
+    """
+    Confere a conversão contra o próprio SQLite: o dia 1º e o último dia de cada mês
+    (de 1990 a 2060) caem no mês certo. Devolve a lista de datas erradas
+    """
+    conn = sqlite3.connect(':memory:')
+    try:
+        datas = []
+        for ano in range(1990, 2061):
+            for mes in range(1, 13):
+                primeiro = date(ano, mes, 1)
+                datas.append(primeiro)
+                datas.append(date(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1))
+        dias = np.array([conn.execute('SELECT CAST(julianday(?) AS INTEGER)', (d.isoformat(),)).fetchone()[0]
+                         for d in datas], dtype=np.int64)
+    finally:
+        conn.close()
+    meses = _dia_juliano_para_mes(dias)
+    return [d.isoformat() for d, m in zip(datas, meses.tolist()) if m != d.year * 12 + d.month - 1]
+
+# ==================== EXECUÇÃO ====================
+
+def recalcular():
+    """
+    Carrega pagamentos e clientes uma única vez, calcula tudo em lote e grava
+    os resultados nas tabelas scores_clientes e coortes_churn
+    """
+    inicio = time.perf_counter()
+    hoje = _dia_juliano(date.today())
+
+    # Leitura num snapshot consistente, sem travar quem está escrevendo
+    with snapshot_leitura():
+        conn = get_connection_leitura()
+        cursor = conn.cursor()
+        pag_cliente, vencimento, data_pagamento, status = _carregar_pagamentos(cursor)
+        clientes, mes_cadastro, ativo = _carregar_clientes(cursor)
+        conn.close()
+
+    scores = calcular_scores(pag_cliente, vencimento, data_pagamento, status, hoje)
+    coortes = calcular_coortes(clientes, mes_cadastro, ativo, pag_cliente, vencimento, hoje)
+    calculado_em = datetime.now().isoformat(timespec='seconds')
+
+    linhas = zip(
+        scores["cliente_id"].tolist(),
+        scores["total"].astype(np.int64).tolist(),
+        np.round(scores["media_atraso"], 2).tolist(),
+        np.round(scores["taxa_em_dia"], 4).tolist(),
+        scores["maior_sequencia"].astype(np.int64).tolist(),
+        scores["em_aberto"].astype(np.int64).tolist(),
+        np.round(scores["risco"], 1).tolist(),
+        itertools.repeat(calculado_em)
+    )
+
+    # Uma operação da thread escritora (escrita.py): não disputa a trava com o balcão
+    def gravar(conn):
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM scores_clientes')
+        cursor.executemany('''
+            INSERT INTO scores_clientes (cliente_id, pagamentos_avaliados, media_dias_atraso,
+                                         taxa_em_dia, maior_sequencia_atraso, pendencias_vencidas,
+                                         risco, calculado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', linhas)
+        cursor.execute('DELETE FROM coortes_churn')
+        cursor.executemany('''
+            INSERT INTO coortes_churn (mes_cadastro, clientes, retidos, evadidos, taxa_churn,
+                                       permanencia_media_meses, calculado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(c["mes_cadastro"], c["clientes"], c["retidos"], c["evadidos"], c["taxa_churn"],
+               c["permanencia_media_meses"], calculado_em) for c in coortes])
+
+    escrita.executar(gravar)
+
+    return {
+        "success": True,
+        "pagamentos": int(pag_cliente.size),
+        "clientes_avaliados": int(scores["cliente_id"].size),
+        "coortes": len(coortes),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "calculado_em": calculado_em
+    }
+
+# ==================== CONSULTAS ====================
+
+def listar_scores(ordenar='risco', limite=100):
+    """
+    Lista os scores calculados, por padrão dos clientes de maior risco
+    """
+    colunas = {
+        'risco': 's.risco DESC',
+        'atraso': 's.media_dias_atraso DESC',
+        'em_dia': 's.taxa_em_dia ASC',
+        'sequencia': 's.maior_sequencia_atraso DESC',
+        'nome': 'c.nome ASC'
+    }
+    ordem = colunas.get(ordenar, colunas['risco'])
+
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT s.*, c.nome, c.telefone, c.email
+        FROM scores_clientes s
+        JOIN clientes c ON c.id = s.cliente_id
+        WHERE c.ativo = 1
+        ORDER BY {ordem}
+        LIMIT ?
+    ''', (limite,))
+    scores = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return scores
+
+def listar_coortes():
+    """
+    Lista a evasão por mês de cadastro
+    """
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM coortes_churn ORDER BY mes_cadastro')
+    coortes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return coortes
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'verificar':
+        erradas = verificar_datas()
+        if erradas:
+            print(f"✗ {len(erradas)} datas no mês errado (ex: {', '.join(erradas[:5])})")
+            sys.exit(1)
+        print("✓ Dias julianos convertidos para o mês certo (1º e último dia de cada mês)")
+        sys.exit(0)
+
+    init_db()
+    resultado = recalcular()
+    print(f"✓ {resultado['clientes_avaliados']} clientes e {resultado['coortes']} coortes "
+          f"calculados a partir de {resultado['pagamentos']} pagamentos em {resultado['segundos']}s")
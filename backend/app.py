@@ -4,11 +4,26 @@ API REST usando Flask para gerenciamento de pagamentos
 Inclui sistema de autenticação e autorização
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, redirect
+import time
 from flask_cors import CORS
 import database
 import models
 import auth
+import metricas
+import relatorios
+import analise
+import tenants
+import admissao
+import eventos
+import manutencao
+import backup
+import importacao
+import lote
+import estaticos
+import lembretes
+import cache
+import escrita
 
 # Inicializa o Flask
 app = Flask(__name__)
@@ -17,16 +32,89 @@ CORS(app)  # Permite requisições do frontend
 # Inicializa o banco de dados
 database.init_db()
 
+# Agendador de manutenção do banco (ANALYZE, optimize, checkpoint, vacuum)
+manutencao.iniciar()
+
+# ==================== INSTRUMENTAÇÃO ====================
+
+@app.before_request
+def iniciar_metricas():
+    """
+    Marca o início da requisição para as métricas de latência e SQL
+    """
+    metricas.iniciar_requisicao()
+
+@app.before_request
+def controlar_admissao():
+    """
+    Limita requisições simultâneas por classe de rota (auth, leitura, escrita, relatorio)
+    Com a fila cheia responde 503 na hora, com Retry-After
+    """
+    classificacao = admissao.classificar(request.method, request.path)
+    if classificacao is None:
+        return None
+    
+    classe, prioridade = classificacao
+    try:
+        admissao.CLASSES[classe].entrar(prioridade)
+    except admissao.ErroSobrecarga as e:
+        resposta = jsonify({"success": False, "error": "Servidor ocupado, tente novamente em instantes"})
+        resposta.status_code = 503
+        resposta.headers['Retry-After'] = str(e.retry_after)
+        return resposta
+    
+    g.admissao = (classe, time.perf_counter())
+    return None
+
+@app.teardown_request
+def liberar_admissao(erro=None):
+    """
+    Devolve a vaga da classe de rota ao final da requisição (mesmo com erro)
+    """
+    ocupacao = g.pop('admissao', None)
+    if ocupacao:
+        classe, inicio = ocupacao
+        admissao.CLASSES[classe].sair(time.perf_counter() - inicio)
+
+@app.after_request
+def finalizar_metricas(response):
+    """
+    Acumula as métricas da requisição e devolve o cabeçalho Server-Timing
+    """
+    # Usa o padrão da rota (ex: /api/clientes/<int:cliente_id>) para não explodir os rótulos
+    rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+    resumo = metricas.finalizar_requisicao(request.method, rota, response.status_code)
+    if resumo:
+        response.headers['Server-Timing'] = metricas.cabecalho_server_timing(resumo)
+    return response
+
+@app.errorhandler(escrita.ErroBancoOcupado)
+def banco_ocupado(erro):
+    """
+    A escrita não saiu no prazo (fila parada ou trava presa): 503 com Retry-After
+    """
+    resposta = jsonify({"success": False, "error": "Banco ocupado, tente novamente em instantes"})
+    resposta.status_code = 503
+    resposta.headers['Retry-After'] = '2'
+    return resposta
+
+@app.errorhandler(escrita.ErroRestricao)
+def restricao_violada(erro):
+    """
+    Restrição do banco violada numa escrita que não trata o caso: 409
+    """
+    return jsonify({"success": False, "error": f"Dados inválidos: {erro}"}), 409
+
 # ==================== ROTAS DE AUTENTICAÇÃO ====================
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """
     POST /api/auth/login - Faz login no sistema
-    Body: {email, senha}
+    Body: {email, senha, tenant (opcional, unidade da academia)}
     """
     data = request.json
-    resultado = auth.fazer_login(data['email'], data['senha'])
+    resultado = auth.fazer_login(data['email'], data['senha'], data.get('tenant'))
     
     if resultado['success']:
         return jsonify(resultado), 200
@@ -135,13 +223,18 @@ def delete_usuario(usuario_id):
 
 @app.route('/api/clientes', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_clientes():
     """
     GET /api/clientes - Lista todos os clientes
-    Query params: busca (opcional)
+    Query params: busca (opcional), fields (opcional, ex: id,nome,cpf)
     """
+    campos, erro = models.escolher_campos(request.args.get('fields'), 'clientes')
+    if erro:
+        return jsonify({"error": erro}), 400
+    
     busca = request.args.get('busca')
-    clientes = models.listar_clientes(busca)
+    clientes = models.listar_clientes(busca, campos)
     return jsonify(clientes)
 
 @app.route('/api/clientes', methods=['POST'])
@@ -170,6 +263,52 @@ def create_cliente():
     
     return jsonify(resultado)
 
+@app.route('/api/clientes/lookup', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def lookup_cliente():
+    """
+    GET /api/clientes/lookup - Busca rápida por CPF ou telefone (com ou sem formatação)
+    Query params: doc (CPF completo = busca exata; parcial = prefixo)
+    """
+    resultado = models.buscar_por_documento(request.args.get('doc', ''))
+    if not resultado['success']:
+        return jsonify(resultado), 400
+    return jsonify(resultado)
+
+@app.route('/api/clientes/importar', methods=['POST'])
+@auth.requer_admin
+def importar_clientes():
+    """
+    POST /api/clientes/importar - Importa clientes de uma planilha (apenas admin)
+    Form: arquivo (.csv ou .xlsx)
+    Query params: simular=1 (só valida), lote (linhas por transação)
+    """
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({"success": False, "error": "Envie a planilha no campo 'arquivo'"}), 400
+    
+    simular = request.args.get('simular') in ('1', 'true')
+    lote = request.args.get('lote', importacao.TAMANHO_LOTE, type=int)
+    
+    resultado = importacao.importar_clientes(
+        arquivo.stream, arquivo.filename, max(1, min(lote, 10000)), simular
+    )
+    
+    if resultado['importados'] and not simular:
+        auth.registrar_historico(
+            request.usuario['usuario_id'],
+            'IMPORTAR_CLIENTES',
+            f'Importou {resultado["importados"]} clientes de {arquivo.filename}'
+        )
+    
+    # Lista de erros limitada na resposta
+    erros = resultado['erros']
+    resultado['erros'] = erros[:importacao.MAX_ERROS_RESPOSTA]
+    resultado['erros_omitidos'] = max(0, len(erros) - importacao.MAX_ERROS_RESPOSTA)
+    
+    return jsonify(resultado), 200 if resultado['success'] else 400
+
 @app.route('/api/clientes/<int:cliente_id>', methods=['GET'])
 @auth.requer_autenticacao
 def get_cliente(cliente_id):
@@ -229,15 +368,21 @@ def delete_cliente(cliente_id):
 
 @app.route('/api/pagamentos', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_pagamentos():
     """
     GET /api/pagamentos - Lista pagamentos
-    Query params: cliente_id (opcional), status (opcional), mes (opcional)
+    Query params: cliente_id (opcional), status (opcional), mes (opcional),
+                  fields (opcional, ex: id,valor,vencimento,cliente_nome)
     """
+    campos, erro = models.escolher_campos(request.args.get('fields'), 'pagamentos')
+    if erro:
+        return jsonify({"error": erro}), 400
+    
     cliente_id = request.args.get('cliente_id', type=int)
     status = request.args.get('status')
     mes = request.args.get('mes')
-    pagamentos = models.listar_pagamentos(cliente_id, status, mes)
+    pagamentos = models.listar_pagamentos(cliente_id, status, mes, campos)
     return jsonify(pagamentos)
 
 @app.route('/api/pagamentos', methods=['POST'])
@@ -323,6 +468,7 @@ def delete_pagamento(pagamento_id):
 
 @app.route('/api/historico/<int:cliente_id>', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_historico_cliente(cliente_id):
     """
     GET /api/historico/:cliente_id - Obtém histórico de pagamentos de um cliente
@@ -334,6 +480,7 @@ def get_historico_cliente(cliente_id):
 
 @app.route('/api/dashboard', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_dashboard():
     """
     GET /api/dashboard - Obtém estatísticas gerais
@@ -343,24 +490,288 @@ def get_dashboard():
 
 @app.route('/api/inadimplentes', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_inadimplentes():
     """
     GET /api/inadimplentes - Lista clientes inadimplentes
+    Query params: fields (opcional)
     """
-    inadimplentes = models.obter_inadimplentes()
+    campos, erro = models.escolher_campos(request.args.get('fields'), 'inadimplentes')
+    if erro:
+        return jsonify({"error": erro}), 400
+    
+    inadimplentes = models.obter_inadimplentes(campos)
     return jsonify(inadimplentes)
 
 @app.route('/api/pagamentos/mes-atual', methods=['GET'])
 @auth.requer_autenticacao
+@database.snapshot_leitura()
 def get_pagamentos_mes_atual():
     """
     GET /api/pagamentos/mes-atual - Lista clientes que pagaram este mês
+    Query params: fields (opcional)
     """
-    clientes = models.obter_clientes_pagaram_mes()
+    campos, erro = models.escolher_campos(request.args.get('fields'), 'pagaram_mes')
+    if erro:
+        return jsonify({"error": erro}), 400
+    
+    clientes = models.obter_clientes_pagaram_mes(campos)
     return jsonify(clientes)
 
+@app.route('/api/relatorios/receita', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def get_relatorio_receita():
+    """
+    GET /api/relatorios/receita - Série mensal de receita (a partir do rollup)
+    Query params: de (AAAA-MM), ate (AAAA-MM), agrupar (mes | metodo | status)
+    """
+    resultado = relatorios.obter_serie_receita(
+        request.args.get('de'),
+        request.args.get('ate'),
+        request.args.get('agrupar', 'mes')
+    )
+    
+    if resultado['success']:
+        return jsonify(resultado)
+    return jsonify(resultado), 400
+
+@app.route('/api/relatorios/aging', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def get_relatorio_aging():
+    """
+    GET /api/relatorios/aging - Valores em atraso por faixa (0-30, 31-60, 61-90, 90+ dias)
+    Query params: por_cliente=1 (detalha por cliente), cliente_id, formato (json | csv)
+    """
+    resultado = relatorios.obter_aging(
+        request.args.get('por_cliente') in ('1', 'true'),
+        request.args.get('cliente_id', type=int)
+    )
+    
+    if request.args.get('formato') == 'csv':
+        return Response(
+            '\ufeff' + relatorios.aging_csv(resultado),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': f'attachment; filename=aging-{resultado["data_base"]}.csv'}
+        )
+    return jsonify(resultado)
+
+@app.route('/api/analises/clientes', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def get_analise_clientes():
+    """
+    GET /api/analises/clientes - Scores de comportamento de pagamento por cliente
+    Query params: ordenar (risco | atraso | em_dia | sequencia | nome), limite
+    """
+    ordenar = request.args.get('ordenar', 'risco')
+    limite = request.args.get('limite', 100, type=int)
+    scores = analise.listar_scores(ordenar, limite)
+    return jsonify(scores)
+
+@app.route('/api/analises/coortes', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def get_analise_coortes():
+    """
+    GET /api/analises/coortes - Evasão (churn) por mês de cadastro
+    """
+    coortes = analise.listar_coortes()
+    return jsonify(coortes)
+
+@app.route('/api/analises/recalcular', methods=['POST'])
+@auth.requer_admin
+def recalcular_analises():
+    """
+    POST /api/analises/recalcular - Recalcula scores e coortes (apenas admin)
+    """
+    resultado = analise.recalcular()
+    
+    auth.registrar_historico(
+        request.usuario['usuario_id'],
+        'RECALCULAR_ANALISES',
+        f'Recalculou scores de {resultado["clientes_avaliados"]} clientes'
+    )
+    
+    return jsonify(resultado)
+
+@app.route('/api/admin/tenants/estatisticas', methods=['GET'])
+@auth.requer_admin
+def get_estatisticas_tenants():
+    """
+    GET /api/admin/tenants/estatisticas - Estatísticas de todas as unidades
+    (apenas admin da unidade principal)
+    """
+    if request.usuario.get('tenant', database.TENANT_PADRAO) != database.TENANT_PADRAO:
+        return jsonify({"error": "Acesso negado. Apenas administradores da unidade principal."}), 403
+    
+    return jsonify(tenants.estatisticas_consolidadas())
+
+@app.route('/api/admin/admissao', methods=['GET'])
+@auth.requer_admin
+def get_situacao_admissao():
+    """
+    GET /api/admin/admissao - Vagas, fila e descartes por classe de rota (apenas admin)
+    """
+    return jsonify(admissao.situacao())
+
+@app.route('/api/admin/cache', methods=['GET'])
+@auth.requer_admin
+def get_situacao_cache():
+    """
+    GET /api/admin/cache - Itens, acertos e taxa de acerto dos caches em memória (apenas admin)
+    """
+    return jsonify(cache.situacao())
+
+@app.route('/api/admin/escrita', methods=['GET'])
+@auth.requer_admin
+def get_situacao_escrita():
+    """
+    GET /api/admin/escrita - Fila, lotes e tamanho médio do commit em grupo por banco (apenas admin)
+    """
+    return jsonify(escrita.situacao())
+
+@app.route('/api/eventos', methods=['GET'])
+@auth.requer_autenticacao_stream
+def get_eventos():
+    """
+    GET /api/eventos - Stream (Server-Sent Events) de mudanças em pagamentos e clientes
+    e variações das estatísticas do dashboard
+    Query params: token (o EventSource não envia cabeçalhos)
+    Header: Last-Event-ID (enviado pelo navegador ao reconectar)
+    """
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    try:
+        assinatura, perdidos = eventos.broker.assinar(database.tenant_atual(), ultimo_id)
+    except eventos.LimiteAssinantes:
+        resposta = jsonify({"error": "Limite de conexões de eventos atingido"})
+        resposta.status_code = 503
+        resposta.headers['Retry-After'] = '30'
+        return resposta
+    
+    cabecalhos = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if eventos.CHAVE_STREAM_ASYNC in request.environ:
+        # Servidor ASGI (asgi.py): o stream segue no laço de eventos, sem prender esta thread
+        request.environ[eventos.CHAVE_STREAM_ASYNC] = (assinatura, perdidos)
+        return Response(mimetype='text/event-stream', headers=cabecalhos)
+    
+    resposta = Response(
+        eventos.stream(assinatura, perdidos),
+        mimetype='text/event-stream',
+        headers=cabecalhos
+    )
+    # Resposta descartada antes do primeiro envio (cliente saiu): o gerador nem começa
+    # e o finally dele não roda; a assinatura é desfeita no fechamento da resposta
+    resposta.call_on_close(lambda: eventos.broker.cancelar(assinatura))
+    return resposta
+
+@app.route('/api/admin/manutencao', methods=['GET'])
+@auth.requer_admin
+def get_situacao_manutencao():
+    """
+    GET /api/admin/manutencao - Última execução, duração e próxima execução
+    de cada tarefa de manutenção (apenas admin)
+    """
+    return jsonify(manutencao.situacao())
+
+@app.route('/api/admin/manutencao/<tarefa>', methods=['POST'])
+@auth.requer_admin
+def executar_manutencao(tarefa):
+    """
+    POST /api/admin/manutencao/:tarefa - Executa uma tarefa agora (apenas admin)
+    Roda na thread de manutenção: responde 202 na hora; acompanhe em GET /api/admin/manutencao
+    """
+    if tarefa not in manutencao.TAREFAS:
+        return jsonify({"success": False, "error": "Tarefa desconhecida"}), 404
+    
+    if not manutencao.pedir(manutencao.TAREFAS[tarefa]):
+        return jsonify({"success": False, "error": "Tarefa já pedida ou em execução",
+                        **manutencao.TAREFAS[tarefa].situacao()}), 409
+    
+    auth.registrar_historico(
+        request.usuario['usuario_id'],
+        'MANUTENCAO',
+        f'Pediu manutenção: {tarefa}'
+    )
+    
+    return jsonify({"success": True, "message": "Manutenção iniciada",
+                    **manutencao.TAREFAS[tarefa].situacao()}), 202
+
+@app.route('/api/admin/backups', methods=['GET'])
+@auth.requer_admin
+def get_backups():
+    """
+    GET /api/admin/backups - Lista as cópias do banco da unidade (apenas admin)
+    """
+    return jsonify(backup.listar_backups())
+
+@app.route('/api/admin/backups', methods=['POST'])
+@auth.requer_admin
+def criar_backup():
+    """
+    POST /api/admin/backups - Faz uma cópia a quente do banco da unidade (apenas admin)
+    A restauração é feita pela linha de comando: python backup.py restaurar <arquivo>
+    """
+    resultado = backup.criar_backup()
+    
+    if resultado['success']:
+        auth.registrar_historico(
+            request.usuario['usuario_id'],
+            'BACKUP',
+            f'Criou backup: {resultado["arquivo"]}'
+        )
+        return jsonify(resultado), 201
+    
+    return jsonify(resultado), 500
+
+@app.route('/api/admin/backups/<arquivo>/verificar', methods=['POST'])
+@auth.requer_admin
+def verificar_backup(arquivo):
+    """
+    POST /api/admin/backups/:arquivo/verificar - Roda o integrity_check numa cópia (apenas admin)
+    """
+    resultado = backup.verificar_backup(arquivo)
+    
+    if resultado.get('error') == 'Backup não encontrado':
+        return jsonify(resultado), 404
+    return jsonify(resultado)
+
+@app.route('/api/admin/lembretes', methods=['GET'])
+@auth.requer_admin
+def get_lembretes():
+    """
+    GET /api/admin/lembretes - Último envio de lembretes e registro do dia (apenas admin)
+    """
+    return jsonify(lembretes.situacao(database.tenant_atual()))
+
+@app.route('/api/admin/lembretes', methods=['POST'])
+@auth.requer_admin
+def enviar_lembretes():
+    """
+    POST /api/admin/lembretes - Envia os lembretes de pagamento do dia (apenas admin)
+    Body (opcional): {simular: true} monta as mensagens sem enviar
+    O envio roda em segundo plano; acompanhe por GET /api/admin/lembretes
+    """
+    data = request.get_json(silent=True) or {}
+
+    if data.get('simular'):
+        resultado = lembretes.enviar_lembretes(simular=True)
+        return jsonify(resultado), 200 if resultado['success'] else 400
+
+    if not lembretes.iniciar_envio(database.tenant_atual()):
+        return jsonify({"success": False, "error": "Já existe um envio de lembretes em andamento"}), 409
+
+    auth.registrar_historico(
+        request.usuario['usuario_id'],
+        'ENVIAR_LEMBRETES',
+        'Disparou o envio de lembretes de pagamento'
+    )
+    return jsonify({"success": True, "message": "Envio de lembretes iniciado"}), 202
+
 @app.route('/api/historico', methods=['GET'])
 @auth.requer_admin
+@database.snapshot_leitura()
 def get_historico_sistema():
     """
     GET /api/historico - Obtém histórico de ações do sistema (apenas admin)
@@ -369,6 +780,32 @@ def get_historico_sistema():
     historico = auth.obter_historico(limite)
     return jsonify(historico)
 
+# ==================== FEED DE MUDANÇAS ====================
+
+@app.route('/api/mudancas', methods=['GET'])
+@auth.requer_autenticacao
+@database.snapshot_leitura()
+def get_mudancas():
+    """
+    GET /api/mudancas - Clientes, pagamentos (e usuários) alterados ou removidos desde um seq
+    Query params: desde (último "ate" recebido; 0 = tudo), tabelas (padrão clientes,pagamentos;
+                  usuarios só para admin), limite (padrão 1000, máximo 5000)
+    """
+    desde = request.args.get('desde', 0, type=int)
+    limite = request.args.get('limite', models.LIMITE_MUDANCAS, type=int)
+    if desde < 0 or not 1 <= limite <= models.MAX_LIMITE_MUDANCAS:
+        return jsonify({"error": f"desde >= 0 e limite entre 1 e {models.MAX_LIMITE_MUDANCAS}"}), 400
+    
+    tabelas = [t.strip() for t in request.args.get('tabelas', 'clientes,pagamentos').split(',') if t.strip()]
+    invalidas = [t for t in tabelas if t not in models.CAMPOS_MUDANCAS]
+    if invalidas or not tabelas:
+        return jsonify({"error": f"Tabelas inválidas: {', '.join(invalidas) or '(nenhuma)'}. "
+                                 f"Permitidas: {', '.join(models.CAMPOS_MUDANCAS)}"}), 400
+    if 'usuarios' in tabelas and request.usuario.get('tipo') != 'admin':
+        return jsonify({"error": "Acesso negado. Apenas administradores."}), 403
+    
+    return jsonify(models.obter_mudancas(desde, tuple(dict.fromkeys(tabelas)), limite))
+
 # ==================== ROTA DE TESTE ====================
 
 @app.route('/api/status', methods=['GET'])
@@ -381,13 +818,62 @@ def status():
         "mensagem": "API funcionando corretamente"
     })
 
+@app.route('/api/batch', methods=['POST'])
+@auth.requer_autenticacao
+def executar_lote():
+    """
+    POST /api/batch - Executa várias chamadas da API numa única requisição
+    Body: {requisicoes: [{id (opcional), method, path, body (opcional)}]}
+    GETs seguidos rodam em paralelo; demais métodos rodam em ordem
+    Retorna: {success, respostas: [{id, status, body}]}
+    """
+    data = request.get_json(silent=True)
+    itens = data.get('requisicoes') if isinstance(data, dict) else data
+    
+    erro = lote.validar_itens(itens)
+    if erro:
+        return jsonify({"success": False, "error": erro}), 400
+    
+    respostas = lote.executar_lote(app, itens, request.usuario)
+    return jsonify({"success": True, "respostas": respostas})
+
+@app.route('/api/metrics', methods=['GET'])
+@auth.requer_admin_ou_coletor
+def get_metricas():
+    """
+    GET /api/metrics - Exporta métricas de latência e SQL no formato Prometheus
+    (admin logado ou o token do coletor, FLOWFIT_METRICS_TOKEN)
+    """
+    texto = metricas.exportar_prometheus() + admissao.exportar_prometheus() + cache.exportar_prometheus()
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+# ==================== FRONTEND ====================
+
+@app.route('/', methods=['GET'])
+def raiz():
+    """
+    GET / - Abre a tela de login
+    """
+    return redirect('/login.html')
+
+@app.route('/<path:arquivo>', methods=['GET'])
+def servir_frontend(arquivo):
+    """
+    GET /<arquivo> - Páginas e assets do frontend (mesma origem da API)
+    Com o build (python estaticos.py): nomes com hash, cache longo e gzip/br
+    """
+    resposta = None if arquivo.startswith('api/') else estaticos.resposta_arquivo(arquivo)
+    if resposta is None:
+        return jsonify({"error": "Não encontrado"}), 404
+    return resposta
+
 # ==================== INICIALIZAÇÃO ====================
 
 if __name__ == '__main__':
     print("\n" + "="*50)
     print("🚀 SISTEMA DE GERENCIAMENTO DE PAGAMENTOS")
     print("="*50)
-    print("📊 Frontend: Abra o arquivo frontend/login.html no navegador")
+    print("📊 Frontend: http://localhost:5000/")
     print("🔌 API: http://localhost:5000/api")
     print("="*50)
     print("👤 Usuário padrão:")
@@ -0,0 +1,454 @@
+"""
+ASGI - Entrada Assíncrona da API (as mesmas rotas do app.py)
+No servidor WSGI com threads, cada conexão parada (keep-alive ocioso, cliente lento
+enviando o corpo, stream de eventos) prende uma thread. Aqui as conexões ficam no
+laço de eventos do asyncio e só o trabalho de verdade vai para um pool limitado:
+
+    conexão ociosa, upload lento, SSE esperando evento  -> corrotina (sem thread)
+    requisição com o corpo já recebido                  -> app.py (Flask) no pool
+
+Não há uma segunda cópia das rotas: a requisição é entregue ao app Flask como WSGI
+dentro do pool, com os mesmos decoradores de auth, models, admissão e métricas.
+A única diferença é o /api/eventos: a rota autentica e assina no pool como sempre,
+e os eventos seguem pelo laço (eventos.stream_async), sem thread por navegador.
+
+Uso:
+    python asgi.py --porta 5000              servidor embutido (só biblioteca padrão)
+    uvicorn asgi:application --port 5000     ou qualquer servidor ASGI instalado
+
+Configuração:
+    FLOWFIT_ASGI_THREADS=16    threads que executam as rotas (e o SQLite)
+    FLOWFIT_ASGI_FILA=1000     requisições esperando thread antes de responder 503
+    FLOWFIT_ASGI_OCIOSO=75     segundos que o servidor embutido mantém um keep-alive parado
+"""
+
+import argparse
+import asyncio
+import http
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+import eventos
+from app import app as app_flask
+
+THREADS = int(os.environ.get('FLOWFIT_ASGI_THREADS', 16))
+MAX_FILA = int(os.environ.get('FLOWFIT_ASGI_FILA', 1000))
+TEMPO_OCIOSO = float(os.environ.get('FLOWFIT_ASGI_OCIOSO', 75))
+
+# Corpo da requisição acima disso vai para um arquivo temporário
+CORPO_EM_MEMORIA = 1024 * 1024
+
+# A resposta é lida na mesma ida ao pool até esse tamanho; o resto (downloads) vem em partes
+BLOCO_RESPOSTA = 256 * 1024
+
+# Tamanho máximo da linha de requisição + cabeçalhos no servidor embutido
+LIMITE_CABECALHO = 64 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi')
+_pendentes = 0  # requisições no pool (rodando ou na fila); só o laço de eventos mexe
+
+# ==================== PONTE ASGI -> WSGI ====================
+
+def _montar_environ(scope, corpo, tamanho):
+    """
+    environ WSGI equivalente ao scope ASGI (o corpo já foi todo recebido)
+    """
+    servidor = scope.get('server') or ('localhost', 80)
+    cliente = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(servidor[0]),
+        'SERVER_PORT': str(servidor[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': str(cliente[0]),
+        'REMOTE_PORT': str(cliente[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': corpo,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        eventos.CHAVE_STREAM_ASYNC: None,
+    }
+    for nome, valor in scope.get('headers', []):
+        nome = nome.decode('latin-1').upper().replace('-', '_')
+        if nome == 'CONTENT_LENGTH':
+            continue
+        chave = nome if nome == 'CONTENT_TYPE' else 'HTTP_' + nome
+        valor = valor.decode('latin-1')
+        environ[chave] = f'{environ[chave]},{valor}' if chave in environ else valor
+    environ['CONTENT_LENGTH'] = str(tamanho)
+    return environ
+
+def _fechar(resultado):
+    if hasattr(resultado, 'close'):
+        resultado.close()
+
+def _executar_wsgi(environ):
+    """
+    Roda a requisição no app Flask (numa thread do pool)
+    Devolve (status, cabeçalhos, partes já lidas do corpo, (resultado, iterador) do resto ou None)
+    """
+    inicio = {}
+
+    def start_response(status, cabecalhos, exc_info=None):
+        inicio['status'] = int(status.split(' ', 1)[0])
+        inicio['cabecalhos'] = cabecalhos
+
+    resultado = app_flask(environ, start_response)
+    try:
+        iterador = iter(resultado)
+        partes, lidos = [], 0
+        for parte in iterador:
+            if parte:
+                partes.append(parte)
+                lidos += len(parte)
+            if lidos >= BLOCO_RESPOSTA:
+                return inicio['status'], inicio['cabecalhos'], partes, (resultado, iterador)
+    except BaseException:
+        _fechar(resultado)
+        raise
+    _fechar(resultado)
+    return inicio['status'], inicio['cabecalhos'], partes, None
+
+def _cabecalhos_asgi(cabecalhos, sem=()):
+    return [(nome.lower().encode('latin-1'), valor.encode('latin-1'))
+            for nome, valor in cabecalhos if nome.lower() not in sem]
+
+async def _receber_corpo(receive):
+    """
+    Junta o corpo da requisição; None se o cliente desconectou antes de terminar
+    """
+    corpo = tempfile.SpooledTemporaryFile(max_size=CORPO_EM_MEMORIA)
+    tamanho = 0
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'http.disconnect':
+            corpo.close()
+            return None, 0
+        parte = mensagem.get('body', b'')
+        corpo.write(parte)
+        tamanho += len(parte)
+        if not mensagem.get('more_body'):
+            corpo.seek(0)
+            return corpo, tamanho
+
+async def _responder_json(send, status, dados, cabecalhos=()):
+    corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(corpo)).encode()),
+        *cabecalhos]})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+async def _atender(scope, receive, send):
+    global _pendentes
+    corpo, tamanho = await _receber_corpo(receive)
+    if corpo is None:
+        return
+
+    # Pool e fila cheios: responde na hora em vez de acumular conexões esperando
+    if _pendentes >= THREADS + MAX_FILA:
+        corpo.close()
+        await _responder_json(send, 503, {"success": False,
+                                          "error": "Servidor ocupado, tente novamente em instantes"},
+                              [(b'retry-after', b'1')])
+        return
+
+    environ = _montar_environ(scope, corpo, tamanho)
+    loop = asyncio.get_running_loop()
+    _pendentes += 1
+    try:
+        status, cabecalhos, partes, resto = await loop.run_in_executor(_executor, _executar_wsgi, environ)
+    finally:
+        _pendentes -= 1
+    corpo.close()
+
+    assinatura = environ[eventos.CHAVE_STREAM_ASYNC]
+    if assinatura is not None:
+        await _enviar_eventos(cabecalhos, assinatura, receive, send)
+        return
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': _cabecalhos_asgi(cabecalhos)})
+    if resto is None:
+        await send({'type': 'http.response.body', 'body': b''.join(partes)})
+        return
+
+    # Resposta grande (ex: download de backup): o resto é lido em partes, uma ida ao pool por parte
+    resultado, iterador = resto
+    try:
+        await send({'type': 'http.response.body', 'body': b''.join(partes), 'more_body': True})
+        while True:
+            parte = await loop.run_in_executor(_executor, next, iterador, None)
+            if parte is None:
+                break
+            if parte:
+                await send({'type': 'http.response.body', 'body': parte, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        _fechar(resultado)
+
+async def _enviar_eventos(cabecalhos, dados, receive, send):
+    """
+    Stream de /api/eventos pelo laço: nenhuma thread fica presa esperando evento
+    """
+    assinatura, perdidos = dados
+    vigia = None
+    stream = None
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': _cabecalhos_asgi(cabecalhos, sem=('content-length',))})
+
+        async def vigiar_desconexao():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            # Acorda o stream, que encerra
+            eventos.broker.cancelar(assinatura)
+
+        vigia = asyncio.ensure_future(vigiar_desconexao())
+        stream = eventos.stream_async(assinatura, perdidos)
+        async for texto in stream:
+            await send({'type': 'http.response.body', 'body': texto.encode('utf-8'), 'more_body': True})
+        if not vigia.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        pass  # navegador fechou a conexão no meio de um envio
+    finally:
+        if vigia is not None:
+            vigia.cancel()
+        if stream is not None:
+            await stream.aclose()
+        # O stream pode nem ter começado (ex: falha ao enviar os cabeçalhos)
+        eventos.broker.cancelar(assinatura)
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """
+    Aplicação ASGI 3 (HTTP e lifespan)
+    """
+    if scope['type'] == 'http':
+        await _atender(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+    else:
+        raise NotImplementedError(f"Tipo de conexão não suportado: {scope['type']}")
+
+# ==================== SERVIDOR EMBUTIDO ====================
+
+class _Resposta:
+    """
+    Escreve no socket as mensagens http.response.* de uma requisição (HTTP/1.1)
+    """
+
+    def __init__(self, escritor, manter, cabeca):
+        self.escritor = escritor
+        self.manter = manter  # keep-alive depois desta resposta
+        self.cabeca = cabeca  # HEAD: só os cabeçalhos
+        self.inicio = None
+        self.enviada = False
+        self.terminou = False
+        self.em_partes = False
+        self.fechada = asyncio.Event()
+
+    async def send(self, mensagem):
+        if self.fechada.is_set():
+            raise ConnectionResetError('Conexão encerrada pelo cliente')
+        if mensagem['type'] == 'http.response.start':
+            self.inicio = mensagem
+            return
+
+        corpo = mensagem.get('body', b'')
+        mais = mensagem.get('more_body', False)
+        dados = b''
+        if not self.enviada:
+            dados = self._cabecalho(len(corpo), mais)
+            self.enviada = True
+        if not self.cabeca:
+            if self.em_partes:
+                if corpo:
+                    dados += b'%x\r\n%s\r\n' % (len(corpo), corpo)
+                if not mais:
+                    dados += b'0\r\n\r\n'
+            else:
+                dados += corpo
+        self.terminou = not mais
+        try:
+            self.escritor.write(dados)
+            await self.escritor.drain()
+        except OSError:
+            self.fechada.set()
+            raise
+
+    def _cabecalho(self, tamanho, mais):
+        status = self.inicio['status']
+        cabecalhos = list(self.inicio.get('headers', []))
+        nomes = {nome.lower() for nome, _ in cabecalhos}
+        # Sem Content-Length e com mais partes: chunked (em HTTP/1.0 o fim da conexão marca o fim)
+        if b'content-length' not in nomes:
+            if not mais:
+                cabecalhos.append((b'content-length', str(tamanho).encode()))
+            elif self.manter:
+                cabecalhos.append((b'transfer-encoding', b'chunked'))
+                self.em_partes = True
+        if not self.manter:
+            cabecalhos.append((b'connection', b'close'))
+        try:
+            frase = http.HTTPStatus(status).phrase
+        except ValueError:
+            frase = ''
+        linhas = [f'HTTP/1.1 {status} {frase}'.encode('latin-1')]
+        linhas += [nome + b': ' + valor for nome, valor in cabecalhos]
+        return b'\r\n'.join(linhas) + b'\r\n\r\n'
+
+async def _erro(escritor, status):
+    escritor.write(f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n'
+                   'Content-Length: 0\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+    try:
+        await escritor.drain()
+    except OSError:
+        pass
+
+async def _atender_conexao(leitor, escritor):
+    """
+    Uma conexão TCP: lê as requisições em sequência (keep-alive) e chama a aplicação
+    Parada entre requisições, a conexão custa só esta corrotina
+    """
+    servidor = escritor.get_extra_info('sockname')[:2]
+    cliente = escritor.get_extra_info('peername')[:2]
+    try:
+        while True:
+            try:
+                bruto = await asyncio.wait_for(leitor.readuntil(b'\r\n\r\n'), TEMPO_OCIOSO)
+            except asyncio.LimitOverrunError:
+                await _erro(escritor, 431)
+                return
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, OSError):
+                return
+
+            linhas = bruto.decode('latin-1').split('\r\n')
+            try:
+                metodo, alvo, versao = linhas[0].split(' ')
+            except ValueError:
+                await _erro(escritor, 400)
+                return
+
+            cabecalhos = []
+            for linha in linhas[1:]:
+                if linha:
+                    nome, _, valor = linha.partition(':')
+                    cabecalhos.append((nome.strip().lower().encode('latin-1'), valor.strip().encode('latin-1')))
+            indice = dict(cabecalhos)
+            if b'chunked' in indice.get(b'transfer-encoding', b'').lower():
+                await _erro(escritor, 411)
+                return
+            try:
+                restante = int(indice.get(b'content-length', 0))
+            except ValueError:
+                await _erro(escritor, 400)
+                return
+
+            manter = versao == 'HTTP/1.1' and indice.get(b'connection', b'').lower() != b'close'
+            caminho, _, consulta = alvo.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0', 'spec_version': '2.3'},
+                'http_version': versao.partition('/')[2] or '1.1',
+                'method': metodo.upper(),
+                'scheme': 'http',
+                'path': unquote(caminho),
+                'raw_path': caminho.encode('latin-1'),
+                'query_string': consulta.encode('latin-1'),
+                'root_path': '',
+                'headers': cabecalhos,
+                'client': cliente,
+                'server': servidor,
+            }
+            resposta = _Resposta(escritor, manter, metodo.upper() == 'HEAD')
+            pedido = True  # a primeira chamada a receive() sempre entrega um http.request
+
+            async def receive():
+                nonlocal restante, pedido
+                if pedido:
+                    pedido = False
+                    if restante == 0:
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                if restante > 0:
+                    try:
+                        parte = await leitor.read(min(restante, 64 * 1024))
+                    except OSError:
+                        parte = b''
+                    if not parte:
+                        resposta.fechada.set()
+                        return {'type': 'http.disconnect'}
+                    restante -= len(parte)
+                    return {'type': 'http.request', 'body': parte, 'more_body': restante > 0}
+                # Corpo já entregue: só resta avisar quando a conexão cair
+                await resposta.fechada.wait()
+                return {'type': 'http.disconnect'}
+
+            try:
+                await application(scope, receive, resposta.send)
+            except OSError:
+                return
+            except Exception as e:
+                print(f"✗ Erro na requisição {metodo} {caminho}: {e}")
+                if not resposta.enviada:
+                    await _erro(escritor, 500)
+                return
+
+            if not resposta.terminou:
+                if not resposta.enviada:
+                    await _erro(escritor, 500)
+                return
+            # Corpo não lido pela aplicação ainda está no socket: não dá para reaproveitar
+            if not resposta.manter or restante > 0:
+                return
+    finally:
+        escritor.close()
+
+async def servir(host='0.0.0.0', porta=5000):
+    """
+    Sobe o servidor HTTP/1.1 embutido com a aplicação ASGI
+    """
+    servidor = await asyncio.start_server(_atender_conexao, host, porta,
+                                          limit=LIMITE_CABECALHO, backlog=2048)
+    async with servidor:
+        await servidor.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor ASGI da API (as mesmas rotas do app.py)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=5000)
+    args = parser.parse_args()
+
+    print("\n" + "="*50)
+    print("🚀 SISTEMA DE GERENCIAMENTO DE PAGAMENTOS (ASGI)")
+    print("="*50)
+    print(f"📊 Frontend: http://localhost:{args.porta}/")
+    print(f"🔌 API: http://localhost:{args.porta}/api")
+    print(f"🧵 Threads para as rotas: {THREADS}")
+    print("="*50 + "\n")
+
+    try:
+        asyncio.run(servir(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _executor.shutdown(wait=False, cancel_futures=True)
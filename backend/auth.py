@@ -3,16 +3,23 @@ Auth - Sistema de Autenticação e Autorização
 Gerencia login, logout e controle de acesso
 """
 
-from database import get_connection
+from database import get_connection, get_connection_leitura
+import database
+import escrita
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
+import hmac
+import os
 from functools import wraps
 from flask import request, jsonify
 
 # Chave secreta para JWT (em produção, use variável de ambiente)
 SECRET_KEY = 'sua-chave-secreta-aqui-mude-em-producao'
 
+# Token fixo do coletor do Prometheus para GET /api/metrics (vazio: só admin logado)
+TOKEN_METRICAS = os.environ.get('FLOWFIT_METRICS_TOKEN', '')
+
 # ==================== FUNÇÕES DE USUÁRIO ====================
 
 def criar_usuario(nome, email, senha, tipo='operador'):
@@ -20,23 +27,21 @@ def criar_usuario(nome, email, senha, tipo='operador'):
     Cria um novo usuário no sistema
     Tipos: 'admin' ou 'operador'
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    # O hash (lento de propósito) é calculado fora da fila de escrita
+    senha_hash = generate_password_hash(senha)
     
-    try:
-        senha_hash = generate_password_hash(senha)
-        cursor.execute('''
+    def inserir(conn):
+        cursor = conn.execute('''
             INSERT INTO usuarios (nome, email, senha_hash, tipo)
             VALUES (?, ?, ?, ?)
         ''', (nome, email, senha_hash, tipo))
-        
-        conn.commit()
-        usuario_id = cursor.lastrowid
-        conn.close()
-        return {"success": True, "id": usuario_id}
-    except Exception as e:
-        conn.close()
-        return {"success": False, "error": "Email já cadastrado"}
+        return cursor.lastrowid
+    
+    try:
+        usuario_id = escrita.executar(inserir)
+    except escrita.ErroRestricao as e:
+        return {"success": False, "error": escrita.mensagem_restricao(e, 'usuarios.email', "Email já cadastrado")}
+    return {"success": True, "id": usuario_id}
 
 def listar_usuarios():
     """
@@ -78,49 +83,55 @@ def atualizar_usuario(usuario_id, nome, email, tipo, senha=None):
     """
     Atualiza dados de um usuário
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    senha_hash = generate_password_hash(senha) if senha else None
     
-    try:
-        if senha:
-            senha_hash = generate_password_hash(senha)
-            cursor.execute('''
+    def atualizar(conn):
+        if senha_hash:
+            conn.execute('''
                 UPDATE usuarios 
                 SET nome = ?, email = ?, tipo = ?, senha_hash = ?
                 WHERE id = ?
             ''', (nome, email, tipo, senha_hash, usuario_id))
         else:
-            cursor.execute('''
+            conn.execute('''
                 UPDATE usuarios 
                 SET nome = ?, email = ?, tipo = ?
                 WHERE id = ?
             ''', (nome, email, tipo, usuario_id))
-        
-        conn.commit()
-        conn.close()
-        return {"success": True}
-    except Exception as e:
-        conn.close()
-        return {"success": False, "error": "Email já cadastrado para outro usuário"}
+    
+    try:
+        escrita.executar(atualizar)
+    except escrita.ErroRestricao as e:
+        return {"success": False, "error": escrita.mensagem_restricao(
+            e, 'usuarios.email', "Email já cadastrado para outro usuário")}
+    return {"success": True}
 
 def deletar_usuario(usuario_id):
     """
     Desativa um usuário (soft delete)
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('UPDATE usuarios SET ativo = 0 WHERE id = ?', (usuario_id,))
-    conn.commit()
-    conn.close()
+    escrita.executar(lambda conn: conn.execute('UPDATE usuarios SET ativo = 0 WHERE id = ?',
+                                               (usuario_id,)))
     
     return {"success": True}
 
 # ==================== AUTENTICAÇÃO ====================
 
-def fazer_login(email, senha):
+def fazer_login(email, senha, tenant=None):
     """
     Autentica um usuário e retorna token JWT
+    tenant: unidade (academia) em que o usuário está cadastrado; padrão a principal
+    """
+    tenant = tenant or database.TENANT_PADRAO
+    if not database.tenant_valido(tenant):
+        return {"success": False, "error": "Unidade não encontrada"}
+    
+    with database.usar_tenant(tenant):
+        return _autenticar(email, senha, tenant)
+
+def _autenticar(email, senha, tenant):
+    """
+    Confere email/senha no banco da unidade atual
     """
     conn = get_connection()
     cursor = conn.cursor()
@@ -132,34 +143,33 @@ def fazer_login(email, senha):
     ''', (email,))
     
     usuario = cursor.fetchone()
+    conn.close()
     
     if not usuario:
-        conn.close()
         return {"success": False, "error": "Usuário não encontrado"}
     
     # Verifica a senha
     if not check_password_hash(usuario['senha_hash'], senha):
-        conn.close()
         return {"success": False, "error": "Senha incorreta"}
     
-    # Atualiza último acesso
-    cursor.execute('''
-        UPDATE usuarios 
-        SET ultimo_acesso = CURRENT_TIMESTAMP 
-        WHERE id = ?
-    ''', (usuario['id'],))
-    conn.commit()
+    def registrar_acesso(conn):
+        # Atualiza último acesso
+        conn.execute('''
+            UPDATE usuarios 
+            SET ultimo_acesso = CURRENT_TIMESTAMP 
+            WHERE id = ?
+        ''', (usuario['id'],))
+        
+        # Registra no histórico
+        conn.execute('''
+            INSERT INTO historico (usuario_id, acao, descricao)
+            VALUES (?, ?, ?)
+        ''', (usuario['id'], 'LOGIN', f'Usuário {usuario["nome"]} fez login'))
     
-    # Registra no histórico
-    cursor.execute('''
-        INSERT INTO historico (usuario_id, acao, descricao)
-        VALUES (?, ?, ?)
-    ''', (usuario['id'], 'LOGIN', f'Usuário {usuario["nome"]} fez login'))
-    conn.commit()
-    conn.close()
+    escrita.executar(registrar_acesso)
     
     # Gera token JWT
-    token = gerar_token(usuario['id'], usuario['email'], usuario['tipo'])
+    token = gerar_token(usuario['id'], usuario['email'], usuario['tipo'], tenant)
     
     return {
         "success": True,
@@ -168,18 +178,21 @@ def fazer_login(email, senha):
             "id": usuario['id'],
             "nome": usuario['nome'],
             "email": usuario['email'],
-            "tipo": usuario['tipo']
+            "tipo": usuario['tipo'],
+            "tenant": tenant
         }
     }
 
-def gerar_token(usuario_id, email, tipo):
+def gerar_token(usuario_id, email, tipo, tenant=None):
     """
     Gera um token JWT para o usuário
+    O token carrega a unidade (tenant), que define o banco usado nas requisições
     """
     payload = {
         'usuario_id': usuario_id,
         'email': email,
         'tipo': tipo,
+        'tenant': tenant or database.TENANT_PADRAO,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=8)  # Token expira em 8 horas
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
@@ -198,22 +211,36 @@ def verificar_token(token):
 
 # ==================== DECORADOR DE AUTENTICAÇÃO ====================
 
+# Chave do environ em que o /api/batch entrega aos itens o usuário já autenticado
+# (não pode vir de fora: cabeçalhos HTTP viram chaves HTTP_* no environ)
+CHAVE_USUARIO_LOTE = 'flowfit.usuario'
+
+def verificar_requisicao():
+    """
+    Verifica o token do cabeçalho Authorization da requisição atual
+    (itens de um lote chegam com o usuário verificado uma única vez)
+    """
+    usuario = request.environ.get(CHAVE_USUARIO_LOTE)
+    if usuario:
+        return {"success": True, "payload": usuario}
+    
+    token = request.headers.get('Authorization')
+    if not token:
+        return {"success": False, "error": "Token não fornecido"}
+    
+    # Remove 'Bearer ' do token se existir
+    if token.startswith('Bearer '):
+        token = token[7:]
+    
+    return verificar_token(token)
+
 def requer_autenticacao(f):
     """
     Decorador que verifica se o usuário está autenticado
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({"error": "Token não fornecido"}), 401
-        
-        # Remove 'Bearer ' do token se existir
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        resultado = verificar_token(token)
+        resultado = verificar_requisicao()
         
         if not resultado['success']:
             return jsonify({"error": resultado['error']}), 401
@@ -221,7 +248,26 @@ def requer_autenticacao(f):
         # Adiciona dados do usuário à requisição
         request.usuario = resultado['payload']
         
-        return f(*args, **kwargs)
+        # Direciona o acesso ao banco para a unidade do token
+        tenant = request.usuario.get('tenant', database.TENANT_PADRAO)
+        if not database.tenant_valido(tenant):
+            return jsonify({"error": "Unidade não encontrada"}), 401
+        
+        with database.usar_tenant(tenant):
+            return f(*args, **kwargs)
+    
+    return decorated
+
+def requer_autenticacao_stream(f):
+    """
+    Igual a requer_autenticacao, mas também aceita o token em ?token=
+    (o EventSource do navegador não permite enviar cabeçalhos)
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not request.headers.get('Authorization') and request.args.get('token'):
+            request.environ['HTTP_AUTHORIZATION'] = 'Bearer ' + request.args['token']
+        return requer_autenticacao(f)(*args, **kwargs)
     
     return decorated
 
@@ -231,15 +277,7 @@ def requer_admin(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({"error": "Token não fornecido"}), 401
-        
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        resultado = verificar_token(token)
+        resultado = verificar_requisicao()
         
         if not resultado['success']:
             return jsonify({"error": resultado['error']}), 401
@@ -249,7 +287,28 @@ def requer_admin(f):
         
         request.usuario = resultado['payload']
         
-        return f(*args, **kwargs)
+        tenant = request.usuario.get('tenant', database.TENANT_PADRAO)
+        if not database.tenant_valido(tenant):
+            return jsonify({"error": "Unidade não encontrada"}), 401
+        
+        with database.usar_tenant(tenant):
+            return f(*args, **kwargs)
+    
+    return decorated
+
+def requer_admin_ou_coletor(f):
+    """
+    Como requer_admin, mas aceita também 'Authorization: Bearer <FLOWFIT_METRICS_TOKEN>'
+    (o coletor de métricas não faz login)
+    """
+    so_admin = requer_admin(f)
+    
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        cabecalho = request.headers.get('Authorization', '')
+        if TOKEN_METRICAS and hmac.compare_digest(cabecalho.encode(), f'Bearer {TOKEN_METRICAS}'.encode()):
+            return f(*args, **kwargs)
+        return so_admin(*args, **kwargs)
     
     return decorated
 
@@ -259,22 +318,16 @@ def registrar_historico(usuario_id, acao, descricao):
     """
     Registra uma ação no histórico do sistema
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    escrita.executar(lambda conn: conn.execute('''
         INSERT INTO historico (usuario_id, acao, descricao)
         VALUES (?, ?, ?)
-    ''', (usuario_id, acao, descricao))
-    
-    conn.commit()
-    conn.close()
+    ''', (usuario_id, acao, descricao)))
 
 def obter_historico(limite=50):
     """
     Obtém o histórico de ações do sistema
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -0,0 +1,320 @@
+"""
+Backup - Cópias a Quente e Restauração do Banco
+Usa a API de backup online do SQLite: as páginas são copiadas em passos pequenos,
+com uma pausa entre eles, então o balcão continua gravando durante a cópia.
+Cada cópia passa por PRAGMA integrity_check, é comprimida com gzip e recebe
+data e hora no nome; só as mais recentes são mantidas.
+
+Uso:
+    python backup.py criar [unidade]
+    python backup.py listar [unidade]
+    python backup.py verificar <arquivo> [unidade]
+    python backup.py restaurar <arquivo|ultimo> [unidade]
+
+Configuração:
+    FLOWFIT_BACKUP_PASTA=data/backups   pasta das cópias (uma subpasta por unidade)
+    FLOWFIT_BACKUP_MANTER=14            cópias mantidas por unidade
+    FLOWFIT_BACKUP_PAGINAS=256          páginas copiadas por passo
+    FLOWFIT_BACKUP_PAUSA_MS=5           pausa entre os passos
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cache
+import database
+
+PASTA_BACKUPS = os.environ.get('FLOWFIT_BACKUP_PASTA', os.path.join('data', 'backups'))
+MANTER = int(os.environ.get('FLOWFIT_BACKUP_MANTER', 14))
+PAGINAS_POR_PASSO = int(os.environ.get('FLOWFIT_BACKUP_PAGINAS', 256))
+PAUSA = float(os.environ.get('FLOWFIT_BACKUP_PAUSA_MS', 5)) / 1000
+
+# <unidade>-AAAAMMDD-HHMMSS[-sufixo].db.gz
+_RE_ARQUIVO = re.compile(r'^[a-z0-9][a-z0-9_-]{0,39}-\d{8}-\d{6}(-[a-z]+)?\.db\.gz$')
+
+# Uma cópia ou restauração por vez em cada unidade
+_locks = {}
+_lock_locks = threading.Lock()
+
+
+def _lock_da_unidade(tenant):
+    with _lock_locks:
+        return _locks.setdefault(tenant, threading.Lock())
+
+def _pasta(tenant):
+    return os.path.join(PASTA_BACKUPS, tenant)
+
+def _verificar_integridade(caminho):
+    """
+    PRAGMA integrity_check de um arquivo SQLite (descomprimido)
+    """
+    conn = sqlite3.connect(caminho)
+    try:
+        linhas = [linha[0] for linha in conn.execute('PRAGMA integrity_check').fetchall()]
+    finally:
+        conn.close()
+    return linhas == ['ok'], linhas
+
+def _descomprimir(arquivo, destino):
+    with gzip.open(arquivo, 'rb') as origem, open(destino, 'wb') as saida:
+        shutil.copyfileobj(origem, saida, 1024 * 1024)
+
+# ==================== CÓPIA ====================
+
+def criar_backup(tenant=None, sufixo=None):
+    """
+    Copia o banco da unidade sem parar o servidor, verifica e comprime
+    """
+    tenant = tenant or database.tenant_atual()
+    if not database.tenant_valido(tenant):
+        return {"success": False, "error": "Unidade desconhecida"}
+    caminho = database.caminho_banco(tenant)
+    if not os.path.exists(caminho):
+        return {"success": False, "error": "Banco da unidade ainda não existe"}
+
+    pasta = _pasta(tenant)
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{tenant}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    if sufixo:
+        nome += f'-{sufixo}'
+    arquivo = os.path.join(pasta, nome + '.db.gz')
+
+    with _lock_da_unidade(tenant):
+        inicio = time.perf_counter()
+        fd, temporario = tempfile.mkstemp(suffix='.db', dir=pasta)
+        os.close(fd)
+        try:
+            origem = sqlite3.connect(caminho, timeout=30)
+            destino = sqlite3.connect(temporario)
+            try:
+                # Cada passo segura a trava de leitura só enquanto copia PAGINAS_POR_PASSO páginas
+                origem.backup(destino, pages=PAGINAS_POR_PASSO, sleep=PAUSA)
+                # A cópia fica em modo rollback: um único arquivo, sem -wal
+                destino.execute('PRAGMA journal_mode=DELETE')
+                paginas = destino.execute('PRAGMA page_count').fetchone()[0]
+            finally:
+                destino.close()
+                origem.close()
+            duracao_copia = time.perf_counter() - inicio
+
+            integro, problemas = _verificar_integridade(temporario)
+            if not integro:
+                return {"success": False, "error": "Cópia falhou na verificação de integridade",
+                        "problemas": problemas[:20]}
+
+            with open(temporario, 'rb') as entrada, gzip.open(arquivo, 'wb', compresslevel=6) as saida:
+                shutil.copyfileobj(entrada, saida, 1024 * 1024)
+            tamanho_original = os.path.getsize(temporario)
+        except Exception as e:
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+            return {"success": False, "error": str(e)}
+        finally:
+            os.remove(temporario)
+
+    removidos = rotacionar(tenant)
+    return {
+        "success": True,
+        "tenant": tenant,
+        "arquivo": os.path.basename(arquivo),
+        "paginas": paginas,
+        "tamanho_original": tamanho_original,
+        "tamanho_comprimido": os.path.getsize(arquivo),
+        "duracao_copia_ms": round(duracao_copia * 1000, 2),
+        "duracao_total_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        "removidos": removidos
+    }
+
+def rotacionar(tenant):
+    """
+    Mantém só as MANTER cópias mais recentes da unidade
+    """
+    antigos = [b['arquivo'] for b in listar_backups(tenant)[MANTER:]]
+    for nome in antigos:
+        os.remove(os.path.join(_pasta(tenant), nome))
+    return antigos
+
+def listar_backups(tenant=None):
+    """
+    Cópias da unidade, da mais recente para a mais antiga
+    """
+    tenant = tenant or database.tenant_atual()
+    pasta = _pasta(tenant)
+    if not os.path.isdir(pasta):
+        return []
+
+    backups = []
+    for nome in os.listdir(pasta):
+        if not _RE_ARQUIVO.match(nome):
+            continue
+        estado = os.stat(os.path.join(pasta, nome))
+        backups.append({
+            "arquivo": nome,
+            "tamanho": estado.st_size,
+            "criado_em": datetime.fromtimestamp(estado.st_mtime).isoformat(timespec='seconds')
+        })
+    # O nome tem data e hora, então a ordem alfabética é a cronológica
+    backups.sort(key=lambda b: b['arquivo'], reverse=True)
+    return backups
+
+def _localizar(arquivo, tenant):
+    """
+    Caminho de uma cópia da unidade ('ultimo' = a mais recente); None se não existir
+    """
+    if arquivo == 'ultimo':
+        backups = listar_backups(tenant)
+        if not backups:
+            return None
+        arquivo = backups[0]['arquivo']
+    if not _RE_ARQUIVO.match(arquivo or ''):
+        return None
+    caminho = os.path.join(_pasta(tenant), arquivo)
+    return caminho if os.path.exists(caminho) else None
+
+def verificar_backup(arquivo, tenant=None):
+    """
+    Descomprime uma cópia num arquivo temporário e roda o integrity_check
+    """
+    tenant = tenant or database.tenant_atual()
+    caminho = _localizar(arquivo, tenant)
+    if not caminho:
+        return {"success": False, "error": "Backup não encontrado"}
+
+    fd, temporario = tempfile.mkstemp(suffix='.db', dir=_pasta(tenant))
+    os.close(fd)
+    try:
+        _descomprimir(caminho, temporario)
+        integro, problemas = _verificar_integridade(temporario)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        os.remove(temporario)
+
+    return {"success": integro, "arquivo": os.path.basename(caminho), "integro": integro,
+            "problemas": [] if integro else problemas[:20]}
+
+# ==================== RESTAURAÇÃO ====================
+
+def _contador_mudancas(caminho):
+    """
+    Último seq do feed de mudanças do banco (0 se não existe ou é anterior ao feed)
+    """
+    if not os.path.exists(caminho):
+        return 0
+    conn = sqlite3.connect(caminho)
+    try:
+        linha = conn.execute('SELECT valor FROM mudancas_contador WHERE id = 1').fetchone()
+        return linha[0] if linha else 0
+    except sqlite3.Error:
+        return 0
+    finally:
+        conn.close()
+
+def restaurar_backup(arquivo, tenant=None):
+    """
+    Substitui o banco da unidade pelo conteúdo de uma cópia verificada.
+    Antes, guarda uma cópia do estado atual (sufixo 'prerestauracao').
+    """
+    tenant = tenant or database.tenant_atual()
+    caminho = _localizar(arquivo, tenant)
+    if not caminho:
+        return {"success": False, "error": "Backup não encontrado"}
+
+    anterior = None
+    if os.path.exists(database.caminho_banco(tenant)):
+        resultado = criar_backup(tenant, sufixo='prerestauracao')
+        if not resultado['success']:
+            return {"success": False, "error": f"Não foi possível salvar o estado atual: {resultado['error']}"}
+        anterior = resultado['arquivo']
+
+    with _lock_da_unidade(tenant):
+        fd, temporario = tempfile.mkstemp(suffix='.db', dir=_pasta(tenant))
+        os.close(fd)
+        try:
+            _descomprimir(caminho, temporario)
+            integro, problemas = _verificar_integridade(temporario)
+            if not integro:
+                return {"success": False, "error": "Backup falhou na verificação de integridade",
+                        "problemas": problemas[:20]}
+
+            # Cópia de uma versão anterior do sistema ganha as tabelas novas antes de entrar,
+            # e o feed de mudanças avisa quem tem cópia local que é preciso recarregar tudo
+            database.init_db(temporario)
+            marcacao = sqlite3.connect(temporario)
+            try:
+                database.marcar_recarga_total(marcacao, _contador_mudancas(database.caminho_banco(tenant)))
+                marcacao.commit()
+            finally:
+                marcacao.close()
+
+            # A API de backup no sentido inverso grava no banco vivo numa única transação:
+            # as conexões abertas do servidor passam a enxergar o conteúdo restaurado
+            origem = sqlite3.connect(temporario)
+            destino = sqlite3.connect(database.caminho_banco(tenant), timeout=30)
+            try:
+                origem.backup(destino)
+                destino.execute('PRAGMA journal_mode=WAL')
+            finally:
+                destino.close()
+                origem.close()
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        finally:
+            os.remove(temporario)
+
+    # O conteúdo inteiro mudou: nada do que estava em cache da unidade vale mais. Isso só
+    # limpa o cache deste processo; o servidor vê o '*' marcado acima (cache.conferir_unidade)
+    cache.limpar_unidade(tenant)
+    return {"success": True, "tenant": tenant, "restaurado": os.path.basename(caminho),
+            "copia_anterior": anterior}
+
+
+if __name__ == '__main__':
+    comandos = {'criar': 0, 'listar': 0, 'verificar': 1, 'restaurar': 1}
+    if len(sys.argv) < 2 or sys.argv[1] not in comandos:
+        print("Uso: python backup.py criar [unidade] | listar [unidade] | "
+              "verificar <arquivo> [unidade] | restaurar <arquivo|ultimo> [unidade]")
+        sys.exit(1)
+
+    comando = sys.argv[1]
+    argumentos = sys.argv[2:]
+    if len(argumentos) not in (comandos[comando], comandos[comando] + 1):
+        print(f"✗ Argumentos inválidos para '{comando}'")
+        sys.exit(1)
+    unidade = argumentos[comandos[comando]] if len(argumentos) > comandos[comando] else database.TENANT_PADRAO
+
+    if comando == 'listar':
+        for b in listar_backups(unidade):
+            print(f"{b['arquivo']}  {b['tamanho'] / 1024:.1f} KB  {b['criado_em']}")
+        sys.exit(0)
+
+    if comando == 'criar':
+        resultado = criar_backup(unidade)
+    elif comando == 'verificar':
+        resultado = verificar_backup(argumentos[0], unidade)
+    else:
+        resultado = restaurar_backup(argumentos[0], unidade)
+
+    if resultado['success']:
+        if comando == 'criar':
+            print(f"✓ Backup criado: {resultado['arquivo']} "
+                  f"({resultado['tamanho_comprimido'] / 1024:.1f} KB, {resultado['duracao_total_ms']} ms)")
+        elif comando == 'verificar':
+            print(f"✓ {resultado['arquivo']}: integridade ok")
+        else:
+            print(f"✓ Banco '{unidade}' restaurado de {resultado['restaurado']}")
+            if resultado['copia_anterior']:
+                print(f"  Estado anterior salvo em {resultado['copia_anterior']}")
+    else:
+        print(f"✗ {resultado['error']}")
+        for problema in resultado.get('problemas', []):
+            print(f"  {problema}")
+        sys.exit(1)
@@ -0,0 +1,188 @@
+"""
+Cache - LRU em Memória com Leitura Direta (read-through)
+Guarda o cadastro do cliente com as estatísticas de pagamentos (models.obter_cliente),
+por unidade e id. Quem altera o cliente ou um pagamento dele chama invalidar()
+depois do commit; reabrir um cliente popular não faz nenhuma consulta.
+
+Uma leitura que começou antes de uma invalidação não grava o resultado (já pode
+estar velho): cada chave tem uma versão, incrementada a cada invalidação.
+
+Também guarda o relatório de aging (relatorios.obter_aging) por unidade e dia,
+descartado a cada escrita em pagamentos da unidade.
+
+Escritas de outro processo não passam por invalidar(): a troca do banco inteiro
+(backup restaurado pela linha de comando) deixa um '*' no feed de mudanças, e
+conferir_unidade() descarta o cache da unidade quando vê um '*' novo.
+
+Configuração:
+    FLOWFIT_CACHE_CLIENTES=2000  clientes guardados por processo (0 desliga)
+    FLOWFIT_CACHE_RELATORIOS=64  relatórios guardados por processo (0 desliga)
+    FLOWFIT_CACHE_CONFERENCIA=2  segundos entre as consultas do '*' de cada unidade
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+import database
+
+CAPACIDADE_CLIENTES = int(os.environ.get('FLOWFIT_CACHE_CLIENTES', 2000))
+CAPACIDADE_RELATORIOS = int(os.environ.get('FLOWFIT_CACHE_RELATORIOS', 64))
+INTERVALO_CONFERENCIA = float(os.environ.get('FLOWFIT_CACHE_CONFERENCIA', 2))
+
+
+class CacheLRU:
+    """
+    Dicionário limitado que descarta o item usado há mais tempo; seguro entre threads
+    """
+
+    def __init__(self, nome, capacidade, copiar=True):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.copiar = copiar  # False: quem chama só lê o valor (ex: relatórios grandes)
+        self._itens = OrderedDict()
+        self._versoes = {}  # chave -> invalidações (só chaves já invalidadas)
+        self._epoca = 0  # muda quando _versoes é esvaziado ou o cache é limpo
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self.descartes = 0
+
+    def obter(self, chave, carregar):
+        """
+        Valor da chave; na falta, chama carregar() e guarda o resultado (None não é guardado)
+        Devolve uma cópia (se copiar): quem chama pode alterar o dicionário à vontade
+        """
+        if self.capacidade <= 0:
+            return carregar()
+
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._copia(self._itens[chave])
+            self.falhas += 1
+            marca = (self._epoca, self._versoes.get(chave, 0))
+
+        valor = carregar()  # fora do lock: as consultas de threads diferentes não se esperam
+        if valor is None:
+            return None
+
+        with self._lock:
+            if (self._epoca, self._versoes.get(chave, 0)) == marca:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.capacidade:
+                    self._itens.popitem(last=False)
+                    self.descartes += 1
+        return self._copia(valor)
+
+    def _copia(self, valor):
+        return copy.deepcopy(valor) if self.copiar else valor
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+            self._versoes[chave] = self._versoes.get(chave, 0) + 1
+            self.invalidacoes += 1
+            # As versões só importam para leituras em andamento; para o mapa não crescer
+            # sem fim ele é esvaziado e a época muda (essas leituras não gravam)
+            if len(self._versoes) > 4 * max(self.capacidade, 1):
+                self._versoes.clear()
+                self._epoca += 1
+
+    def limpar(self, filtro=None):
+        """
+        Remove tudo (ou as chaves em que filtro(chave) é verdadeiro)
+        """
+        with self._lock:
+            chaves = [c for c in self._itens if filtro is None or filtro(c)]
+            for chave in chaves:
+                del self._itens[chave]
+            self.invalidacoes += len(chaves)
+            # Leituras em andamento (de chaves que ainda nem estão no cache) não gravam
+            self._epoca += 1
+
+    def situacao(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "cache": self.nome,
+                "itens": len(self._itens),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos / consultas, 4) if consultas else None,
+                "invalidacoes": self.invalidacoes,
+                "descartes": self.descartes
+            }
+
+
+# (unidade, cliente_id) -> cliente com estatísticas
+clientes = CacheLRU('clientes', CAPACIDADE_CLIENTES)
+
+# (unidade, data, parâmetros...) -> relatório pronto
+relatorios = CacheLRU('relatorios', CAPACIDADE_RELATORIOS, copiar=False)
+
+CACHES = (clientes, relatorios)
+
+
+def limpar_unidade(tenant):
+    """
+    Descarta tudo o que os caches guardam de uma unidade
+    """
+    for c in CACHES:
+        c.limpar(lambda chave: chave[0] == tenant)
+
+# unidade -> [geração do banco vista por último, instante da última conferência]
+_geracoes = {}
+_lock_geracoes = threading.Lock()
+
+def conferir_unidade(tenant):
+    """
+    Descarta o cache da unidade se o banco dela foi trocado desde a última conferência
+    (database.geracao_banco); consulta o banco no máximo uma vez por INTERVALO_CONFERENCIA
+    """
+    agora = time.monotonic()
+    with _lock_geracoes:
+        vista = _geracoes.get(tenant)
+        if vista and agora - vista[1] < INTERVALO_CONFERENCIA:
+            return
+        # Marca antes de consultar: as outras threads não repetem a consulta
+        _geracoes[tenant] = [vista[0] if vista else None, agora]
+
+    conn = database.get_connection()
+    try:
+        geracao = database.geracao_banco(conn)
+    finally:
+        conn.close()
+
+    with _lock_geracoes:
+        anterior = _geracoes[tenant][0]
+        _geracoes[tenant][0] = geracao
+    if anterior is not None and anterior != geracao:
+        limpar_unidade(tenant)
+
+def situacao():
+    return [c.situacao() for c in CACHES]
+
+def exportar_prometheus():
+    """
+    Acertos, falhas e tamanho dos caches no formato do Prometheus
+    """
+    linhas = []
+    metricas = (
+        ('flowfit_cache_acertos_total', 'counter', 'acertos', 'Leituras atendidas pelo cache'),
+        ('flowfit_cache_falhas_total', 'counter', 'falhas', 'Leituras que foram ao banco'),
+        ('flowfit_cache_invalidacoes_total', 'counter', 'invalidacoes', 'Itens invalidados por escrita'),
+        ('flowfit_cache_itens', 'gauge', 'itens', 'Itens guardados no cache'),
+    )
+    estados = situacao()
+    for nome, tipo, campo, ajuda in metricas:
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        for estado in estados:
+            linhas.append(f'{nome}{{cache="{estado["cache"]}"}} {estado[campo]}')
+    return '\n'.join(linhas) + '\n'
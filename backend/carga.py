@@ -0,0 +1,441 @@
+"""
+Carga - Teste de Carga Reproduzindo os Fluxos do Frontend
+Cada operador simulado (uma thread) faz login e repete o atendimento de balcão
+das páginas em frontend/*.html:
+
+    dashboard.html             GET /api/dashboard, /api/pagamentos/mes-atual, /api/inadimplentes
+    clientes.html              GET /api/clientes?busca=...
+    historico-pagamento.html   POST /api/batch (cliente + histórico)
+                               POST /api/pagamentos/:id/pagar (parte dos atendimentos)
+    inadimplentes.html         GET /api/inadimplentes
+
+com um tempo de "pensar" aleatório entre os passos. Roda cada quantidade de
+operadores por alguns segundos e mostra vazão, p50/p95/p99 por rota, taxa de
+erros e de travas/descartes (503, "database is locked") e a curva de saturação.
+
+Sem --url, cria um banco populado numa pasta temporária e sobe o servidor
+(python app.py, ou o servidor ASGI com --servidor asgi) apontando para ele.
+Com --eventos N, mantém N streams de /api/eventos abertos durante o teste
+(navegadores com o dashboard aberto, conexões quase sempre paradas) e mostra
+quantas threads o servidor usou.
+Só usa a biblioteca padrão.
+
+Uso:
+    python carga.py --operadores 1,2,4,8,16 --duracao 20 --pensar 0.5
+    python carga.py --url http://localhost:5000 --operadores 4 --duracao 60
+    python carga.py --clientes 5000 --meses 24 --json resultado.json
+    python carga.py --servidor asgi --eventos 500 --operadores 8,16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import quote, urlsplit
+
+import database
+
+EMAIL_ADMIN = 'admin@sistema.com'
+SENHA_ADMIN = 'admin123'
+
+# Curva de saturação: p99 que já deixa o balcão lento. Limite fixo, e não "o dobro do
+# nível de 1 operador": esse tem poucas amostras e p99 de poucos ms, qualquer ruído dobra
+P99_LIMITE_MS = 500
+
+_NOMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Hugo', 'Isabela',
+          'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago')
+_SOBRENOMES = ('Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Pereira', 'Costa', 'Almeida',
+               'Ferreira', 'Rodrigues', 'Gomes', 'Martins', 'Barbosa', 'Ribeiro', 'Carvalho')
+_METODOS = ('pix', 'dinheiro', 'cartão de crédito', 'cartão de débito')
+
+# ==================== BANCO POPULADO ====================
+
+def _gerar_cpf(rng):
+    digitos = [rng.randint(0, 9) for _ in range(9)]
+    for posicao in (9, 10):
+        soma = sum(digitos[i] * (posicao + 1 - i) for i in range(posicao))
+        digitos.append(soma * 10 % 11 % 10)
+    return ''.join(map(str, digitos))
+
+def _somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, min(dia.day, 28))
+
+def semear(pasta, clientes=2000, meses=12, semente=42):
+    """
+    Cria data/database.db na pasta com clientes e um pagamento mensal por cliente
+    (a maioria paga, alguns vencidos e os do mês atual pendentes)
+    """
+    rng = random.Random(semente)
+    caminho = os.path.join(pasta, 'data', 'database.db')
+    database.init_db(caminho)
+
+    hoje = date.today()
+    linhas_clientes = []
+    for _ in range(clientes):
+        cpf = _gerar_cpf(rng)
+        telefone = f'11{rng.randint(900000000, 999999999)}'
+        linhas_clientes.append((f'{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)} {rng.choice(_SOBRENOMES)}',
+                                '', telefone, cpf, '', '', cpf, telefone))
+
+    conn = sqlite3.connect(caminho)
+    conn.executemany('''
+        INSERT INTO clientes (nome, email, telefone, cpf, endereco, observacoes, cpf_digitos, telefone_digitos)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', linhas_clientes)
+
+    linhas_pagamentos = []
+    ids = [linha[0] for linha in conn.execute('SELECT id FROM clientes').fetchall()]
+    for cliente_id in ids:
+        for mes in range(-meses + 1, 1):
+            vencimento = _somar_meses(hoje, mes)
+            if mes < 0 and rng.random() < 0.9:
+                pago = vencimento + timedelta(days=rng.randint(-5, 10))
+                linhas_pagamentos.append((cliente_id, 120.0, vencimento.isoformat(), pago.isoformat(), 'pago',
+                                          f'Mensalidade {vencimento:%m/%Y}', rng.choice(_METODOS)))
+            else:
+                linhas_pagamentos.append((cliente_id, 120.0, vencimento.isoformat(), None, 'pendente',
+                                          f'Mensalidade {vencimento:%m/%Y}', None))
+    conn.executemany('''
+        INSERT INTO pagamentos (cliente_id, valor, vencimento, data_pagamento, status, descricao, metodo_pagamento)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', linhas_pagamentos)
+    conn.commit()
+    conn.close()
+    return len(ids), len(linhas_pagamentos)
+
+# Como subir cada servidor (mesmas rotas; muda só quem atende as conexões)
+SERVIDORES = {
+    'wsgi': 'import app; app.app.run(host="127.0.0.1", port={porta}, threaded=True, debug=False)',
+    'asgi': 'import asyncio, asgi; asyncio.run(asgi.servir("127.0.0.1", {porta}))',
+}
+
+def iniciar_servidor(pasta, porta, servidor='wsgi'):
+    """
+    Sobe o servidor usando o banco da pasta: Flask com threads (wsgi) ou asgi.py (asgi)
+    """
+    ambiente = dict(os.environ)
+    ambiente['PYTHONPATH'] = os.path.dirname(os.path.abspath(__file__))
+    ambiente.setdefault('FLOWFIT_MANUTENCAO', '0')
+    processo = subprocess.Popen(
+        [sys.executable, '-c', SERVIDORES[servidor].format(porta=porta)],
+        cwd=pasta, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    limite = time.time() + 30
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError('O servidor encerrou ao iniciar')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=1)
+            conexao.request('GET', '/api/status')
+            if conexao.getresponse().status == 200:
+                conexao.close()
+                return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError('O servidor não respondeu em 30s')
+
+def abrir_eventos(url, quantidade):
+    """
+    Abre streams de /api/eventos que ficam abertos e parados (dashboards abertos)
+    """
+    partes = urlsplit(url)
+    conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=10)
+    conexao.request('POST', '/api/auth/login', body=json.dumps({'email': EMAIL_ADMIN, 'senha': SENHA_ADMIN}),
+                    headers={'Content-Type': 'application/json'})
+    token = json.loads(conexao.getresponse().read())['token']
+    conexao.close()
+
+    conexoes = []
+    for _ in range(quantidade):
+        try:
+            conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=10)
+            conexao.request('GET', f'/api/eventos?token={token}')
+            resposta = conexao.getresponse()
+            if resposta.status != 200:
+                conexao.close()
+                break
+            # A resposta segura o socket (o servidor WSGI responde com Connection: close)
+            conexoes.append(resposta)
+        except (OSError, http.client.HTTPException):
+            break
+    return conexoes
+
+def threads_do_processo(processo):
+    """
+    Threads em uso pelo servidor iniciado pelo teste (Linux; None se não der para saber)
+    """
+    try:
+        with open(f'/proc/{processo.pid}/status') as arquivo:
+            for linha in arquivo:
+                if linha.startswith('Threads:'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+# ==================== OPERADORES ====================
+
+class Operador(threading.Thread):
+    """
+    Um atendente de balcão repetindo o fluxo das páginas até o fim da rodada
+    """
+
+    def __init__(self, url, fim, pensar, pagar, resultados, semente):
+        super().__init__(daemon=True)
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.porta = partes.port or 80
+        self.fim = fim
+        self.pensar = pensar
+        self.pagar = pagar
+        self.resultados = resultados
+        self.rng = random.Random(semente)
+        self.token = None
+        self.conexao = None
+
+    def _requisitar(self, rota, metodo, caminho, corpo=None):
+        """
+        Faz a chamada, registra (rota, status, segundos, trava) e devolve (status, json)
+        """
+        cabecalhos = {'Content-Type': 'application/json'}
+        if self.token:
+            cabecalhos['Authorization'] = f'Bearer {self.token}'
+        dados = json.dumps(corpo).encode() if corpo is not None else None
+
+        inicio = time.perf_counter()
+        try:
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+            self.conexao.request(metodo, caminho, body=dados, headers=cabecalhos)
+            resposta = self.conexao.getresponse()
+            conteudo = resposta.read()
+            status = resposta.status
+        except (OSError, http.client.HTTPException):
+            if self.conexao:
+                self.conexao.close()
+            self.conexao = None
+            self.resultados.append((rota, 0, time.perf_counter() - inicio, False))
+            return 0, None
+        duracao = time.perf_counter() - inicio
+
+        trava = status == 503 or b'database is locked' in conteudo
+        self.resultados.append((rota, status, duracao, trava))
+        try:
+            return status, json.loads(conteudo) if conteudo else None
+        except ValueError:
+            return status, None
+
+    def _pausa(self):
+        if self.pensar > 0:
+            time.sleep(self.rng.expovariate(1 / self.pensar))
+
+    def run(self):
+        status, dados = self._requisitar('login', 'POST', '/api/auth/login',
+                                         {'email': EMAIL_ADMIN, 'senha': SENHA_ADMIN})
+        if status != 200:
+            return
+        self.token = dados['token']
+
+        while time.time() < self.fim:
+            # dashboard.html
+            self._requisitar('dashboard', 'GET', '/api/dashboard')
+            self._requisitar('pagamentos/mes-atual', 'GET', '/api/pagamentos/mes-atual')
+            self._requisitar('inadimplentes', 'GET', '/api/inadimplentes')
+            self._pausa()
+
+            # clientes.html: busca por sobrenome ou começo do CPF
+            termo = self.rng.choice(_SOBRENOMES) if self.rng.random() < 0.7 else str(self.rng.randint(100, 999))
+            _, clientes = self._requisitar('clientes?busca', 'GET', f'/api/clientes?busca={quote(termo)}')
+            self._pausa()
+            if not clientes:
+                continue
+
+            # historico-pagamento.html
+            cliente_id = self.rng.choice(clientes)['id']
+            _, lote = self._requisitar('batch(historico)', 'POST', '/api/batch', {'requisicoes': [
+                {'method': 'GET', 'path': f'/api/clientes/{cliente_id}'},
+                {'method': 'GET', 'path': f'/api/historico/{cliente_id}'},
+            ]})
+            self._pausa()
+
+            if lote and lote.get('success') and self.rng.random() < self.pagar:
+                historico = lote['respostas'][1]['body'] or []
+                pendentes = [p['id'] for p in historico if p.get('status') == 'pendente']
+                if pendentes:
+                    self._requisitar('pagar', 'POST', f'/api/pagamentos/{self.rng.choice(pendentes)}/pagar',
+                                     {'metodo_pagamento': self.rng.choice(_METODOS)})
+                    self._pausa()
+
+            # inadimplentes.html
+            self._requisitar('inadimplentes', 'GET', '/api/inadimplentes')
+            self._pausa()
+
+        if self.conexao:
+            self.conexao.close()
+
+# ==================== RELATÓRIO ====================
+
+def _percentil(ordenados, fracao):
+    if not ordenados:
+        return 0.0
+    indice = min(len(ordenados) - 1, max(0, int(round(fracao * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+def _resumir(amostras, segundos):
+    duracoes = sorted(a[2] for a in amostras)
+    erros = sum(1 for a in amostras if a[1] == 0 or a[1] >= 500)
+    travas = sum(1 for a in amostras if a[3])
+    total = len(amostras)
+    return {
+        "requisicoes": total,
+        "vazao_rps": round(total / segundos, 2) if segundos else 0,
+        "p50_ms": round(_percentil(duracoes, 0.50) * 1000, 2),
+        "p95_ms": round(_percentil(duracoes, 0.95) * 1000, 2),
+        "p99_ms": round(_percentil(duracoes, 0.99) * 1000, 2),
+        "taxa_erros": round(erros / total, 4) if total else 0,
+        "taxa_travas": round(travas / total, 4) if total else 0,
+    }
+
+def rodar_nivel(url, operadores, duracao, pensar, pagar, aquecimento, semente, processo=None):
+    """
+    Roda N operadores por 'duracao' segundos (descartando o aquecimento)
+    """
+    resultados = []
+    inicio = time.time()
+    fim = inicio + aquecimento + duracao
+    threads = [Operador(url, fim, pensar, pagar, resultados, semente + i) for i in range(operadores)]
+    for thread in threads:
+        thread.start()
+    time.sleep(aquecimento)
+    inicio_medicao = len(resultados)
+    threads_servidor = threads_do_processo(processo) if processo else None
+    for thread in threads:
+        thread.join()
+
+    # Login entra no relatório mesmo durante o aquecimento
+    amostras = [a for a in resultados[:inicio_medicao] if a[0] == 'login'] + resultados[inicio_medicao:]
+    medidas = [a for a in amostras if a[0] != 'login']
+
+    rotas = {}
+    for amostra in amostras:
+        rotas.setdefault(amostra[0], []).append(amostra)
+
+    return {
+        "operadores": operadores,
+        "threads_servidor": threads_servidor,
+        **_resumir(medidas, duracao),
+        "rotas": {rota: _resumir(lista, duracao) for rota, lista in sorted(rotas.items())}
+    }
+
+def imprimir_nivel(nivel):
+    threads = f", {nivel['threads_servidor']} threads no servidor" if nivel.get('threads_servidor') else ''
+    print(f"\n── {nivel['operadores']} operador(es): {nivel['vazao_rps']} req/s, "
+          f"p99 {nivel['p99_ms']} ms, erros {nivel['taxa_erros']:.2%}, travas/503 {nivel['taxa_travas']:.2%}"
+          f"{threads}")
+    print(f"   {'rota':<24}{'req':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'erros':>8}{'travas':>8}")
+    for rota, r in nivel['rotas'].items():
+        print(f"   {rota:<24}{r['requisicoes']:>7}{r['vazao_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['taxa_erros']:>8.1%}{r['taxa_travas']:>8.1%}")
+
+def imprimir_curva(niveis, p99_limite=P99_LIMITE_MS):
+    """
+    Curva de saturação: onde a vazão para de crescer ou o p99 dispara
+    """
+    print("\n📈 Curva de saturação")
+    print(f"   {'operadores':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}{'travas':>8}")
+    saturacao = None
+    anterior = None
+    for nivel in niveis:
+        marca = ''
+        if saturacao is None and anterior:
+            ganho = nivel['vazao_rps'] / anterior['vazao_rps'] if anterior['vazao_rps'] else 0
+            if ganho < 1.1 or nivel['p99_ms'] > p99_limite or nivel['taxa_travas'] > 0.01:
+                saturacao = nivel['operadores']
+                marca = '  ← saturou'
+        print(f"   {nivel['operadores']:>10}{nivel['vazao_rps']:>10}{nivel['p50_ms']:>10}{nivel['p95_ms']:>10}"
+              f"{nivel['p99_ms']:>10}{nivel['taxa_erros']:>8.1%}{nivel['taxa_travas']:>8.1%}{marca}")
+        anterior = nivel
+    if saturacao:
+        print(f"\n   Saturação a partir de {saturacao} operadores (vazão cresce <10%, "
+              f"p99 acima de {p99_limite:g} ms ou travas acima de 1%)")
+    else:
+        print("\n   Não saturou nos níveis testados")
+    return saturacao
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Teste de carga com os fluxos do frontend')
+    parser.add_argument('--url', help='Servidor já em execução (sem isso, sobe um com banco populado)')
+    parser.add_argument('--operadores', default='1,2,4,8,16', help='Níveis de operadores simultâneos')
+    parser.add_argument('--duracao', type=float, default=20, help='Segundos medidos por nível')
+    parser.add_argument('--aquecimento', type=float, default=2, help='Segundos descartados no início')
+    parser.add_argument('--pensar', type=float, default=0.5, help='Tempo médio (s) entre os passos; 0 = sem pausa')
+    parser.add_argument('--pagar', type=float, default=0.5, help='Fração dos atendimentos que registra pagamento')
+    parser.add_argument('--clientes', type=int, default=2000, help='Clientes no banco populado')
+    parser.add_argument('--meses', type=int, default=12, help='Meses de pagamentos por cliente')
+    parser.add_argument('--porta', type=int, default=5055, help='Porta do servidor iniciado pelo teste')
+    parser.add_argument('--servidor', choices=sorted(SERVIDORES), default='wsgi',
+                        help='Servidor iniciado pelo teste: Flask com threads ou asgi.py')
+    parser.add_argument('--eventos', type=int, default=0, help='Streams de /api/eventos abertos durante o teste')
+    parser.add_argument('--p99-limite', type=float, default=P99_LIMITE_MS,
+                        help='p99 (ms) a partir do qual o nível conta como saturado')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--json', help='Salva os resultados neste arquivo')
+    args = parser.parse_args()
+
+    niveis_operadores = [int(n) for n in args.operadores.split(',') if n.strip()]
+    if args.eventos:
+        # O servidor iniciado pelo teste precisa aceitar todos os streams
+        os.environ.setdefault('FLOWFIT_SSE_MAX_ASSINANTES', str(args.eventos + 100))
+
+    processo = None
+    pasta = None
+    url = args.url
+    if not url:
+        pasta = tempfile.mkdtemp(prefix='flowfit-carga-')
+        total_clientes, total_pagamentos = semear(pasta, args.clientes, args.meses, args.semente)
+        print(f"✓ Banco populado: {total_clientes} clientes, {total_pagamentos} pagamentos ({pasta})")
+        processo = iniciar_servidor(pasta, args.porta, args.servidor)
+        url = f'http://127.0.0.1:{args.porta}'
+        print(f"✓ Servidor {args.servidor} iniciado em {url}")
+
+    streams = abrir_eventos(url, args.eventos) if args.eventos else []
+    if args.eventos:
+        print(f"✓ {len(streams)} streams de eventos abertos")
+
+    niveis = []
+    try:
+        for operadores in niveis_operadores:
+            nivel = rodar_nivel(url, operadores, args.duracao, args.pensar, args.pagar,
+                                args.aquecimento, args.semente, processo)
+            imprimir_nivel(nivel)
+            niveis.append(nivel)
+    except KeyboardInterrupt:
+        print("\n✗ Interrompido")
+    finally:
+        for resposta in streams:
+            resposta.close()
+        if processo:
+            processo.terminate()
+            processo.wait()
+        if pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    saturacao = imprimir_curva(niveis, args.p99_limite)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as saida:
+            json.dump({"parametros": vars(args), "saturacao_operadores": saturacao, "niveis": niveis},
+                      saida, ensure_ascii=False, indent=2)
+        print(f"   Resultados salvos em {args.json}")
@@ -0,0 +1,263 @@
+"""
+Consultas Lentas - Log de Comandos SQL Lentos com Plano de Execução
+Registra em arquivo rotativo todo comando executado via database.get_connection()
+que passar do limite configurado, junto com o EXPLAIN QUERY PLAN do momento.
+
+Configuração por variáveis de ambiente:
+    FLOWFIT_CONSULTA_LENTA_MS     limite em milissegundos (padrão 100, negativo desliga)
+    FLOWFIT_CONSULTA_LENTA_LOG    arquivo de log (padrão data/consultas_lentas.log)
+    FLOWFIT_CONSULTA_LENTA_BYTES  tamanho máximo de cada arquivo (padrão 5 MB)
+    FLOWFIT_CONSULTA_LENTA_COPIAS quantidade de arquivos antigos mantidos (padrão 5)
+
+Relatório (top-N por tempo total):
+    python consultas_lentas.py --top 20
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Configuração atual (pode ser alterada em tempo de execução por configurar())
+LIMITE_MS = float(os.environ.get('FLOWFIT_CONSULTA_LENTA_MS', 100))
+ARQUIVO_LOG = os.environ.get('FLOWFIT_CONSULTA_LENTA_LOG', os.path.join('data', 'consultas_lentas.log'))
+MAX_BYTES = int(os.environ.get('FLOWFIT_CONSULTA_LENTA_BYTES', 5 * 1024 * 1024))
+COPIAS = int(os.environ.get('FLOWFIT_CONSULTA_LENTA_COPIAS', 5))
+
+# Comandos para os quais o EXPLAIN QUERY PLAN faz sentido
+_COMANDOS_EXPLICAVEIS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+# Módulos ignorados ao procurar a função que originou o comando
+_MODULOS_INTERNOS = {'database', 'consultas_lentas', 'sqlite3'}
+
+_RE_ESPACOS = re.compile(r'\s+')
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+_logger = None
+_lock = threading.Lock()
+
+# ==================== CONFIGURAÇÃO ====================
+
+def configurar(limite_ms=None, arquivo=None, max_bytes=None, copias=None):
+    """
+    Altera a configuração do log de consultas lentas
+    """
+    global LIMITE_MS, ARQUIVO_LOG, MAX_BYTES, COPIAS, _logger
+
+    with _lock:
+        if limite_ms is not None:
+            LIMITE_MS = float(limite_ms)
+        if arquivo is not None:
+            ARQUIVO_LOG = arquivo
+        if max_bytes is not None:
+            MAX_BYTES = int(max_bytes)
+        if copias is not None:
+            COPIAS = int(copias)
+
+        # Força a recriação do handler com a nova configuração
+        if _logger is not None:
+            for handler in list(_logger.handlers):
+                _logger.removeHandler(handler)
+                handler.close()
+            _logger = None
+
+def _obter_logger():
+    """
+    Cria (uma única vez) o logger com arquivo rotativo
+    """
+    global _logger
+
+    if _logger is None:
+        with _lock:
+            if _logger is None:
+                pasta = os.path.dirname(ARQUIVO_LOG)
+                if pasta:
+                    os.makedirs(pasta, exist_ok=True)
+                logger = logging.getLogger('flowfit.consultas_lentas')
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                handler = RotatingFileHandler(ARQUIVO_LOG, maxBytes=MAX_BYTES,
+                                              backupCount=COPIAS, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+# ==================== NORMALIZAÇÃO ====================
+
+def normalizar_sql(sql):
+    """
+    Remove literais e espaços extras para agrupar comandos equivalentes
+    """
+    sql = _RE_TEXTO.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_ESPACOS.sub(' ', sql).strip()
+    return _RE_LISTA.sub('(?+)', sql)
+
+def formato_parametros(parametros):
+    """
+    Descreve apenas os tipos dos parâmetros (nunca os valores, que podem ser dados pessoais)
+    """
+    if parametros is None:
+        return []
+    if isinstance(parametros, dict):
+        return {nome: _tipo(valor) for nome, valor in parametros.items()}
+    try:
+        return [_tipo(valor) for valor in parametros]
+    except TypeError:
+        return _tipo(parametros)
+
+def _tipo(valor):
+    if valor is None:
+        return 'null'
+    if isinstance(valor, str):
+        return f'str[{len(valor)}]'
+    return type(valor).__name__
+
+def _funcao_chamadora():
+    """
+    Encontra a primeira função fora da camada de banco (ex: models.listar_pagamentos)
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        modulo = frame.f_globals.get('__name__', '')
+        if modulo.split('.')[-1] not in _MODULOS_INTERNOS:
+            return f'{modulo}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'desconhecido'
+
+def _plano_execucao(conn, sql, parametros):
+    """
+    Captura o EXPLAIN QUERY PLAN do comando na mesma conexão
+    """
+    if not sql.lstrip().upper().startswith(_COMANDOS_EXPLICAVEIS):
+        return None
+    try:
+        # Cursor simples do sqlite3 para não entrar de novo na instrumentação
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parametros if parametros is not None else ())
+        plano = [linha[3] for linha in cursor.fetchall()]
+        cursor.close()
+        return plano
+    except sqlite3.Error as e:
+        return [f'indisponível: {e}']
+
+# ==================== REGISTRO ====================
+
+def avaliar(conn, sql, parametros, segundos):
+    """
+    Chamado pela camada de banco ao final de cada comando
+    Registra no log se o tempo passou do limite configurado
+    """
+    if LIMITE_MS < 0 or segundos * 1000 < LIMITE_MS:
+        return
+
+    registro = {
+        "quando": datetime.now().isoformat(timespec='milliseconds'),
+        "duracao_ms": round(segundos * 1000, 3),
+        "sql": normalizar_sql(sql),
+        "parametros": formato_parametros(parametros),
+        "funcao": _funcao_chamadora(),
+        "plano": _plano_execucao(conn, sql, parametros)
+    }
+
+    try:
+        _obter_logger().info(json.dumps(registro, ensure_ascii=False))
+    except OSError as e:
+        # Falha no log nunca deve derrubar a requisição
+        print(f"✗ Erro ao gravar log de consultas lentas: {e}")
+
+# ==================== RELATÓRIO ====================
+
+def _arquivos_log(arquivo):
+    """
+    Lista o arquivo principal e as cópias rotacionadas existentes
+    """
+    arquivos = [arquivo]
+    indice = 1
+    while os.path.exists(f'{arquivo}.{indice}'):
+        arquivos.append(f'{arquivo}.{indice}')
+        indice += 1
+    return [a for a in arquivos if os.path.exists(a)]
+
+def gerar_relatorio(arquivo=None, top=20):
+    """
+    Agrega o log por SQL normalizado e retorna os N comandos com maior tempo total
+    """
+    agregados = {}
+
+    for caminho in _arquivos_log(arquivo or ARQUIVO_LOG):
+        with open(caminho, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+
+                item = agregados.get(registro['sql'])
+                if item is None:
+                    item = {
+                        "sql": registro['sql'],
+                        "execucoes": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "funcoes": {},
+                        "plano": registro.get('plano')
+                    }
+                    agregados[registro['sql']] = item
+
+                item["execucoes"] += 1
+                item["total_ms"] += registro['duracao_ms']
+                if registro['duracao_ms'] >= item["max_ms"]:
+                    item["max_ms"] = registro['duracao_ms']
+                    item["plano"] = registro.get('plano')
+                funcao = registro.get('funcao', 'desconhecido')
+                item["funcoes"][funcao] = item["funcoes"].get(funcao, 0) + 1
+
+    relatorio = sorted(agregados.values(), key=lambda i: i["total_ms"], reverse=True)[:top]
+    for item in relatorio:
+        item["media_ms"] = item["total_ms"] / item["execucoes"]
+    return relatorio
+
+def imprimir_relatorio(relatorio):
+    """
+    Mostra o relatório no terminal
+    """
+    if not relatorio:
+        print("Nenhuma consulta lenta registrada.")
+        return
+
+    for posicao, item in enumerate(relatorio, start=1):
+        funcoes = ', '.join(f'{nome} ({qtd}x)' for nome, qtd in
+                            sorted(item["funcoes"].items(), key=lambda f: f[1], reverse=True))
+        print("=" * 70)
+        print(f"#{posicao}  total {item['total_ms']:.1f} ms | {item['execucoes']} execuções | "
+              f"média {item['media_ms']:.1f} ms | máx {item['max_ms']:.1f} ms")
+        print(f"Origem: {funcoes}")
+        print(f"SQL: {item['sql']}")
+        if item["plano"]:
+            print("Plano:")
+            for passo in item["plano"]:
+                print(f"   {passo}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Relatório das consultas SQL mais lentas')
+    parser.add_argument('--arquivo', default=ARQUIVO_LOG, help='arquivo de log a analisar')
+    parser.add_argument('--top', type=int, default=20, help='quantidade de comandos no relatório')
+    parser.add_argument('--json', action='store_true', help='imprime o relatório em JSON')
+    args = parser.parse_args()
+
+    resultado = gerar_relatorio(args.arquivo, args.top)
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    else:
+        imprimir_relatorio(resultado)
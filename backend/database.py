@@ -1,20 +1,76 @@
 import sqlite3
 import os
+import re
+import time
+import threading
+from contextlib import contextmanager
 from werkzeug.security import generate_password_hash
+import metricas
+import consultas_lentas
 
 # Caminho para o arquivo do banco de dados
 DB_PATH = os.path.join('data', 'database.db')
 
-def init_db():
+# Permite desligar o caminho de leitura em snapshot (FLOWFIT_LEITURA_SNAPSHOT=0)
+LEITURA_SNAPSHOT = os.environ.get('FLOWFIT_LEITURA_SNAPSHOT', '1') != '0'
+
+# ============================================
+# Multi-unidade (tenant): um arquivo SQLite por academia
+# ============================================
+# A unidade padrão continua usando DB_PATH; as demais ficam em data/tenants/<id>.db
+TENANT_PADRAO = 'principal'
+PASTA_TENANTS = os.path.join('data', 'tenants')
+
+# Unidades que podem ser criadas no primeiro acesso (ex: FLOWFIT_TENANTS=centro,zona-sul)
+TENANTS_PERMITIDOS = {t.strip() for t in os.environ.get('FLOWFIT_TENANTS', '').split(',') if t.strip()}
+
+# Conexões livres mantidas por unidade e tempo (s) até um pool ocioso ser fechado
+POOL_MAX_LIVRES = int(os.environ.get('FLOWFIT_POOL_MAX_LIVRES', 8))
+POOL_TEMPO_OCIOSO = float(os.environ.get('FLOWFIT_POOL_TEMPO_OCIOSO', 300))
+
+# Colunas que contam como mudança no feed (GET /api/mudancas): alterar qualquer uma
+# delas dá um novo seq à linha. Coluna nova nessas tabelas precisa entrar aqui
+COLUNAS_MUDANCAS = {
+    'usuarios': ('nome', 'email', 'senha_hash', 'tipo', 'ativo', 'ultimo_acesso'),
+    'clientes': ('nome', 'email', 'telefone', 'cpf', 'endereco', 'observacoes', 'ativo'),
+    'pagamentos': ('cliente_id', 'valor', 'vencimento', 'data_pagamento', 'status', 'descricao',
+                   'metodo_pagamento', 'observacoes'),
+}
+
+_RE_TENANT = re.compile(r'^[a-z0-9][a-z0-9_-]{0,39}$')
+
+# Indica, por thread, se a requisição atual deve ler em snapshot e qual a unidade
+_contexto = threading.local()
+
+# Pools abertos (caminho do banco -> PoolConexoes) e bancos já inicializados
+_pools = {}
+_inicializados = set()
+_lock_pools = threading.Lock()
+_coletor_iniciado = False
+
+def init_db(caminho=None):
+    """
+    Cria as tabelas, índices e o usuário admin padrão (se ainda não existirem)
+    caminho: arquivo do banco (padrão DB_PATH, a unidade principal)
+    """
+    caminho = caminho or DB_PATH
    
-    # Cria a pasta 'data' se não existir
-    os.makedirs('data', exist_ok=True)
+    # Cria a pasta do banco ('data' ou 'data/tenants') se não existir
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
     
     conn = None  # CORREÇÃO: Inicializa variável antes do try
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(caminho)
         cursor = conn.cursor()
         
+        # Bancos novos já nascem com auto_vacuum incremental (só vale antes da primeira
+        # tabela); a manutenção devolve as páginas livres aos poucos (manutencao.py)
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        
+        # WAL permite que leitores e o escritor trabalhem ao mesmo tempo
+        # (o modo fica gravado no arquivo, vale para todas as conexões)
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # ============================================
         # Tabela de Usuários (para login no sistema)
         # ============================================
@@ -27,7 +83,8 @@ def init_db():
                 tipo TEXT DEFAULT 'operador',  -- Tipos: 'admin' ou 'operador'
                 ativo BOOLEAN DEFAULT 1,  -- 1=ativo, 0=inativo
                 data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ultimo_acesso TIMESTAMP
+                ultimo_acesso TIMESTAMP,
+                seq INTEGER  -- Número da última mudança (feed de mudanças)
             )
         ''')
         
@@ -44,10 +101,24 @@ def init_db():
                 endereco TEXT,
                 observacoes TEXT,  -- Notas sobre o cliente (restrições, preferências, etc)
                 data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ativo BOOLEAN DEFAULT 1  -- 1=ativo, 0=inativo
+                ativo BOOLEAN DEFAULT 1,  -- 1=ativo, 0=inativo
+                cpf_digitos TEXT,  -- CPF só com dígitos (busca no balcão)
+                telefone_digitos TEXT,  -- Telefone só com dígitos
+                seq INTEGER  -- Número da última mudança (feed de mudanças)
             )
         ''')
         
+        # Banco antigo: cria as colunas normalizadas e preenche a partir de cpf/telefone
+        colunas = {linha[1] for linha in cursor.execute('PRAGMA table_info(clientes)').fetchall()}
+        if 'cpf_digitos' not in colunas:
+            cursor.execute('ALTER TABLE clientes ADD COLUMN cpf_digitos TEXT')
+            cursor.execute('ALTER TABLE clientes ADD COLUMN telefone_digitos TEXT')
+            conn.create_function('somente_digitos', 1, somente_digitos, deterministic=True)
+            cursor.execute('''
+                UPDATE clientes
+                SET cpf_digitos = somente_digitos(cpf), telefone_digitos = somente_digitos(telefone)
+            ''')
+        
         # ============================================
         # Tabela de Pagamentos
         # ============================================
@@ -64,6 +135,7 @@ def init_db():
                 observacoes TEXT,  -- Observações adicionais
                 usuario_registro_id INTEGER,  -- Usuário que registrou o pagamento
                 data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                seq INTEGER,  -- Número da última mudança (feed de mudanças)
                 -- Define a relação com a tabela clientes
                 FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE,
                 -- Define a relação com a tabela usuarios
@@ -86,6 +158,200 @@ def init_db():
             )
         ''')
         
+        # ============================================
+        # Rollup de Receita Mensal (relatórios)
+        # ============================================
+        # Mês = mês de vencimento (competência). Mantido pelos triggers abaixo a cada
+        # INSERT/UPDATE/DELETE em pagamentos, então nunca precisa varrer a tabela inteira
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'receita_mensal'")
+        rollup_existia = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receita_mensal (
+                mes TEXT NOT NULL,  -- AAAA-MM do vencimento
+                status TEXT NOT NULL,
+                metodo_pagamento TEXT NOT NULL DEFAULT '',  -- '' quando não informado
+                quantidade INTEGER NOT NULL DEFAULT 0,
+                total REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (mes, status, metodo_pagamento)
+            ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_receita_insert AFTER INSERT ON pagamentos
+            BEGIN
+                INSERT INTO receita_mensal (mes, status, metodo_pagamento, quantidade, total)
+                VALUES (substr(NEW.vencimento, 1, 7), COALESCE(NEW.status, 'pendente'),
+                        COALESCE(NEW.metodo_pagamento, ''), 1, NEW.valor)
+                ON CONFLICT (mes, status, metodo_pagamento)
+                DO UPDATE SET quantidade = quantidade + 1, total = total + excluded.total;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_receita_delete AFTER DELETE ON pagamentos
+            BEGIN
+                UPDATE receita_mensal
+                SET quantidade = quantidade - 1, total = total - OLD.valor
+                WHERE mes = substr(OLD.vencimento, 1, 7)
+                  AND status = COALESCE(OLD.status, 'pendente')
+                  AND metodo_pagamento = COALESCE(OLD.metodo_pagamento, '');
+                DELETE FROM receita_mensal
+                WHERE mes = substr(OLD.vencimento, 1, 7)
+                  AND status = COALESCE(OLD.status, 'pendente')
+                  AND metodo_pagamento = COALESCE(OLD.metodo_pagamento, '')
+                  AND quantidade <= 0;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_receita_update
+            AFTER UPDATE OF valor, vencimento, status, metodo_pagamento ON pagamentos
+            BEGIN
+                UPDATE receita_mensal
+                SET quantidade = quantidade - 1, total = total - OLD.valor
+                WHERE mes = substr(OLD.vencimento, 1, 7)
+                  AND status = COALESCE(OLD.status, 'pendente')
+                  AND metodo_pagamento = COALESCE(OLD.metodo_pagamento, '');
+                DELETE FROM receita_mensal
+                WHERE mes = substr(OLD.vencimento, 1, 7)
+                  AND status = COALESCE(OLD.status, 'pendente')
+                  AND metodo_pagamento = COALESCE(OLD.metodo_pagamento, '')
+                  AND quantidade <= 0;
+                INSERT INTO receita_mensal (mes, status, metodo_pagamento, quantidade, total)
+                VALUES (substr(NEW.vencimento, 1, 7), COALESCE(NEW.status, 'pendente'),
+                        COALESCE(NEW.metodo_pagamento, ''), 1, NEW.valor)
+                ON CONFLICT (mes, status, metodo_pagamento)
+                DO UPDATE SET quantidade = quantidade + 1, total = total + excluded.total;
+            END
+        ''')
+        
+        # Banco antigo: preenche o rollup com os pagamentos já existentes
+        if not rollup_existia:
+            reconstruir_receita_mensal(cursor)
+        
+        # ============================================
+        # Resultados da análise de comportamento (analise.py)
+        # ============================================
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scores_clientes (
+                cliente_id INTEGER PRIMARY KEY,
+                pagamentos_avaliados INTEGER NOT NULL,  -- pagos + pendentes já vencidos
+                media_dias_atraso REAL NOT NULL,
+                taxa_em_dia REAL NOT NULL,  -- 0 a 1
+                maior_sequencia_atraso INTEGER NOT NULL,  -- pagamentos seguidos em atraso
+                pendencias_vencidas INTEGER NOT NULL,
+                risco REAL NOT NULL,  -- 0 (baixo) a 100 (alto)
+                calculado_em TIMESTAMP NOT NULL,
+                FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS coortes_churn (
+                mes_cadastro TEXT PRIMARY KEY,  -- AAAA-MM
+                clientes INTEGER NOT NULL,
+                retidos INTEGER NOT NULL,
+                evadidos INTEGER NOT NULL,
+                taxa_churn REAL NOT NULL,
+                permanencia_media_meses REAL NOT NULL,
+                calculado_em TIMESTAMP NOT NULL
+            )
+        ''')
+        
+        # ============================================
+        # Registro dos lembretes de pagamento (lembretes.py)
+        # ============================================
+        # Uma linha por cliente/canal em cada ciclo: é o que impede mandar o mesmo
+        # lembrete duas vezes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lembretes_enviados (
+                ciclo TEXT NOT NULL,  -- AAAA-MM-DD do envio
+                cliente_id INTEGER NOT NULL,
+                canal TEXT NOT NULL,  -- 'email', 'whatsapp', 'sms'
+                destino TEXT NOT NULL,
+                tipo TEXT NOT NULL,  -- 'atraso' ou 'vencendo'
+                status TEXT NOT NULL,  -- 'enviando', 'enviado', 'falhou'
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                erro TEXT,
+                atualizado_em TIMESTAMP NOT NULL,
+                PRIMARY KEY (ciclo, cliente_id, canal)
+            ) WITHOUT ROWID
+        ''')
+        
+        # ============================================
+        # Feed de mudanças (GET /api/mudancas)
+        # ============================================
+        # Cada linha de usuarios, clientes e pagamentos guarda em seq o número da sua
+        # última mudança, tirado de um contador único do banco; exclusões viram registros
+        # em mudancas_removidos. Quem mantém uma cópia local pede só o que tem seq maior
+        # que o último visto. Os triggers cobrem qualquer caminho de escrita (API,
+        # importação, scripts)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mudancas_contador (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                valor INTEGER NOT NULL,
+                removidos_ate INTEGER NOT NULL DEFAULT 0  -- exclusões até este seq já foram podadas
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO mudancas_contador (id, valor) VALUES (1, 0)')
+        colunas = {linha[1] for linha in cursor.execute('PRAGMA table_info(mudancas_contador)').fetchall()}
+        if 'removidos_ate' not in colunas:
+            cursor.execute('ALTER TABLE mudancas_contador ADD COLUMN removidos_ate INTEGER NOT NULL DEFAULT 0')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mudancas_removidos (
+                seq INTEGER PRIMARY KEY,
+                tabela TEXT NOT NULL,  -- '*' = recarregar tudo (ex: backup restaurado)
+                registro_id INTEGER NOT NULL,
+                removido_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Último '*' da unidade (cache.conferir_unidade) sem varrer as exclusões
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mudancas_removidos_tabela ON mudancas_removidos(tabela, seq)
+        ''')
+        
+        for tabela, colunas_mudanca in COLUNAS_MUDANCAS.items():
+            # Banco antigo: cria a coluna e numera as linhas existentes na ordem do id
+            colunas = {linha[1] for linha in cursor.execute(f'PRAGMA table_info({tabela})').fetchall()}
+            if 'seq' not in colunas:
+                cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN seq INTEGER')
+                cursor.execute(f'''
+                    UPDATE {tabela} SET seq = id + (SELECT valor FROM mudancas_contador WHERE id = 1)
+                ''')
+                cursor.execute(f'''
+                    UPDATE mudancas_contador
+                    SET valor = valor + (SELECT COALESCE(MAX(id), 0) FROM {tabela})
+                    WHERE id = 1
+                ''')
+            
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela}_seq ON {tabela}(seq)')
+            
+            # O UPDATE de seq dentro do trigger não dispara o de UPDATE (só as colunas listadas)
+            proximo_seq = f'''
+                UPDATE mudancas_contador SET valor = valor + 1 WHERE id = 1;
+                UPDATE {tabela} SET seq = (SELECT valor FROM mudancas_contador WHERE id = 1)
+                WHERE id = NEW.id;
+            '''
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_mudancas_{tabela}_insert AFTER INSERT ON {tabela}
+                BEGIN {proximo_seq} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_mudancas_{tabela}_update
+                AFTER UPDATE OF {', '.join(colunas_mudanca)} ON {tabela}
+                BEGIN {proximo_seq} END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_mudancas_{tabela}_delete AFTER DELETE ON {tabela}
+                BEGIN
+                    UPDATE mudancas_contador SET valor = valor + 1 WHERE id = 1;
+                    INSERT INTO mudancas_removidos (seq, tabela, registro_id)
+                    VALUES ((SELECT valor FROM mudancas_contador WHERE id = 1), '{tabela}', OLD.id);
+                END
+            ''')
+        
         # ============================================
         # Índices para melhorar performance nas consultas
         # ============================================
@@ -98,9 +364,20 @@ def init_db():
         # Índice para buscar pagamentos por vencimento
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_vencimento ON pagamentos(vencimento)')
         
+        # Pendências por vencimento já com cliente e valor (seleção dos lembretes sem
+        # ler a tabela pagamentos)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_pagamentos_status_vencimento
+            ON pagamentos(status, vencimento, cliente_id, valor)
+        ''')
+        
         # Índice para buscar usuários por email (usado no login)
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuario_email ON usuarios(email)')
         
+        # Índices para a busca de clientes por CPF/telefone (igualdade ou prefixo)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_cpf_digitos ON clientes(cpf_digitos)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clientes_telefone_digitos ON clientes(telefone_digitos)')
+        
         # ============================================
         # Cria usuário administrador padrão
         # ============================================
@@ -121,6 +398,7 @@ def init_db():
         
         # Salva as alterações no banco de dados
         conn.commit()
+        _inicializados.add(os.path.abspath(caminho))
         print("✓ Banco de dados inicializado com sucesso!")
         
     except sqlite3.Error as e:
@@ -133,18 +411,429 @@ def init_db():
             conn.close()
 
 
+def marcar_recarga_total(conn, minimo=0):
+    """
+    Registra no feed de mudanças um '*': quem sincronizou antes dele descarta a cópia
+    local e recarrega tudo (o conteúdo do banco foi trocado, ex: backup restaurado)
+    minimo: contador do banco anterior, para o seq nunca voltar atrás
+    """
+    conn.execute('UPDATE mudancas_contador SET valor = MAX(valor, ?) + 1 WHERE id = 1', (minimo,))
+    conn.execute('''
+        INSERT INTO mudancas_removidos (seq, tabela, registro_id)
+        SELECT valor, '*', 0 FROM mudancas_contador WHERE id = 1
+    ''')
+
+
+def geracao_banco(conn):
+    """
+    seq do último '*' do feed de mudanças (0 se nunca houve): muda quando o conteúdo do
+    banco é trocado, mesmo por outro processo (ex: backup restaurado pela linha de comando)
+    """
+    linha = conn.execute('''
+        SELECT COALESCE(MAX(seq), 0) FROM mudancas_removidos WHERE tabela = '*'
+    ''').fetchone()
+    return linha[0]
+
+
+def somente_digitos(valor):
+    """
+    Só os dígitos de um CPF/telefone ('123.456.789-00' -> '12345678900'); None se não sobrar nenhum
+    """
+    digitos = re.sub(r'\D', '', valor or '')
+    return digitos or None
+
+
+def reconstruir_receita_mensal(cursor):
+    """
+    Recalcula todo o rollup receita_mensal a partir de pagamentos
+    (não faz commit: quem chama controla a transação)
+    """
+    cursor.execute('DELETE FROM receita_mensal')
+    cursor.execute('''
+        INSERT INTO receita_mensal (mes, status, metodo_pagamento, quantidade, total)
+        SELECT substr(vencimento, 1, 7), COALESCE(status, 'pendente'),
+               COALESCE(metodo_pagamento, ''), COUNT(*), SUM(valor)
+        FROM pagamentos
+        GROUP BY 1, 2, 3
+    ''')
+
+
+class CursorMonitorado(sqlite3.Cursor):
+    """
+    Cursor que mede o tempo gasto dentro do SQLite em cada comando
+    O tempo de um SELECT inclui a leitura das linhas (fetch), então o comando só é
+    encerrado quando o resultado é consumido, o cursor é reutilizado ou a conexão fecha
+    """
+
+    def __init__(self, conexao):
+        super().__init__(conexao)
+        self._comando = None  # [sql, parametros, segundos] do comando em aberto
+
+    def _encerrar_comando(self):
+        if self._comando is not None:
+            sql, parametros, segundos = self._comando
+            self._comando = None
+            consultas_lentas.avaliar(self.connection, sql, parametros, segundos)
+
+    def _somar_tempo(self, segundos):
+        metricas.registrar_tempo_sql(segundos)
+        if self._comando is not None:
+            self._comando[2] += segundos
+
+    def execute(self, sql, parametros=()):
+        self._encerrar_comando()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            segundos = time.perf_counter() - inicio
+            metricas.registrar_tempo_sql(segundos)
+            self._comando = [sql, parametros, segundos]
+            # Comandos sem resultado (INSERT/UPDATE/DELETE) terminam aqui
+            if self.description is None:
+                self._encerrar_comando()
+
+    def executemany(self, sql, seq_parametros):
+        self._encerrar_comando()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_parametros)
+        finally:
+            segundos = time.perf_counter() - inicio
+            metricas.registrar_tempo_sql(segundos)
+            consultas_lentas.avaliar(self.connection, sql, None, segundos)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            linha = super().fetchone()
+        finally:
+            self._somar_tempo(time.perf_counter() - inicio)
+        if linha is None:
+            self._encerrar_comando()
+        return linha
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._somar_tempo(time.perf_counter() - inicio)
+            self._encerrar_comando()
+
+    def close(self):
+        self._encerrar_comando()
+        super().close()
+
+
+class ConexaoMonitorada(sqlite3.Connection):
+    """
+    Conexão cujos cursores são instrumentados (CursorMonitorado)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursores = []
+        self._pool = None  # PoolConexoes de origem (None = conexão avulsa)
+        self._emprestada = False
+
+    def cursor(self, factory=CursorMonitorado):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, CursorMonitorado):
+            self._cursores.append(cursor)
+        return cursor
+
+    def execute(self, sql, parametros=()):
+        # O atalho conn.execute() do sqlite3 ignora a factory; redireciona para o cursor monitorado
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, seq_parametros):
+        return self.cursor().executemany(sql, seq_parametros)
+
+    def liberar_cursores(self):
+        """
+        Encerra comandos cujo resultado não foi lido até o fim (ex: fetchone de uma linha)
+        e esquece os cursores (conexões de vida longa chamam a cada transação)
+        """
+        for cursor in self._cursores:
+            cursor._encerrar_comando()
+        self._cursores = []
+
+    def close(self):
+        self.liberar_cursores()
+
+        # Conexões do pool voltam para ele em vez de fechar de verdade
+        if self._pool is not None:
+            if not self._emprestada:
+                return  # close() repetido: já foi devolvida
+            self._emprestada = False
+            if self._pool.devolver(self):
+                return
+        super().close()
+
+
+class PoolConexoes:
+    """
+    Conexões reaproveitáveis de um arquivo de banco (uma unidade)
+    Aberto sob demanda no primeiro get_connection() da unidade e fechado pelo
+    coletor quando fica POOL_TEMPO_OCIOSO segundos sem uso
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.ultimo_uso = time.monotonic()
+        self.emprestadas = 0
+        self.fechado = False
+        self._livres = []
+        self._lock = threading.Lock()
+
+    def obter(self):
+        with self._lock:
+            self.ultimo_uso = time.monotonic()
+            self.emprestadas += 1
+            conn = self._livres.pop() if self._livres else None
+
+        if conn is None:
+            try:
+                # check_same_thread=False: a conexão pode voltar ao pool e ser usada por outra thread
+                # (nunca por duas ao mesmo tempo)
+                conn = sqlite3.connect(self.caminho, factory=ConexaoMonitorada, check_same_thread=False)
+            except sqlite3.Error:
+                with self._lock:
+                    self.emprestadas -= 1
+                raise
+            conn._pool = self
+            # Isso DEVE ser definido após connect() mas ANTES de usar o cursor
+            _configurar_conexao(conn)
+
+        conn._emprestada = True
+        return conn
+
+    def devolver(self, conn):
+        """
+        Recebe a conexão de volta; retorna False se ela deve ser fechada
+        """
+        try:
+            # Nunca devolve transação pendente para o próximo usuário
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            with self._lock:
+                self.emprestadas -= 1
+            return False
+
+        with self._lock:
+            self.emprestadas -= 1
+            self.ultimo_uso = time.monotonic()
+            if self.fechado or len(self._livres) >= POOL_MAX_LIVRES:
+                return False
+            self._livres.append(conn)
+            return True
+
+    def fechar(self):
+        with self._lock:
+            self.fechado = True
+            livres, self._livres = self._livres, []
+        for conn in livres:
+            conn._pool = None
+            conn.close()
+
+
+def tenant_atual():
+    """
+    Unidade da requisição atual (definida por usar_tenant)
+    """
+    return getattr(_contexto, 'tenant', None) or TENANT_PADRAO
+
+
+def caminho_banco(tenant=None):
+    """
+    Arquivo do banco de uma unidade (padrão: a unidade atual)
+    """
+    tenant = tenant or tenant_atual()
+    if tenant == TENANT_PADRAO:
+        return DB_PATH
+    return os.path.join(PASTA_TENANTS, f'{tenant}.db')
+
+
+def tenant_valido(tenant):
+    """
+    Unidade existe (já tem banco) ou está liberada em FLOWFIT_TENANTS
+    """
+    if tenant == TENANT_PADRAO:
+        return True
+    if not tenant or not _RE_TENANT.match(tenant):
+        return False
+    return tenant in TENANTS_PERMITIDOS or os.path.exists(caminho_banco(tenant))
+
+
+def listar_tenants():
+    """
+    Todas as unidades conhecidas: a padrão, as liberadas e as que já têm banco
+    """
+    tenants = {TENANT_PADRAO} | TENANTS_PERMITIDOS
+    if os.path.isdir(PASTA_TENANTS):
+        for arquivo in os.listdir(PASTA_TENANTS):
+            nome, extensao = os.path.splitext(arquivo)
+            if extensao == '.db' and _RE_TENANT.match(nome):
+                tenants.add(nome)
+    return sorted(tenants)
+
+
+@contextmanager
+def usar_tenant(tenant):
+    """
+    Direciona get_connection()/get_connection_leitura() do bloco para o banco da unidade
+    """
+    tenant = tenant or TENANT_PADRAO
+    if not tenant_valido(tenant):
+        raise ValueError(f"Unidade desconhecida: {tenant}")
+
+    anterior = getattr(_contexto, 'tenant', None)
+    _contexto.tenant = tenant
+    try:
+        yield
+    finally:
+        _contexto.tenant = anterior
+
+
+def _obter_pool(caminho):
+    """
+    Pool da unidade, criado (e o banco inicializado) no primeiro uso
+    """
+    global _coletor_iniciado
+
+    pool = _pools.get(caminho)
+    if pool is not None and not pool.fechado:
+        return pool
+
+    with _lock_pools:
+        pool = _pools.get(caminho)
+        if pool is None or pool.fechado:
+            if os.path.abspath(caminho) not in _inicializados:
+                init_db(caminho)
+            pool = PoolConexoes(caminho)
+            _pools[caminho] = pool
+
+        if not _coletor_iniciado:
+            _coletor_iniciado = True
+            threading.Thread(target=_coletar_pools_ociosos, name='coletor-pools', daemon=True).start()
+    return pool
+
+
+def _coletar_pools_ociosos():
+    """
+    Fecha os pools das unidades sem uso há mais de POOL_TEMPO_OCIOSO segundos
+    """
+    while True:
+        time.sleep(max(POOL_TEMPO_OCIOSO / 4, 1))
+        agora = time.monotonic()
+        with _lock_pools:
+            ociosos = [caminho for caminho, pool in _pools.items()
+                       if pool.emprestadas == 0 and agora - pool.ultimo_uso > POOL_TEMPO_OCIOSO]
+            fechar = [_pools.pop(caminho) for caminho in ociosos]
+        for pool in fechar:
+            pool.fechar()
+
+
+def estatisticas_pools():
+    """
+    Situação dos pools abertos (para diagnóstico)
+    """
+    with _lock_pools:
+        pools = list(_pools.values())
+    agora = time.monotonic()
+    return [{
+        "banco": pool.caminho,
+        "emprestadas": pool.emprestadas,
+        "livres": len(pool._livres),
+        "ocioso_ha_segundos": round(agora - pool.ultimo_uso, 1)
+    } for pool in pools]
+
+
 def get_connection():
     """
+    Conexão com o banco da unidade atual, vinda do pool da unidade
+    (conn.close() devolve a conexão ao pool)
 
     Returns:
         sqlite3.Connection: Objeto de conexão com o banco de dados
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        # row_factory permite acessar colunas por nome: row['nome'] ao invés de row[0]
-        # Isso DEVE ser definido após connect() mas ANTES de usar o cursor
-        conn.row_factory = sqlite3.Row
-        return conn
+        return _obter_pool(caminho_banco()).obter()
     except sqlite3.Error as e:
         print(f"✗ Erro ao conectar ao banco de dados: {e}")
-        raise  # Re-lança a exceção para ser tratada pelo código chamador
\ No newline at end of file
+        raise  # Re-lança a exceção para ser tratada pelo código chamador
+
+
+def abrir_conexao_escrita(caminho, timeout=5.0):
+    """
+    Conexão própria (fora do pool) da thread escritora de uma unidade (escrita.py)
+    isolation_level=None: a escritora abre e fecha as transações (BEGIN IMMEDIATE/COMMIT)
+    """
+    if os.path.abspath(caminho) not in _inicializados:
+        _obter_pool(caminho)  # garante que o banco da unidade já existe
+    conn = sqlite3.connect(caminho, factory=ConexaoMonitorada, check_same_thread=False,
+                           isolation_level=None, timeout=timeout)
+    return _configurar_conexao(conn)
+
+
+def _configurar_conexao(conn):
+    """
+    Aplica a instrumentação e o row_factory usados por todas as conexões
+    """
+    # Conta cada comando executado (inclusive BEGIN/COMMIT implícitos) nas métricas
+    conn.set_trace_callback(metricas.registrar_comando)
+    # row_factory permite acessar colunas por nome: row['nome'] ao invés de row[0]
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@contextmanager
+def snapshot_leitura():
+    """
+    Faz as leituras de relatório/listagem feitas dentro do bloco usarem
+    get_connection_leitura() em modo snapshot. Pode ser usado como decorador de rota:
+
+        @app.route('/api/inadimplentes')
+        @database.snapshot_leitura()
+        def get_inadimplentes(): ...
+    """
+    anterior = getattr(_contexto, 'snapshot', False)
+    _contexto.snapshot = True
+    try:
+        yield
+    finally:
+        _contexto.snapshot = anterior
+
+
+def get_connection_leitura():
+    """
+    Conexão para consultas pesadas (relatórios e listagens)
+
+    Dentro de snapshot_leitura() abre uma conexão somente leitura (mode=ro) com uma
+    transação de leitura aberta: todas as consultas feitas nela enxergam o mesmo
+    snapshot do WAL e nunca bloqueiam (nem são bloqueadas por) quem está escrevendo.
+    Fora do snapshot devolve uma conexão comum de get_connection().
+
+    Returns:
+        sqlite3.Connection: Objeto de conexão com o banco de dados
+    """
+    if not (LEITURA_SNAPSHOT and getattr(_contexto, 'snapshot', False)):
+        return get_connection()
+
+    try:
+        caminho = caminho_banco()
+        if os.path.abspath(caminho) not in _inicializados:
+            _obter_pool(caminho)  # garante que o banco da unidade já existe
+        uri = 'file:' + os.path.abspath(caminho).replace('?', '%3f') + '?mode=ro'
+        # isolation_level=None: o controle de transação fica com a gente (BEGIN abaixo)
+        conn = sqlite3.connect(uri, uri=True, isolation_level=None, factory=ConexaoMonitorada)
+        _configurar_conexao(conn)
+        # A transação de leitura fixa o snapshot na primeira consulta e vale até o close()
+        conn.execute('BEGIN')
+        return conn
+    except sqlite3.Error as e:
+        print(f"✗ Erro ao abrir conexão de leitura, usando conexão comum: {e}")
+        return get_connection()
\ No newline at end of file
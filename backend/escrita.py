@@ -0,0 +1,267 @@
+"""
+Escrita - Uma Thread Escritora por Banco, com Commit em Grupo
+Com o servidor em threads, cada escrita abria a própria conexão e disputava a
+trava de escrita do SQLite ("database is locked"). Agora as escritas de clientes,
+pagamentos, usuários e histórico entram numa fila; uma única thread por banco
+(dona de uma única conexão) junta o que estiver na fila numa transação só:
+
+    BEGIN IMMEDIATE
+      SAVEPOINT -> operação 1 -> RELEASE   (erro: ROLLBACK TO, só ela falha)
+      SAVEPOINT -> operação 2 -> RELEASE
+      ...
+    COMMIT                                 (um fsync para o lote inteiro)
+
+Quem escreve recebe um Future com o resultado da sua operação ou o erro dela,
+já traduzido: ErroRestricao (UNIQUE, NOT NULL, FOREIGN KEY...) ou
+ErroBancoOcupado (trava não liberada a tempo).
+
+Uso:
+    def inserir(conn):
+        return conn.execute('INSERT INTO ...', (...)).lastrowid
+
+    novo_id = escrita.executar(inserir)    # espera o commit
+    futuro = escrita.enviar(inserir)       # devolve o Future na hora
+
+Configuração:
+    FLOWFIT_ESCRITA_MAX_LOTE=64     operações por transação
+    FLOWFIT_ESCRITA_PRAZO=10        espera máxima (s) de executar() pelo commit
+    FLOWFIT_ESCRITA_TRAVA=5         espera (s) pela trava do arquivo (busy timeout)
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as TempoEsgotado
+
+import database
+
+MAX_LOTE = int(os.environ.get('FLOWFIT_ESCRITA_MAX_LOTE', 64))
+PRAZO = float(os.environ.get('FLOWFIT_ESCRITA_PRAZO', 10))
+PRAZO_TRAVA = float(os.environ.get('FLOWFIT_ESCRITA_TRAVA', 5))
+
+# Escritora sem trabalho por esse tempo fecha a conexão e encerra (unidades ociosas)
+TEMPO_OCIOSO = database.POOL_TEMPO_OCIOSO
+
+# "UNIQUE constraint failed: clientes.cpf" -> ('UNIQUE', 'clientes.cpf')
+_RE_RESTRICAO = re.compile(r'^(UNIQUE|NOT NULL|CHECK|FOREIGN KEY) constraint failed(?:: (.+))?$')
+
+
+class ErroEscrita(Exception):
+    """
+    Base dos erros de escrita traduzidos do sqlite3
+    """
+
+
+class ErroRestricao(ErroEscrita):
+    """
+    A operação violou uma restrição do banco (ex: CPF ou email repetido)
+    tipo: 'UNIQUE', 'NOT NULL', 'CHECK' ou 'FOREIGN KEY'; restricao: 'tabela.coluna'
+    """
+
+    def __init__(self, mensagem):
+        super().__init__(mensagem)
+        encontrado = _RE_RESTRICAO.match(mensagem)
+        self.tipo = encontrado.group(1) if encontrado else None
+        self.restricao = encontrado.group(2) if encontrado else None
+
+
+def mensagem_restricao(erro, restricao, repetido):
+    """
+    Mensagem para o usuário a partir da restrição violada
+    restricao: UNIQUE que vira a mensagem 'repetido' (ex: 'clientes.cpf' -> "CPF já cadastrado")
+    """
+    if erro.tipo == 'UNIQUE' and erro.restricao == restricao:
+        return repetido
+    return f"Dados inválidos: {erro}"
+
+
+class ErroBancoOcupado(ErroEscrita):
+    """
+    A trava de escrita não foi liberada a tempo (ou a fila não andou no prazo)
+    """
+
+
+def traduzir_erro(erro):
+    """
+    Erro tipado equivalente a uma exceção do sqlite3 (outras passam como estão)
+    """
+    if isinstance(erro, sqlite3.IntegrityError):
+        return ErroRestricao(str(erro))
+    if isinstance(erro, sqlite3.OperationalError) and ('locked' in str(erro) or 'busy' in str(erro)):
+        return ErroBancoOcupado(str(erro))
+    return erro
+
+
+class _Operacao:
+    __slots__ = ('funcao', 'args', 'futuro')
+
+    def __init__(self, funcao, args):
+        self.funcao = funcao
+        self.args = args
+        self.futuro = Future()
+
+
+class Escritora(threading.Thread):
+    """
+    Dona da única conexão de escrita de um arquivo de banco
+    """
+
+    def __init__(self, caminho):
+        super().__init__(name=f'escritora-{os.path.basename(caminho)}', daemon=True)
+        self.caminho = caminho
+        self.fila = queue.Queue()
+        self.lotes = 0
+        self.operacoes = 0
+        self.falhas = 0
+        self.maior_lote = 0
+        self.tempo_commit = 0.0
+
+    def run(self):
+        conn = None
+        try:
+            while True:
+                try:
+                    primeira = self.fila.get(timeout=TEMPO_OCIOSO)
+                except queue.Empty:
+                    if _aposentar(self):
+                        return
+                    continue
+
+                # O que chegou enquanto o lote anterior fazia commit entra junto neste
+                lote = [primeira]
+                while len(lote) < MAX_LOTE:
+                    try:
+                        lote.append(self.fila.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if conn is None:
+                    try:
+                        conn = database.abrir_conexao_escrita(self.caminho, PRAZO_TRAVA)
+                    except Exception as e:
+                        for operacao in lote:
+                            if operacao.futuro.set_running_or_notify_cancel():
+                                operacao.futuro.set_exception(traduzir_erro(e))
+                        continue
+                self._executar_lote(conn, lote)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _executar_lote(self, conn, lote):
+        # Operações canceladas por quem desistiu de esperar ficam de fora
+        ativas = [op for op in lote if op.futuro.set_running_or_notify_cancel()]
+        if not ativas:
+            return
+
+        resultados = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operacao in ativas:
+                conn.execute('SAVEPOINT operacao')
+                try:
+                    resultado = operacao.funcao(conn, *operacao.args)
+                    conn.execute('RELEASE operacao')
+                    resultados.append((operacao, resultado, None))
+                except Exception as e:
+                    # Desfaz só esta operação; as outras do lote seguem
+                    conn.execute('ROLLBACK TO operacao')
+                    conn.execute('RELEASE operacao')
+                    resultados.append((operacao, None, traduzir_erro(e)))
+
+            inicio = time.perf_counter()
+            conn.execute('COMMIT')
+            self.tempo_commit += time.perf_counter() - inicio
+        except Exception as e:
+            # BEGIN/COMMIT falhou (ex: trava presa por outro processo): o lote inteiro falha
+            if conn.in_transaction:
+                try:
+                    conn.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+            erro = traduzir_erro(e)
+            for operacao in ativas:
+                operacao.futuro.set_exception(erro)
+            self.falhas += len(ativas)
+            return
+        finally:
+            conn.liberar_cursores()
+
+        self.lotes += 1
+        self.operacoes += len(ativas)
+        self.maior_lote = max(self.maior_lote, len(ativas))
+        # Os resultados só são entregues depois do commit: quem recebe já enxerga o dado
+        for operacao, resultado, erro in resultados:
+            if erro is None:
+                operacao.futuro.set_result(resultado)
+            else:
+                self.falhas += 1
+                operacao.futuro.set_exception(erro)
+
+    def situacao(self):
+        return {
+            "banco": self.caminho,
+            "na_fila": self.fila.qsize(),
+            "lotes": self.lotes,
+            "operacoes": self.operacoes,
+            "media_por_lote": round(self.operacoes / self.lotes, 2) if self.lotes else 0,
+            "maior_lote": self.maior_lote,
+            "falhas": self.falhas,
+            "tempo_commit_ms": round(self.tempo_commit * 1000, 2)
+        }
+
+
+# Escritoras abertas (caminho do banco -> Escritora)
+_escritoras = {}
+_lock = threading.Lock()
+
+
+def _aposentar(escritora):
+    """
+    Tira a escritora ociosa do registro; False se chegou trabalho nesse meio tempo
+    """
+    with _lock:
+        if not escritora.fila.empty():
+            return False
+        if _escritoras.get(escritora.caminho) is escritora:
+            del _escritoras[escritora.caminho]
+        return True
+
+def enviar(funcao, *args):
+    """
+    Enfileira funcao(conn, *args) na escritora do banco da unidade atual
+    A função só executa comandos (quem faz BEGIN/COMMIT é a escritora)
+    Devolve um Future com o retorno da função ou o erro (já traduzido)
+    """
+    caminho = database.caminho_banco()
+    operacao = _Operacao(funcao, args)
+    # Mesmo lock de _aposentar: a operação nunca cai na fila de uma escritora que está saindo
+    with _lock:
+        escritora = _escritoras.get(caminho)
+        if escritora is None:
+            escritora = _escritoras[caminho] = Escritora(caminho)
+            escritora.start()
+        escritora.fila.put(operacao)
+    return operacao.futuro
+
+def executar(funcao, *args, prazo=None):
+    """
+    Como enviar(), mas espera o commit e devolve o resultado (ou levanta o erro)
+    """
+    futuro = enviar(funcao, *args)
+    try:
+        return futuro.result(timeout=prazo or PRAZO)
+    except TempoEsgotado:
+        # Ainda na fila: desiste sem risco de a operação rodar depois
+        if futuro.cancel():
+            raise ErroBancoOcupado('A fila de escrita não andou no prazo')
+        # Já está no lote em andamento: o resultado sai junto com o commit
+        return futuro.result()
+
+def situacao():
+    with _lock:
+        escritoras = list(_escritoras.values())
+    return [e.situacao() for e in escritoras]
@@ -0,0 +1,224 @@
+"""
+Estáticos - Frontend Servido pelo Próprio Flask
+As páginas de frontend/ passam a sair da mesma origem da API (sem CORS nem
+preflight a cada fetchAuth).
+
+Build (gera frontend/dist):
+    python estaticos.py
+
+    - css/, js/ e midia/ ganham o hash do conteúdo no nome (style.3f2a9c1b0d.css)
+    - os HTML são reescritos para apontar para os nomes com hash
+    - arquivos de texto são pré-comprimidos em .gz (e .br, se o pacote
+      'brotli' estiver instalado)
+
+Servidos com o build: assets com hash levam cache de um ano (immutable); HTML
+leva cache curto e é revalidado por ETag. Sem o build, frontend/ é servido
+direto e sem cache (modo de desenvolvimento).
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+
+from flask import request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # .br é opcional: sem o pacote, só .gz
+    brotli = None
+
+PASTA_FRONTEND = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+PASTA_DIST = os.path.join(PASTA_FRONTEND, 'dist')
+ARQUIVO_MANIFESTO = 'manifest.json'
+
+CACHE_ASSETS = 'public, max-age=31536000, immutable'
+CACHE_HTML = f"public, max-age={int(os.environ.get('FLOWFIT_CACHE_HTML', 60))}, must-revalidate"
+CACHE_DESENVOLVIMENTO = 'no-cache'
+
+# Tipos que compensam pré-comprimir (imagens já vêm comprimidas)
+EXTENSOES_TEXTO = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+TAMANHO_MINIMO_COMPRESSAO = 256
+
+_RE_REFERENCIA_HTML = re.compile(r'''(href|src)=(["'])([^"'#?]+)([^"']*)\2''')
+_RE_REFERENCIA_CSS = re.compile(r'''url\(\s*(["']?)([^"')#?]+)([^"')]*)\1\s*\)''')
+
+# ==================== BUILD ====================
+
+def _nome_com_hash(relativo, conteudo):
+    base, extensao = os.path.splitext(relativo)
+    return f'{base}.{hashlib.sha256(conteudo).hexdigest()[:10]}{extensao}'
+
+def _resolver(origem, referencia):
+    """
+    Caminho (relativo a frontend/) de uma referência feita dentro de 'origem'
+    """
+    if re.match(r'^[a-z]+:|^//|^/', referencia):
+        return None
+    return os.path.normpath(os.path.join(os.path.dirname(origem), referencia)).replace(os.sep, '/')
+
+def _relativo_a(origem, destino):
+    return os.path.relpath(destino, os.path.dirname(origem) or '.').replace(os.sep, '/')
+
+def _reescrever(origem, texto, manifesto, expressao, grupo):
+    """
+    Troca as referências para assets pelos nomes com hash
+    """
+    def trocar(encontrado):
+        alvo = _resolver(origem, encontrado.group(grupo))
+        if alvo not in manifesto:
+            return encontrado.group(0)
+        inicio, fim = encontrado.span(grupo)
+        deslocamento = encontrado.start(0)
+        completo = encontrado.group(0)
+        return (completo[:inicio - deslocamento] + _relativo_a(origem, manifesto[alvo])
+                + completo[fim - deslocamento:])
+    return expressao.sub(trocar, texto)
+
+def _comprimir(caminho):
+    """
+    Grava .gz (e .br) ao lado do arquivo quando ficam menores que o original
+    """
+    with open(caminho, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    if len(conteudo) < TAMANHO_MINIMO_COMPRESSAO:
+        return []
+
+    gerados = []
+    # mtime=0: o mesmo conteúdo sempre gera o mesmo .gz
+    comprimido = gzip.compress(conteudo, compresslevel=9, mtime=0)
+    if len(comprimido) < len(conteudo):
+        with open(caminho + '.gz', 'wb') as saida:
+            saida.write(comprimido)
+        gerados.append('.gz')
+    if brotli:
+        comprimido = brotli.compress(conteudo, quality=11)
+        if len(comprimido) < len(conteudo):
+            with open(caminho + '.br', 'wb') as saida:
+                saida.write(comprimido)
+            gerados.append('.br')
+    return gerados
+
+def construir():
+    """
+    Gera frontend/dist com nomes por hash, HTML reescrito e versões comprimidas
+    """
+    arquivos = []
+    for pasta, subpastas, nomes in os.walk(PASTA_FRONTEND):
+        if os.path.abspath(pasta) == PASTA_FRONTEND:
+            subpastas[:] = [s for s in subpastas if s != 'dist']
+        for nome in nomes:
+            caminho = os.path.join(pasta, nome)
+            arquivos.append(os.path.relpath(caminho, PASTA_FRONTEND).replace(os.sep, '/'))
+
+    # Imagens e outros antes do CSS (que pode apontar para eles); HTML por último
+    def ordem(relativo):
+        extensao = os.path.splitext(relativo)[1]
+        return {'.css': 1, '.js': 2, '.html': 3}.get(extensao, 0), relativo
+
+    if os.path.isdir(PASTA_DIST):
+        shutil.rmtree(PASTA_DIST)
+    os.makedirs(PASTA_DIST)
+
+    manifesto = {}
+    for relativo in sorted(arquivos, key=ordem):
+        with open(os.path.join(PASTA_FRONTEND, relativo), 'rb') as arquivo:
+            conteudo = arquivo.read()
+
+        extensao = os.path.splitext(relativo)[1]
+        if extensao == '.html':
+            texto = _reescrever(relativo, conteudo.decode('utf-8'), manifesto, _RE_REFERENCIA_HTML, 3)
+            conteudo = texto.encode('utf-8')
+            destino = relativo
+        else:
+            if extensao == '.css':
+                texto = _reescrever(relativo, conteudo.decode('utf-8'), manifesto, _RE_REFERENCIA_CSS, 2)
+                conteudo = texto.encode('utf-8')
+            destino = _nome_com_hash(relativo, conteudo)
+            manifesto[relativo] = destino
+
+        caminho = os.path.join(PASTA_DIST, destino)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as saida:
+            saida.write(conteudo)
+        if extensao in EXTENSOES_TEXTO:
+            _comprimir(caminho)
+
+    with open(os.path.join(PASTA_DIST, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as saida:
+        json.dump(manifesto, saida, indent=2, sort_keys=True)
+    return manifesto
+
+# ==================== SERVIDOR ====================
+
+_cache_manifesto = {}
+
+def _versoes_com_hash():
+    """
+    Nomes com hash do build atual (recarregados se o manifesto mudar)
+    """
+    caminho = os.path.join(PASTA_DIST, ARQUIVO_MANIFESTO)
+    try:
+        modificado = os.path.getmtime(caminho)
+    except OSError:
+        return None
+    if _cache_manifesto.get('modificado') != modificado:
+        with open(caminho, encoding='utf-8') as arquivo:
+            _cache_manifesto['nomes'] = set(json.load(arquivo).values())
+        _cache_manifesto['modificado'] = modificado
+    return _cache_manifesto['nomes']
+
+def resposta_arquivo(relativo):
+    """
+    Resposta para um arquivo do frontend (None se não existir)
+    Usa o build em frontend/dist quando ele existe
+    """
+    com_hash = _versoes_com_hash()
+    pasta = PASTA_DIST if com_hash is not None else PASTA_FRONTEND
+
+    caminho = safe_join(pasta, relativo)
+    if not caminho or not os.path.isfile(caminho) or relativo == ARQUIVO_MANIFESTO:
+        return None
+    if caminho.endswith(('.gz', '.br')):
+        return None
+
+    if com_hash is None:
+        cache = CACHE_DESENVOLVIMENTO
+    elif relativo in com_hash:
+        cache = CACHE_ASSETS
+    else:
+        cache = CACHE_HTML
+
+    # O tipo vem do arquivo original, não do .gz/.br
+    tipo = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+
+    # Versão pré-comprimida, se o navegador aceitar
+    codificacao = None
+    for aceita, sufixo in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[aceita] and os.path.isfile(caminho + sufixo):
+            codificacao, caminho = aceita, caminho + sufixo
+            break
+
+    resposta = send_file(caminho, mimetype=tipo, conditional=True, etag=True)
+    resposta.headers['Cache-Control'] = cache
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    return resposta
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        print("Uso: python estaticos.py")
+        sys.exit(1)
+
+    manifesto = construir()
+    comprimidos = sum(1 for _, _, nomes in os.walk(PASTA_DIST) for n in nomes if n.endswith(('.gz', '.br')))
+    print(f"✓ Frontend gerado em {PASTA_DIST}")
+    print(f"  {len(manifesto)} assets com hash, {comprimidos} versões comprimidas")
+    if brotli is None:
+        print("  (instale o pacote 'brotli' para gerar também as versões .br)")
@@ -0,0 +1,247 @@
+"""
+Eventos - Stream de Server-Sent Events para o Dashboard
+Um único broker por processo recebe os eventos publicados pelos models depois do
+commit (pagamentos e clientes) e as variações periódicas das estatísticas, e
+repassa para todos os assinantes da mesma unidade.
+
+Cada evento recebe um id crescente e fica num buffer circular: ao reconectar, o
+navegador envia Last-Event-ID e recebe tudo o que perdeu (ou um evento "reset"
+se o buffer já descartou esses ids).
+
+Configuração:
+    FLOWFIT_SSE_MAX_ASSINANTES  assinantes simultâneos por processo (padrão 100)
+    FLOWFIT_SSE_BUFFER          eventos guardados para replay (padrão 1000)
+    FLOWFIT_SSE_HEARTBEAT       segundos entre heartbeats (padrão 15)
+    FLOWFIT_SSE_ESTATISTICAS    segundos entre variações das estatísticas (padrão 30)
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+import database
+
+MAX_ASSINANTES = int(os.environ.get('FLOWFIT_SSE_MAX_ASSINANTES', 100))
+TAMANHO_BUFFER = int(os.environ.get('FLOWFIT_SSE_BUFFER', 1000))
+INTERVALO_HEARTBEAT = float(os.environ.get('FLOWFIT_SSE_HEARTBEAT', 15))
+INTERVALO_ESTATISTICAS = float(os.environ.get('FLOWFIT_SSE_ESTATISTICAS', 30))
+
+# Eventos pendentes por assinante; quem não consome é desconectado e faz replay ao voltar
+TAMANHO_FILA_ASSINANTE = 256
+
+# Chave do environ WSGI com que o servidor ASGI pede a assinatura em vez do gerador
+CHAVE_STREAM_ASYNC = 'flowfit.stream_async'
+
+
+class LimiteAssinantes(Exception):
+    """
+    Processo já atende o máximo de assinantes
+    """
+
+
+class Assinatura:
+    """
+    Conexão SSE de um navegador
+    """
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.fila = queue.Queue(maxsize=TAMANHO_FILA_ASSINANTE)
+        self.ativa = True
+        self.avisar = None  # chamado a cada evento ou cancelamento (stream_async)
+
+    def _notificar(self):
+        avisar = self.avisar
+        if avisar is not None:
+            try:
+                avisar()
+            except RuntimeError:
+                pass  # laço de eventos já encerrado
+
+
+class Broker:
+    """
+    Distribui eventos para os assinantes e guarda os últimos para replay
+    """
+
+    def __init__(self, tamanho_buffer=TAMANHO_BUFFER, max_assinantes=MAX_ASSINANTES):
+        self.max_assinantes = max_assinantes
+        self._buffer = deque(maxlen=tamanho_buffer)  # (id, tenant, tipo, dados_json)
+        self._ultimo_id = 0
+        self._assinantes = []
+        self._lock = threading.Lock()
+
+    def publicar(self, tipo, dados, tenant=None):
+        """
+        Registra o evento no buffer e entrega a todos os assinantes da unidade
+        """
+        tenant = tenant or database.tenant_atual()
+        dados_json = json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+
+        with self._lock:
+            self._ultimo_id += 1
+            evento = (self._ultimo_id, tenant, tipo, dados_json)
+            self._buffer.append(evento)
+            assinantes = [a for a in self._assinantes if a.tenant == tenant]
+
+        for assinatura in assinantes:
+            try:
+                assinatura.fila.put_nowait(evento)
+            except queue.Full:
+                # Assinante travado: derruba para ele reconectar e pegar o replay
+                self.cancelar(assinatura)
+            assinatura._notificar()
+        return evento[0]
+
+    def assinar(self, tenant, ultimo_id=None):
+        """
+        Cria uma assinatura; devolve (assinatura, eventos perdidos desde ultimo_id)
+        Se o buffer já não tem os eventos pedidos, os perdidos são [None] (reset)
+        """
+        with self._lock:
+            if len(self._assinantes) >= self.max_assinantes:
+                raise LimiteAssinantes()
+
+            assinatura = Assinatura(tenant)
+            self._assinantes.append(assinatura)
+
+            perdidos = []
+            if ultimo_id is not None and ultimo_id < self._ultimo_id:
+                mais_antigo = self._buffer[0][0] if self._buffer else self._ultimo_id + 1
+                if ultimo_id + 1 < mais_antigo:
+                    perdidos = [None]
+                else:
+                    perdidos = [e for e in self._buffer if e[0] > ultimo_id and e[1] == tenant]
+
+        _iniciar_estatisticas()
+        return assinatura, perdidos
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinatura.ativa = False
+            if assinatura in self._assinantes:
+                self._assinantes.remove(assinatura)
+        assinatura._notificar()
+
+    def tenants_assinados(self):
+        with self._lock:
+            return {a.tenant for a in self._assinantes}
+
+    def situacao(self):
+        with self._lock:
+            return {
+                "assinantes": len(self._assinantes),
+                "max_assinantes": self.max_assinantes,
+                "ultimo_id": self._ultimo_id,
+                "eventos_no_buffer": len(self._buffer)
+            }
+
+
+broker = Broker()
+
+# ==================== PUBLICAÇÃO ====================
+
+def publicar(tipo, dados):
+    """
+    Publica um evento para a unidade atual (chamado pelos models após o commit)
+    """
+    return broker.publicar(tipo, dados)
+
+# ==================== STREAM ====================
+
+def _formatar(evento):
+    if evento is None:
+        return 'event: reset\ndata: {}\n\n'
+    identificador, _, tipo, dados = evento
+    return f'id: {identificador}\nevent: {tipo}\ndata: {dados}\n\n'
+
+def stream(assinatura, perdidos):
+    """
+    Gerador com o corpo da resposta text/event-stream
+    """
+    try:
+        # Tempo que o navegador espera antes de reconectar
+        yield 'retry: 3000\n\n'
+        for evento in perdidos:
+            yield _formatar(evento)
+
+        while assinatura.ativa:
+            try:
+                evento = assinatura.fila.get(timeout=INTERVALO_HEARTBEAT)
+            except queue.Empty:
+                # Comentário SSE: mantém a conexão viva em proxies e detecta cliente desconectado
+                yield ': heartbeat\n\n'
+                continue
+            yield _formatar(evento)
+    finally:
+        broker.cancelar(assinatura)
+
+async def stream_async(assinatura, perdidos):
+    """
+    Igual a stream(), para o servidor ASGI (asgi.py): espera os eventos sem ocupar
+    uma thread; o broker acorda o laço de eventos a cada publicação
+    """
+    loop = asyncio.get_running_loop()
+    novidade = asyncio.Event()
+    assinatura.avisar = lambda: loop.call_soon_threadsafe(novidade.set)
+    try:
+        yield 'retry: 3000\n\n'
+        for evento in perdidos:
+            yield _formatar(evento)
+
+        while assinatura.ativa:
+            try:
+                evento = assinatura.fila.get_nowait()
+            except queue.Empty:
+                novidade.clear()
+                if not assinatura.fila.empty():
+                    continue
+                try:
+                    await asyncio.wait_for(novidade.wait(), INTERVALO_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                continue
+            yield _formatar(evento)
+    finally:
+        assinatura.avisar = None
+        broker.cancelar(assinatura)
+
+# ==================== VARIAÇÃO DAS ESTATÍSTICAS ====================
+
+_estatisticas_iniciadas = False
+_lock_estatisticas = threading.Lock()
+_ultimas_estatisticas = {}  # tenant -> dict
+
+def _iniciar_estatisticas():
+    global _estatisticas_iniciadas
+    with _lock_estatisticas:
+        if _estatisticas_iniciadas:
+            return
+        _estatisticas_iniciadas = True
+    threading.Thread(target=_publicar_estatisticas, name='sse-estatisticas', daemon=True).start()
+
+def _publicar_estatisticas():
+    """
+    A cada intervalo, publica só os campos das estatísticas que mudaram
+    (apenas para unidades com alguém assistindo)
+    """
+    import models  # import tardio: models importa este módulo
+
+    parada = threading.Event()
+    while not parada.wait(INTERVALO_ESTATISTICAS):
+        for tenant in broker.tenants_assinados():
+            try:
+                with database.usar_tenant(tenant), database.snapshot_leitura():
+                    atuais = models.obter_estatisticas()
+            except Exception as e:
+                print(f"✗ Erro ao calcular estatísticas para eventos: {e}")
+                continue
+
+            anteriores = _ultimas_estatisticas.get(tenant, {})
+            variacao = {campo: valor for campo, valor in atuais.items() if anteriores.get(campo) != valor}
+            _ultimas_estatisticas[tenant] = atuais
+            if variacao:
+                broker.publicar('estatisticas', variacao, tenant)
@@ -0,0 +1,399 @@
+"""
+Importação - Carga em Massa de Clientes (CSV ou XLSX)
+Lê a planilha linha a linha, normaliza e valida CPF, telefone e e-mail e descarta
+CPFs repetidos (contra o banco e dentro do próprio arquivo) usando um conjunto em
+memória carregado uma única vez. As linhas válidas entram com executemany em
+lotes, cada lote uma operação da thread escritora (escrita.py), e cada linha rejeitada vai para o
+relatório de erros com o número da linha na planilha.
+
+Colunas reconhecidas no cabeçalho (sem diferenciar maiúsculas/acentos):
+    nome, cpf, email/e-mail, telefone/celular/fone, endereco, observacoes/obs
+
+Uso:
+    python importacao.py <arquivo.csv|arquivo.xlsx> [--unidade ID] [--lote 1000]
+                         [--simular] [--relatorio erros.csv]
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+
+import database
+import escrita
+import eventos
+from database import get_connection_leitura, somente_digitos
+
+TAMANHO_LOTE = 1000
+
+# Erros devolvidos na resposta da API (o relatório completo sai pela linha de comando)
+MAX_ERROS_RESPOSTA = 500
+
+_RE_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[a-z]{2,}$')
+
+# Nome da coluna na planilha -> campo do cliente
+_COLUNAS = {
+    'nome': 'nome', 'nome completo': 'nome', 'cliente': 'nome',
+    'cpf': 'cpf', 'documento': 'cpf',
+    'email': 'email', 'e-mail': 'email',
+    'telefone': 'telefone', 'celular': 'telefone', 'fone': 'telefone', 'whatsapp': 'telefone',
+    'endereco': 'endereco',
+    'observacoes': 'observacoes', 'observacao': 'observacoes', 'obs': 'observacoes',
+}
+
+# ==================== NORMALIZAÇÃO ====================
+
+def cpf_valido(cpf):
+    """
+    Confere os dois dígitos verificadores de um CPF com 11 dígitos
+    """
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        return False
+    for posicao in (9, 10):
+        soma = sum(int(cpf[i]) * (posicao + 1 - i) for i in range(posicao))
+        digito = soma * 10 % 11 % 10
+        if digito != int(cpf[posicao]):
+            return False
+    return True
+
+def normalizar_cpf(valor):
+    """
+    CPF só com dígitos; devolve (cpf, erro). CPF vazio é aceito (None)
+    """
+    cpf = somente_digitos(valor)
+    if not cpf:
+        return None, None
+    # Planilhas guardam CPF como número e perdem os zeros à esquerda
+    if len(cpf) < 11:
+        cpf = cpf.zfill(11)
+    if not cpf_valido(cpf):
+        return None, f'CPF inválido: {valor}'
+    return cpf, None
+
+def normalizar_telefone(valor):
+    """
+    Telefone só com dígitos (DDD + número, 10 ou 11 dígitos); devolve (telefone, erro)
+    """
+    telefone = somente_digitos(valor)
+    if not telefone:
+        return '', None
+    if len(telefone) in (12, 13) and telefone.startswith('55'):
+        telefone = telefone[2:]
+    if len(telefone) not in (10, 11):
+        return '', f'Telefone inválido: {valor}'
+    return telefone, None
+
+def normalizar_email(valor):
+    email = (valor or '').strip().lower()
+    if not email:
+        return '', None
+    if not _RE_EMAIL.match(email):
+        return '', f'Email inválido: {valor}'
+    return email, None
+
+def _chave_coluna(titulo):
+    sem_acento = unicodedata.normalize('NFKD', titulo or '').encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.lower().replace('_', ' ').split())
+
+# ==================== LEITURA ====================
+
+def _linhas_csv(arquivo):
+    """
+    (número da linha, valores) de um CSV binário; detecta codificação (UTF-8 ou
+    Windows-1252) e separador
+    """
+    amostra = arquivo.read(64 * 1024)
+    arquivo.seek(0)
+    try:
+        amostra.decode('utf-8')
+        codificacao = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Um erro só nos últimos bytes é um caractere cortado pelo fim da amostra
+        cortado = e.reason == 'unexpected end of data' and len(amostra) == 64 * 1024
+        codificacao = 'utf-8-sig' if cortado else 'cp1252'
+
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, newline='')
+    try:
+        dialeto = csv.Sniffer().sniff(amostra.decode(codificacao, errors='ignore'), delimiters=',;\t')
+        separador = dialeto.delimiter
+    except csv.Error:
+        separador = ','
+    try:
+        # Linhas em branco também chegam (como []): a contagem bate com a planilha
+        yield from enumerate(csv.reader(texto, delimiter=separador), start=1)
+    finally:
+        texto.detach()
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def _indice_coluna(referencia):
+    """
+    'C12' -> 2
+    """
+    indice = 0
+    for letra in referencia:
+        if not letra.isalpha():
+            break
+        indice = indice * 26 + (ord(letra.upper()) - 64)
+    return indice - 1
+
+def _texto_numero(texto):
+    # Números inteiros chegam como '12345678901' ou '1.2345678901E10'
+    try:
+        numero = float(texto)
+    except ValueError:
+        return texto
+    return str(int(numero)) if numero.is_integer() else texto
+
+def _linhas_xlsx(arquivo):
+    """
+    (número da linha, valores) da primeira planilha de um XLSX, lidas em streaming
+    (só a biblioteca padrão). O número vem do atributo r de <row>: o XLSX não grava
+    as linhas vazias, então contar os <row> erraria tudo depois de uma linha em branco
+    """
+    with zipfile.ZipFile(arquivo) as pacote:
+        nomes = pacote.namelist()
+
+        compartilhados = []
+        if 'xl/sharedStrings.xml' in nomes:
+            with pacote.open('xl/sharedStrings.xml') as xml:
+                for _, elemento in ET.iterparse(xml):
+                    if elemento.tag == _NS + 'si':
+                        compartilhados.append(''.join(t.text or '' for t in elemento.iter(_NS + 't')))
+                        elemento.clear()
+
+        planilhas = sorted(n for n in nomes if n.startswith('xl/worksheets/sheet') and n.endswith('.xml'))
+        if not planilhas:
+            raise ValueError('Planilha vazia')
+        planilha = 'xl/worksheets/sheet1.xml' if 'xl/worksheets/sheet1.xml' in nomes else planilhas[0]
+
+        with pacote.open(planilha) as xml:
+            numero = 0
+            for _, elemento in ET.iterparse(xml):
+                if elemento.tag != _NS + 'row':
+                    continue
+                numero = int(elemento.get('r') or numero + 1)
+                valores = {}
+                for posicao, celula in enumerate(elemento.iter(_NS + 'c')):
+                    referencia = celula.get('r')
+                    coluna = _indice_coluna(referencia) if referencia else posicao
+                    tipo = celula.get('t')
+                    if tipo == 'inlineStr':
+                        texto = ''.join(t.text or '' for t in celula.iter(_NS + 't'))
+                    else:
+                        valor = celula.find(_NS + 'v')
+                        texto = valor.text or '' if valor is not None else ''
+                        if tipo == 's' and texto:
+                            texto = compartilhados[int(texto)]
+                        elif tipo in (None, 'n') and texto:
+                            texto = _texto_numero(texto)
+                    valores[coluna] = texto
+                elemento.clear()
+                yield numero, [valores.get(i, '') for i in range(max(valores) + 1)] if valores else []
+
+def ler_planilha(arquivo, nome_arquivo):
+    """
+    Gerador de (número da linha, dict do cliente) a partir de um CSV ou XLSX
+    """
+    if nome_arquivo.lower().endswith('.xlsx'):
+        linhas = _linhas_xlsx(arquivo)
+    elif nome_arquivo.lower().endswith(('.csv', '.txt')):
+        linhas = _linhas_csv(arquivo)
+    else:
+        raise ValueError('Formato não suportado (use .csv ou .xlsx)')
+
+    # O cabeçalho é a primeira linha que existe (não necessariamente a linha 1)
+    _, cabecalho = next(linhas, (None, None))
+    if not cabecalho:
+        raise ValueError('Arquivo vazio')
+    campos = [_COLUNAS.get(_chave_coluna(titulo)) for titulo in cabecalho]
+    if 'nome' not in campos:
+        raise ValueError('Coluna "nome" não encontrada no cabeçalho')
+
+    for numero, linha in linhas:
+        if not any((valor or '').strip() for valor in linha):
+            continue
+        registro = {}
+        for campo, valor in zip(campos, linha):
+            if campo and campo not in registro:
+                registro[campo] = (valor or '').strip()
+        yield numero, registro
+
+# ==================== IMPORTAÇÃO ====================
+
+def _cpfs_existentes():
+    """
+    Todos os CPFs já cadastrados (ativos ou não), lidos só do índice de cpf_digitos
+    """
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    cursor.execute('SELECT cpf_digitos FROM clientes WHERE cpf_digitos IS NOT NULL')
+    cpfs = {linha[0] for linha in cursor.fetchall()}
+    conn.close()
+    return cpfs
+
+def _validar(registro, cpfs, vistos):
+    """
+    Normaliza um registro; devolve (tupla para o INSERT, lista de erros)
+    cpfs: CPFs do banco; vistos: CPFs já aceitos neste arquivo (cpf -> linha)
+    """
+    erros = []
+    nome = ' '.join(registro.get('nome', '').split())
+    if not nome:
+        erros.append('Nome obrigatório')
+
+    cpf, erro = normalizar_cpf(registro.get('cpf'))
+    if erro:
+        erros.append(erro)
+    elif cpf and cpf in cpfs:
+        erros.append('CPF já cadastrado')
+    elif cpf and cpf in vistos:
+        erros.append(f'CPF repetido no arquivo (linha {vistos[cpf]})')
+
+    telefone, erro = normalizar_telefone(registro.get('telefone'))
+    if erro:
+        erros.append(erro)
+    email, erro = normalizar_email(registro.get('email'))
+    if erro:
+        erros.append(erro)
+
+    if erros:
+        return None, erros
+    # CPF e telefone já normalizados também alimentam as colunas de busca
+    return (nome, email, telefone, cpf, registro.get('endereco', ''), registro.get('observacoes', ''),
+            cpf, telefone or None), []
+
+_SQL_INSERIR = '''
+    INSERT INTO clientes (nome, email, telefone, cpf, endereco, observacoes,
+                          cpf_digitos, telefone_digitos)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def _gravar_lote(lote, erros):
+    """
+    Grava um lote como uma operação da escritora (escrita.py); se alguém cadastrou um
+    dos CPFs nesse meio tempo, refaz o lote linha a linha para rejeitar só as linhas em conflito
+    """
+    def gravar(conn):
+        conn.execute('SAVEPOINT importacao')
+        try:
+            conn.executemany(_SQL_INSERIR, [valores for _, valores in lote])
+            conn.execute('RELEASE importacao')
+            return len(lote)
+        except sqlite3.IntegrityError:
+            conn.execute('ROLLBACK TO importacao')
+            conn.execute('RELEASE importacao')
+
+        gravados = 0
+        for numero, valores in lote:
+            try:
+                conn.execute(_SQL_INSERIR, valores)
+                gravados += 1
+            except sqlite3.IntegrityError:
+                erros.append({"linha": numero, "cpf": valores[3], "erros": ['CPF já cadastrado']})
+        return gravados
+
+    return escrita.executar(gravar)
+
+def importar_clientes(arquivo, nome_arquivo, tamanho_lote=TAMANHO_LOTE, simular=False):
+    """
+    Importa clientes de um arquivo CSV/XLSX aberto em modo binário
+
+    simular=True valida tudo sem gravar. Devolve contagens e a lista completa de
+    erros por linha ({"linha", "cpf", "erros"})
+    """
+    inicio = time.perf_counter()
+    cpfs = _cpfs_existentes()
+    vistos = {}
+    erros = []
+    lote = []
+    total = importados = 0
+
+    try:
+        for numero, registro in ler_planilha(arquivo, nome_arquivo):
+            total += 1
+            valores, problemas = _validar(registro, cpfs, vistos)
+            if problemas:
+                erros.append({"linha": numero, "cpf": registro.get('cpf', ''), "erros": problemas})
+                continue
+            if valores[3]:
+                vistos[valores[3]] = numero
+            lote.append((numero, valores))
+
+            if len(lote) >= tamanho_lote:
+                importados += len(lote) if simular else _gravar_lote(lote, erros)
+                lote = []
+
+        if lote:
+            importados += len(lote) if simular else _gravar_lote(lote, erros)
+    except (ValueError, zipfile.BadZipFile, ET.ParseError, csv.Error) as e:
+        return {"success": False, "error": f"Arquivo inválido: {e}",
+                "importados": importados, "erros": erros}
+
+    if importados and not simular:
+        eventos.publicar('cliente', {"acao": "importados", "quantidade": importados})
+
+    erros.sort(key=lambda erro: erro['linha'])
+    return {
+        "success": True,
+        "simulacao": simular,
+        "total_linhas": total,
+        "importados": importados,
+        "rejeitados": len(erros),
+        "duracao_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        "erros": erros
+    }
+
+def salvar_relatorio_erros(erros, caminho):
+    """
+    Relatório de rejeições em CSV (linha; cpf; erros)
+    """
+    with open(caminho, 'w', newline='', encoding='utf-8-sig') as saida:
+        escritor = csv.writer(saida, delimiter=';')
+        escritor.writerow(['linha', 'cpf', 'erros'])
+        for erro in erros:
+            escritor.writerow([erro['linha'], erro['cpf'], ' | '.join(erro['erros'])])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importa clientes de um CSV ou XLSX')
+    parser.add_argument('arquivo')
+    parser.add_argument('--unidade', default=database.TENANT_PADRAO, help='Unidade (tenant) de destino')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help='Linhas por transação')
+    parser.add_argument('--simular', action='store_true', help='Só valida, sem gravar')
+    parser.add_argument('--relatorio', help='Salva as linhas rejeitadas neste CSV')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.arquivo):
+        print(f"✗ Arquivo não encontrado: {args.arquivo}")
+        sys.exit(1)
+    if not database.tenant_valido(args.unidade):
+        print(f"✗ Unidade desconhecida: {args.unidade}")
+        sys.exit(1)
+
+    database.init_db(database.caminho_banco(args.unidade))
+    with database.usar_tenant(args.unidade), open(args.arquivo, 'rb') as arquivo:
+        resultado = importar_clientes(arquivo, args.arquivo, args.lote, args.simular)
+
+    if not resultado['success']:
+        print(f"✗ {resultado['error']}")
+        sys.exit(1)
+
+    acao = 'seriam importados' if args.simular else 'importados'
+    print(f"✓ {resultado['importados']} de {resultado['total_linhas']} clientes {acao} "
+          f"em {resultado['duracao_ms'] / 1000:.1f}s ({resultado['rejeitados']} rejeitados)")
+    if args.relatorio and resultado['erros']:
+        salvar_relatorio_erros(resultado['erros'], args.relatorio)
+        print(f"  Relatório de erros salvo em {args.relatorio}")
+    else:
+        for erro in resultado['erros'][:20]:
+            print(f"  linha {erro['linha']}: {'; '.join(erro['erros'])}")
+        if resultado['rejeitados'] > 20:
+            print(f"  ... e mais {resultado['rejeitados'] - 20} (use --relatorio para a lista completa)")
@@ -0,0 +1,691 @@
+"""
+Lembretes - Aviso de Pagamento aos Clientes (e-mail, WhatsApp, SMS)
+Uma única consulta (pelo índice de status + vencimento) seleciona quem está em
+atraso ou vence nos próximos dias; cada cliente recebe uma mensagem por canal,
+montada a partir dos modelos.
+
+Os envios rodam num pool de threads compartilhado pelos canais. Cada canal tem
+seu limite de mensagens por segundo; falhas passageiras (4xx do SMTP, 429/5xx do
+HTTP, conexão caída) são repetidas com espera exponencial. O registro
+lembretes_enviados guarda cliente/canal por ciclo (dia): rodar de novo no mesmo
+dia só tenta quem ainda não recebeu.
+
+Uso:
+    python lembretes.py enviar [--unidade principal] [--simular]
+    python lembretes.py testar [--clientes 10000] [--falhas 0.05]
+
+Configuração:
+    FLOWFIT_LEMBRETES_CANAIS=email         canais usados (email,whatsapp,sms)
+    FLOWFIT_LEMBRETES_DIAS=3               avisa quem vence nos próximos N dias
+    FLOWFIT_LEMBRETES_THREADS=16           threads de envio (todos os canais)
+    FLOWFIT_LEMBRETES_TENTATIVAS=4         tentativas por mensagem
+    FLOWFIT_LEMBRETES_ESPERA=1             espera inicial entre tentativas (s)
+    FLOWFIT_LEMBRETES_TAXA_<CANAL>=20      mensagens por segundo do canal
+    FLOWFIT_LEMBRETES_MODELOS=arquivo.json modelos próprios (mesmo formato de MODELOS)
+    FLOWFIT_SMTP_HOST / _PORTA / _USUARIO / _SENHA / _TLS / _REMETENTE
+    FLOWFIT_WHATSAPP_URL / _TOKEN, FLOWFIT_SMS_URL / _TOKEN
+"""
+
+import argparse
+import json
+import os
+import random
+import smtplib
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+
+import database
+import escrita
+
+CANAIS_ATIVOS = [c.strip() for c in os.environ.get('FLOWFIT_LEMBRETES_CANAIS', 'email').split(',') if c.strip()]
+DIAS_ANTECEDENCIA = int(os.environ.get('FLOWFIT_LEMBRETES_DIAS', 3))
+THREADS = int(os.environ.get('FLOWFIT_LEMBRETES_THREADS', 16))
+TENTATIVAS = int(os.environ.get('FLOWFIT_LEMBRETES_TENTATIVAS', 4))
+ESPERA_INICIAL = float(os.environ.get('FLOWFIT_LEMBRETES_ESPERA', 1))
+ACADEMIA = os.environ.get('FLOWFIT_ACADEMIA', 'FlowFit')
+
+# Reservas 'enviando' mais antigas que isso são de uma execução que caiu no meio
+PRAZO_RESERVA = timedelta(minutes=30)
+LOTE_REGISTRO = 200  # resultados gravados por transação
+
+MODELOS = {
+    'atraso': {
+        'assunto': '$academia: mensalidade em atraso',
+        'texto': ('Olá, $nome! Identificamos $pendencias mensalidade(s) em aberto na $academia, '
+                  'no total de R$ $total, vencida(s) desde $vencimento ($dias dia(s)). '
+                  'Se já pagou, desconsidere esta mensagem.')
+    },
+    'vencendo': {
+        'assunto': '$academia: sua mensalidade vence em $vencimento',
+        'texto': ('Olá, $nome! Lembrete da $academia: sua mensalidade de R$ $total vence em '
+                  '$vencimento. Pague no balcão ou por PIX e continue treinando!')
+    }
+}
+
+if os.environ.get('FLOWFIT_LEMBRETES_MODELOS'):
+    with open(os.environ['FLOWFIT_LEMBRETES_MODELOS'], encoding='utf-8') as _arquivo:
+        for _tipo, _modelo in json.load(_arquivo).items():
+            MODELOS.setdefault(_tipo, {}).update(_modelo)
+
+# Pool compartilhado: o total de conexões abertas com os provedores fica limitado
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='lembrete')
+
+# Um envio por vez em cada unidade
+_locks = {}
+_lock_locks = threading.Lock()
+_ultimo_resultado = {}  # unidade -> resumo do último envio
+
+
+class ErroTemporario(Exception):
+    """
+    Falha passageira do canal: vale tentar de novo
+    """
+
+    def __init__(self, mensagem, espera=None):
+        super().__init__(mensagem)
+        self.espera = espera  # Retry-After informado pelo provedor (segundos)
+
+
+class ErroPermanente(Exception):
+    """
+    Destino recusado pelo canal: não adianta repetir
+    """
+
+
+class LimiteTaxa:
+    """
+    Espaça as mensagens de um canal para no máximo 'por_segundo' (0 = sem limite)
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo > 0 else 0
+        self._proximo = 0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            horario = max(agora, self._proximo)
+            self._proximo = horario + self.intervalo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+# ==================== CANAIS ====================
+
+class Canal:
+    """
+    Base dos canais: destino() escolhe o endereço do cliente (None = sem contato
+    nesse canal) e enviar() entrega ou levanta ErroTemporario/ErroPermanente
+    """
+    nome = None
+
+    def __init__(self, por_segundo):
+        self.limite = LimiteTaxa(por_segundo)
+
+    def destino(self, alvo):
+        raise NotImplementedError
+
+    def enviar(self, destino, assunto, texto):
+        raise NotImplementedError
+
+    def fechar(self):
+        pass
+
+
+class CanalEmail(Canal):
+    """
+    E-mail por SMTP; cada thread do pool mantém sua conexão aberta entre as mensagens
+    """
+    nome = 'email'
+
+    def __init__(self, host, porta, remetente, usuario=None, senha=None, tls=False, por_segundo=20):
+        super().__init__(por_segundo)
+        self.host, self.porta, self.remetente = host, porta, remetente
+        self.usuario, self.senha, self.tls = usuario, senha, tls
+        self._local = threading.local()
+        self._conexoes = []
+        self._lock = threading.Lock()
+
+    def destino(self, alvo):
+        return (alvo['email'] or '').strip() or None
+
+    def _conexao(self):
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is None:
+            smtp = smtplib.SMTP(self.host, self.porta, timeout=30)
+            if self.tls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.senha)
+            self._local.smtp = smtp
+            with self._lock:
+                self._conexoes.append(smtp)
+        return smtp
+
+    def _descartar(self):
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if smtp is not None:
+            with self._lock:
+                if smtp in self._conexoes:
+                    self._conexoes.remove(smtp)
+            try:
+                smtp.close()
+            except OSError:
+                pass
+
+    def enviar(self, destino, assunto, texto):
+        mensagem = EmailMessage()
+        mensagem['From'] = self.remetente
+        mensagem['To'] = destino
+        mensagem['Subject'] = assunto
+        mensagem.set_content(texto)
+
+        try:
+            self._conexao().send_message(mensagem)
+        except smtplib.SMTPRecipientsRefused as e:
+            codigo, resposta = next(iter(e.recipients.values()))
+            erro = f'{codigo} {resposta.decode(errors="replace")}'
+            if codigo >= 500:
+                raise ErroPermanente(erro)
+            raise ErroTemporario(erro)
+        except smtplib.SMTPResponseException as e:
+            self._descartar()
+            erro = f'{e.smtp_code} {e.smtp_error.decode(errors="replace")}'
+            if e.smtp_code >= 500:
+                raise ErroPermanente(erro)
+            raise ErroTemporario(erro)
+        except (smtplib.SMTPException, OSError) as e:
+            self._descartar()
+            raise ErroTemporario(str(e) or e.__class__.__name__)
+
+    def fechar(self):
+        with self._lock:
+            conexoes, self._conexoes = self._conexoes, []
+        for smtp in conexoes:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+class CanalHTTP(Canal):
+    """
+    WhatsApp/SMS por um provedor HTTP: POST JSON {para, mensagem}
+    """
+
+    def __init__(self, nome, url, token=None, por_segundo=10):
+        super().__init__(por_segundo)
+        self.nome, self.url, self.token = nome, url, token
+
+    def destino(self, alvo):
+        telefone = alvo['telefone_digitos']
+        return f'+55{telefone}' if telefone and len(telefone) in (10, 11) else None
+
+    def enviar(self, destino, assunto, texto):
+        requisicao = urllib.request.Request(
+            self.url, method='POST',
+            data=json.dumps({"para": destino, "mensagem": texto}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        if self.token:
+            requisicao.add_header('Authorization', f'Bearer {self.token}')
+
+        try:
+            with urllib.request.urlopen(requisicao, timeout=15) as resposta:
+                resposta.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                espera = e.headers.get('Retry-After')
+                raise ErroTemporario(f'HTTP {e.code}', float(espera) if espera and espera.isdigit() else None)
+            raise ErroPermanente(f'HTTP {e.code}')
+        except OSError as e:  # URLError, timeout, conexão recusada
+            raise ErroTemporario(str(e))
+
+def _taxa(nome, padrao):
+    return float(os.environ.get(f'FLOWFIT_LEMBRETES_TAXA_{nome.upper()}', padrao))
+
+# Canais conhecidos: nome -> função que monta o canal a partir do ambiente.
+# Um provedor novo entra com registrar_canal('telegram', lambda: MeuCanal(...))
+_fabricas = {}
+
+def registrar_canal(nome, fabrica):
+    _fabricas[nome] = fabrica
+
+registrar_canal('email', lambda: CanalEmail(
+    os.environ.get('FLOWFIT_SMTP_HOST', 'localhost'),
+    int(os.environ.get('FLOWFIT_SMTP_PORTA', 25)),
+    os.environ.get('FLOWFIT_SMTP_REMETENTE', f'{ACADEMIA} <nao-responda@localhost>'),
+    os.environ.get('FLOWFIT_SMTP_USUARIO'),
+    os.environ.get('FLOWFIT_SMTP_SENHA'),
+    os.environ.get('FLOWFIT_SMTP_TLS', '0') == '1',
+    _taxa('email', 20)
+))
+registrar_canal('whatsapp', lambda: CanalHTTP(
+    'whatsapp', os.environ['FLOWFIT_WHATSAPP_URL'], os.environ.get('FLOWFIT_WHATSAPP_TOKEN'), _taxa('whatsapp', 10)
+))
+registrar_canal('sms', lambda: CanalHTTP(
+    'sms', os.environ['FLOWFIT_SMS_URL'], os.environ.get('FLOWFIT_SMS_TOKEN'), _taxa('sms', 10)
+))
+
+def criar_canais(nomes=None):
+    """
+    Instancia os canais configurados (padrão: FLOWFIT_LEMBRETES_CANAIS)
+    """
+    canais = {}
+    for nome in nomes or CANAIS_ATIVOS:
+        if nome not in _fabricas:
+            raise ValueError(f"Canal desconhecido: {nome}")
+        try:
+            canais[nome] = _fabricas[nome]()
+        except KeyError as e:
+            raise ValueError(f"Canal '{nome}' sem configuração ({e.args[0]})")
+    return canais
+
+# ==================== SELEÇÃO E MENSAGENS ====================
+
+def selecionar_alvos(hoje=None, dias=DIAS_ANTECEDENCIA):
+    """
+    Clientes ativos com pendência vencida ou vencendo até hoje + dias (uma consulta)
+    """
+    hoje = hoje or date.today()
+    limite = (hoje + timedelta(days=dias)).isoformat()
+
+    conn = database.get_connection_leitura()
+    try:
+        cursor = conn.cursor()
+        # status = ? AND vencimento <= ? é um intervalo em idx_pagamentos_status_vencimento,
+        # que já traz cliente_id e valor
+        cursor.execute('''
+            SELECT c.id, c.nome, c.email, c.telefone_digitos,
+                   COUNT(*) AS pendencias, SUM(p.valor) AS total, MIN(p.vencimento) AS vencimento
+            FROM pagamentos p
+            JOIN clientes c ON c.id = p.cliente_id
+            WHERE p.status = 'pendente' AND p.vencimento <= ? AND c.ativo = 1
+            GROUP BY p.cliente_id
+        ''', (limite,))
+        alvos = [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    for alvo in alvos:
+        alvo['tipo'] = 'atraso' if alvo['vencimento'] < hoje.isoformat() else 'vencendo'
+        alvo['dias'] = (hoje - date.fromisoformat(alvo['vencimento'])).days
+    return alvos
+
+def renderizar(alvo):
+    """
+    (assunto, texto) do lembrete do cliente a partir de MODELOS
+    """
+    modelo = MODELOS[alvo['tipo']]
+    valores = {
+        'academia': ACADEMIA,
+        'nome': alvo['nome'].split()[0] if alvo['nome'] else '',
+        'nome_completo': alvo['nome'],
+        'pendencias': alvo['pendencias'],
+        'total': f"{alvo['total']:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'),
+        'vencimento': datetime.strptime(alvo['vencimento'], '%Y-%m-%d').strftime('%d/%m/%Y'),
+        'dias': max(alvo['dias'], 0)
+    }
+    return (Template(modelo['assunto']).safe_substitute(valores),
+            Template(modelo['texto']).safe_substitute(valores))
+
+# ==================== REGISTRO (DEDUPLICAÇÃO) ====================
+
+def _reservar(ciclo, mensagens):
+    """
+    Marca as mensagens como 'enviando' no ciclo; devolve só as que ainda não foram
+    entregues (nem estão com outra execução em andamento)
+    """
+    agora = datetime.now().isoformat(timespec='seconds')
+    vencida = (datetime.now() - PRAZO_RESERVA).isoformat(timespec='seconds')
+
+    def reservar(conn):
+        reservadas = []
+        cursor = conn.cursor()
+        for mensagem in mensagens:
+            cursor.execute('''
+                INSERT INTO lembretes_enviados
+                    (ciclo, cliente_id, canal, destino, tipo, status, tentativas, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, 'enviando', 0, ?)
+                ON CONFLICT (ciclo, cliente_id, canal) DO UPDATE
+                SET status = 'enviando', destino = excluded.destino, tipo = excluded.tipo,
+                    erro = NULL, atualizado_em = excluded.atualizado_em
+                WHERE status = 'falhou' OR (status = 'enviando' AND atualizado_em < ?)
+            ''', (ciclo, mensagem['cliente_id'], mensagem['canal'], mensagem['destino'],
+                  mensagem['tipo'], agora, vencida))
+            if cursor.rowcount:
+                reservadas.append(mensagem)
+        return reservadas
+
+    return escrita.executar(reservar)
+
+def _registrar(ciclo, resultados):
+    def registrar(conn):
+        conn.executemany('''
+            UPDATE lembretes_enviados
+            SET status = ?, tentativas = ?, erro = ?, atualizado_em = ?
+            WHERE ciclo = ? AND cliente_id = ? AND canal = ?
+        ''', [(r['status'], r['tentativas'], r['erro'], datetime.now().isoformat(timespec='seconds'),
+               ciclo, r['cliente_id'], r['canal']) for r in resultados])
+
+    escrita.executar(registrar)
+
+def resumo_ciclo(ciclo=None):
+    """
+    Contagem do registro por canal e status num ciclo (padrão: hoje)
+    """
+    ciclo = ciclo or date.today().isoformat()
+    conn = database.get_connection_leitura()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT canal, status, COUNT(*) AS quantidade
+            FROM lembretes_enviados
+            WHERE ciclo = ?
+            GROUP BY canal, status
+        ''', (ciclo,))
+        resumo = {}
+        for row in cursor.fetchall():
+            resumo.setdefault(row['canal'], {})[row['status']] = row['quantidade']
+    finally:
+        conn.close()
+    return {"ciclo": ciclo, "canais": resumo}
+
+# ==================== ENVIO ====================
+
+def _entregar(canal, mensagem, tentativas, espera):
+    """
+    Envia uma mensagem respeitando o limite do canal e repetindo as falhas passageiras
+    """
+    erro = None
+    for tentativa in range(1, tentativas + 1):
+        canal.limite.aguardar()
+        try:
+            canal.enviar(mensagem['destino'], mensagem['assunto'], mensagem['texto'])
+            return {"status": 'enviado', "tentativas": tentativa, "erro": None}
+        except ErroPermanente as e:
+            return {"status": 'falhou', "tentativas": tentativa, "erro": str(e)[:300]}
+        except ErroTemporario as e:
+            erro = str(e)
+            if tentativa < tentativas:
+                atraso = e.espera if e.espera is not None else espera * 2 ** (tentativa - 1)
+                # Variação aleatória: as threads não voltam todas no mesmo instante
+                time.sleep(atraso * random.uniform(0.5, 1.5))
+        except Exception as e:
+            return {"status": 'falhou', "tentativas": tentativa, "erro": f'{e.__class__.__name__}: {e}'[:300]}
+    return {"status": 'falhou', "tentativas": tentativas, "erro": (erro or '')[:300]}
+
+def _intercalar(mensagens):
+    """
+    Alterna os canais na fila: um canal lento (limite baixo) não ocupa o pool inteiro
+    """
+    por_canal = {}
+    for mensagem in mensagens:
+        por_canal.setdefault(mensagem['canal'], []).append(mensagem)
+    filas = list(por_canal.values())
+    intercaladas = []
+    for posicao in range(max((len(f) for f in filas), default=0)):
+        intercaladas.extend(f[posicao] for f in filas if posicao < len(f))
+    return intercaladas
+
+def enviar_lembretes(canais=None, ciclo=None, hoje=None, simular=False,
+                     tentativas=TENTATIVAS, espera=ESPERA_INICIAL):
+    """
+    Seleciona os alvos, monta as mensagens e envia pelos canais (na unidade atual)
+    canais: {nome: Canal} (padrão: criar_canais())
+    simular: só monta as mensagens, sem enviar nem registrar
+    """
+    inicio = time.perf_counter()
+    hoje = hoje or date.today()
+    ciclo = ciclo or hoje.isoformat()
+    try:
+        canais = canais if canais is not None else criar_canais()
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    # Os canais guardam conexões abertas (SMTP): fecham em qualquer saída daqui em diante
+    try:
+        return _enviar(canais, ciclo, hoje, simular, tentativas, espera, inicio)
+    finally:
+        for canal in canais.values():
+            canal.fechar()
+
+def _enviar(canais, ciclo, hoje, simular, tentativas, espera, inicio):
+    """
+    Corpo de enviar_lembretes(), com os canais já criados
+    """
+    alvos = selecionar_alvos(hoje)
+    mensagens = []
+    for alvo in alvos:
+        assunto, texto = renderizar(alvo)
+        for canal in canais.values():
+            destino = canal.destino(alvo)
+            if destino:
+                mensagens.append({"cliente_id": alvo['id'], "canal": canal.nome, "destino": destino,
+                                  "tipo": alvo['tipo'], "assunto": assunto, "texto": texto})
+
+    resumo = {"success": True, "ciclo": ciclo, "alvos": len(alvos), "mensagens": len(mensagens)}
+    if simular:
+        resumo["exemplos"] = mensagens[:5]
+        return resumo
+
+    pendentes = _reservar(ciclo, mensagens)
+    resumo["ja_enviadas"] = len(mensagens) - len(pendentes)
+
+    por_canal = {nome: {"enviado": 0, "falhou": 0, "repeticoes": 0} for nome in canais}
+    resultados = []
+    try:
+        futuros = {_executor.submit(_entregar, canais[m['canal']], m, tentativas, espera): m
+                   for m in _intercalar(pendentes)}
+        # Só esta thread grava no banco; as do pool cuidam da rede
+        for futuro in as_completed(futuros):
+            mensagem = futuros[futuro]
+            resultado = dict(futuro.result(), cliente_id=mensagem['cliente_id'], canal=mensagem['canal'])
+            contagem = por_canal[mensagem['canal']]
+            contagem[resultado['status']] += 1
+            contagem['repeticoes'] += resultado['tentativas'] - 1
+            resultados.append(resultado)
+            if len(resultados) >= LOTE_REGISTRO:
+                _registrar(ciclo, resultados)
+                resultados = []
+    finally:
+        if resultados:
+            _registrar(ciclo, resultados)
+
+    resumo.update({
+        "enviadas": sum(c['enviado'] for c in por_canal.values()),
+        "falhas": sum(c['falhou'] for c in por_canal.values()),
+        "por_canal": por_canal,
+        "duracao_s": round(time.perf_counter() - inicio, 2)
+    })
+    return resumo
+
+def _lock_da_unidade(tenant):
+    with _lock_locks:
+        return _locks.setdefault(tenant, threading.Lock())
+
+def iniciar_envio(tenant, ciclo=None):
+    """
+    Dispara enviar_lembretes numa thread (um envio por vez na unidade); False se já há
+    um em andamento nela
+    """
+    lock = _lock_da_unidade(tenant)
+    if not lock.acquire(blocking=False):
+        return False
+
+    def executar():
+        try:
+            with database.usar_tenant(tenant):
+                resultado = enviar_lembretes(ciclo=ciclo)
+        except Exception as e:
+            resultado = {"success": False, "error": str(e)}
+        finally:
+            lock.release()
+        resultado['concluido_em'] = datetime.now().isoformat(timespec='seconds')
+        _ultimo_resultado[tenant] = resultado
+        print(f"{'✓' if resultado['success'] else '✗'} Lembretes ({tenant}): "
+              f"{resultado.get('enviadas', 0)} enviados, {resultado.get('falhas', 0)} falhas")
+
+    _ultimo_resultado[tenant] = {"em_andamento": True, "iniciado_em": datetime.now().isoformat(timespec='seconds')}
+    threading.Thread(target=executar, name=f'lembretes-{tenant}', daemon=True).start()
+    return True
+
+def situacao(tenant):
+    """
+    Último envio disparado pela API e o registro do ciclo de hoje
+    """
+    return {"ultimo_envio": _ultimo_resultado.get(tenant), **resumo_ciclo()}
+
+# ==================== SIMULADORES (TESTE LOCAL) ====================
+
+class _SMTPSimulado(socketserver.StreamRequestHandler):
+    """
+    Servidor SMTP mínimo: aceita tudo e recusa com 451 uma fração dos destinatários
+    """
+
+    def _responder(self, linha):
+        self.wfile.write(linha.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self._responder('220 simulador FlowFit')
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            verbo = linha[:4].decode('ascii', errors='replace').upper()
+            if verbo in ('EHLO', 'HELO'):
+                self._responder('250 simulador')
+            elif verbo == 'RCPT' and random.random() < self.server.falhas:
+                self._responder('451 tente novamente mais tarde')
+            elif verbo in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._responder('250 ok')
+            elif verbo == 'DATA':
+                self._responder('354 envie a mensagem')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.recebidas += 1
+                self._responder('250 aceita')
+            elif verbo == 'QUIT':
+                self._responder('221 tchau')
+                return
+            else:
+                self._responder('502 comando nao suportado')
+
+
+class _HTTPSimulado(BaseHTTPRequestHandler):
+    """
+    Provedor HTTP mínimo: 200 para o POST, ou 503 para uma fração deles
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if random.random() < self.server.falhas:
+            self.send_response(503)
+        else:
+            with self.server.lock:
+                self.server.recebidas += 1
+            self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_simuladores(falhas=0.0):
+    """
+    Sobe um SMTP e um HTTP locais (portas livres); devolve (smtp, http)
+    """
+    smtp = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPSimulado)
+    http = ThreadingHTTPServer(('127.0.0.1', 0), _HTTPSimulado)
+    for servidor in (smtp, http):
+        servidor.daemon_threads = True
+        servidor.falhas = falhas
+        servidor.recebidas = 0
+        servidor.lock = threading.Lock()
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return smtp, http
+
+def _testar(args):
+    """
+    Banco temporário + simuladores: mede o envio e confere que a 2ª rodada não repete ninguém
+    """
+    import carga
+
+    pasta = tempfile.mkdtemp(prefix='flowfit-lembretes-')
+    os.chdir(pasta)
+    clientes, _ = carga.semear(pasta, clientes=args.clientes, meses=2)
+    conn = database.get_connection()
+    conn.execute("UPDATE clientes SET email = 'cliente' || id || '@exemplo.com'")
+    conn.commit()
+    conn.close()
+    print(f"✓ Banco de teste com {clientes} clientes em {pasta}")
+
+    smtp, http = iniciar_simuladores(args.falhas)
+    url = f'http://127.0.0.1:{http.server_address[1]}/mensagens'
+
+    def canais():
+        return {
+            'email': CanalEmail('127.0.0.1', smtp.server_address[1], 'FlowFit <teste@localhost>',
+                                por_segundo=args.taxa),
+            'whatsapp': CanalHTTP('whatsapp', url, por_segundo=args.taxa)
+        }
+
+    for rodada in (1, 2):
+        resultado = enviar_lembretes(canais(), espera=args.espera)
+        print(f"  Rodada {rodada}: {resultado['mensagens']} mensagens, {resultado['ja_enviadas']} já enviadas, "
+              f"{resultado['enviadas']} enviadas, {resultado['falhas']} falhas em {resultado['duracao_s']}s")
+        for nome, contagem in resultado['por_canal'].items():
+            print(f"    {nome}: {contagem}")
+    print(f"  Recebidas pelos simuladores: SMTP {smtp.recebidas}, HTTP {http.recebidas}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lembretes de pagamento')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    enviar = comandos.add_parser('enviar', help='Envia os lembretes do dia')
+    enviar.add_argument('--unidade', default=database.TENANT_PADRAO, help='Unidade (tenant)')
+    enviar.add_argument('--simular', action='store_true', help='Só monta as mensagens, sem enviar')
+
+    testar = comandos.add_parser('testar', help='Envio completo contra SMTP/HTTP simulados')
+    testar.add_argument('--clientes', type=int, default=10000)
+    testar.add_argument('--falhas', type=float, default=0.05, help='Fração de recusas temporárias')
+    testar.add_argument('--taxa', type=float, default=200, help='Mensagens por segundo por canal (0 = sem limite)')
+    testar.add_argument('--espera', type=float, default=0.05, help='Espera inicial entre tentativas (s)')
+
+    args = parser.parse_args()
+    if args.comando == 'testar':
+        _testar(args)
+        sys.exit(0)
+
+    if not database.tenant_valido(args.unidade):
+        print(f"✗ Unidade desconhecida: {args.unidade}")
+        sys.exit(1)
+    with database.usar_tenant(args.unidade):
+        resultado = enviar_lembretes(simular=args.simular)
+
+    if not resultado['success']:
+        print(f"✗ {resultado['error']}")
+        sys.exit(1)
+    print(f"✓ {resultado['alvos']} clientes, {resultado['mensagens']} mensagens")
+    if args.simular:
+        for exemplo in resultado['exemplos']:
+            print(f"  [{exemplo['canal']}] {exemplo['destino']}: {exemplo['texto']}")
+    else:
+        print(f"  {resultado['enviadas']} enviadas, {resultado['falhas']} falhas, "
+              f"{resultado['ja_enviadas']} já enviadas antes ({resultado['duracao_s']}s)")
@@ -0,0 +1,125 @@
+"""
+Lote - Várias Chamadas da API numa Única Requisição (POST /api/batch)
+O token é verificado uma vez no /api/batch; cada item é despachado dentro do
+próprio processo pelo Flask (mesmas rotas, hooks de admissão e métricas), com o
+usuário já autenticado entregue pelo environ.
+
+Itens GET seguidos rodam em paralelo num pool de threads; qualquer outro método
+é uma barreira: espera os anteriores terminarem e roda sozinho, na ordem do lote.
+
+Configuração:
+    FLOWFIT_LOTE_MAX_ITENS=20  itens por lote
+    FLOWFIT_LOTE_THREADS=4     threads que atendem os itens
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.test import EnvironBuilder
+
+import auth
+
+MAX_ITENS = int(os.environ.get('FLOWFIT_LOTE_MAX_ITENS', 20))
+THREADS = int(os.environ.get('FLOWFIT_LOTE_THREADS', 4))
+
+METODOS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# Rotas de stream (respostas sem fim) não cabem num lote
+ROTAS_STREAM = ('/api/eventos',)
+
+# Todos os itens rodam no pool (inclusive os sequenciais): cada thread do pool
+# tem seu próprio contexto do Flask e suas próprias métricas por requisição
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='lote')
+
+
+def validar_itens(itens):
+    """
+    Confere o formato do lote; devolve a mensagem de erro ou None
+    """
+    if not isinstance(itens, list) or not itens:
+        return "Envie uma lista de requisições em 'requisicoes'"
+    if len(itens) > MAX_ITENS:
+        return f"Máximo de {MAX_ITENS} requisições por lote"
+
+    for posicao, item in enumerate(itens):
+        if not isinstance(item, dict):
+            return f"Item {posicao}: deve ser um objeto {{method, path, body}}"
+        metodo = str(item.get('method', 'GET')).upper()
+        caminho = item.get('path')
+        if metodo not in METODOS:
+            return f"Item {posicao}: método não suportado ({metodo})"
+        if not isinstance(caminho, str) or not caminho.startswith('/api/'):
+            return f"Item {posicao}: 'path' deve começar com /api/"
+        if caminho.split('?')[0].rstrip('/') == '/api/batch':
+            return f"Item {posicao}: lotes não podem ser aninhados"
+        if caminho.split('?')[0].rstrip('/') in ROTAS_STREAM:
+            return f"Item {posicao}: rotas de stream não podem entrar num lote"
+    return None
+
+def _despachar(app, item, usuario, cabecalhos):
+    """
+    Executa um item como se fosse uma requisição HTTP e devolve {status, body}
+    """
+    metodo = str(item.get('method', 'GET')).upper()
+    construtor = EnvironBuilder(
+        path=item['path'],
+        method=metodo,
+        headers=cabecalhos,
+        json=item.get('body') if metodo != 'GET' and item.get('body') is not None else None
+    )
+    environ = construtor.get_environ()
+    environ[auth.CHAVE_USUARIO_LOTE] = usuario
+
+    with app.request_context(environ):
+        resposta = app.full_dispatch_request()
+        try:
+            # Stream sem fim (ex: rota nova de eventos): get_data() nunca voltaria
+            if resposta.is_streamed and resposta.mimetype == 'text/event-stream':
+                return {"status": 400, "body": {"error": "Rotas de stream não podem entrar num lote"}}
+            dados = resposta.get_data()
+            status = resposta.status_code
+            tipo = resposta.mimetype
+        finally:
+            resposta.close()
+
+    if tipo == 'application/json':
+        corpo = json.loads(dados) if dados else None
+    else:
+        corpo = dados.decode('utf-8', errors='replace')
+    return {"status": status, "body": corpo}
+
+def _executar_item(app, item, usuario, cabecalhos):
+    try:
+        return _despachar(app, item, usuario, cabecalhos)
+    except Exception as e:
+        return {"status": 500, "body": {"error": f"Erro ao executar item: {e}"}}
+
+def executar_lote(app, itens, usuario, cabecalhos=None):
+    """
+    Executa os itens do lote e devolve as respostas na mesma ordem
+    usuario: payload do token já verificado no /api/batch
+    """
+    cabecalhos = cabecalhos or {}
+    respostas = [None] * len(itens)
+    leituras = []  # (posição, future) dos GETs em andamento
+
+    def esperar_leituras():
+        for posicao, futuro in leituras:
+            respostas[posicao] = futuro.result()
+        leituras.clear()
+
+    for posicao, item in enumerate(itens):
+        if str(item.get('method', 'GET')).upper() == 'GET':
+            leituras.append((posicao, _executor.submit(_executar_item, app, item, usuario, cabecalhos)))
+            continue
+
+        # Escrita: os GETs anteriores terminam antes e os seguintes enxergam o resultado
+        esperar_leituras()
+        respostas[posicao] = _executor.submit(_executar_item, app, item, usuario, cabecalhos).result()
+
+    esperar_leituras()
+
+    for posicao, (item, resposta) in enumerate(zip(itens, respostas)):
+        resposta['id'] = item.get('id', posicao)
+    return respostas
@@ -0,0 +1,379 @@
+"""
+Manutenção - Agendador de Tarefas de Manutenção do Banco
+Roda em uma thread do próprio servidor, para cada unidade:
+    checkpoint  PRAGMA wal_checkpoint quando o arquivo -wal passa do limite
+    optimize    PRAGMA optimize (atualiza estatísticas que ficaram velhas)
+    analyze     ANALYZE completo, só na janela de baixo movimento
+    vacuum      PRAGMA incremental_vacuum em passos pequenos, só na janela
+                (bancos antigos sem auto_vacuum recebem um VACUUM completo uma vez)
+    backup      cópia a quente comprimida (backup.py), só na janela
+    mudancas    poda as exclusões do feed de mudanças mais antigas que a retenção
+
+Nunca trava o balcão: as conexões de manutenção desistem em milissegundos se o
+banco estiver ocupado, as tarefas pesadas só rodam sem requisições de escrita ou
+relatório em andamento, e cada adiamento dobra o tempo até a próxima tentativa.
+
+Configuração:
+    FLOWFIT_MANUTENCAO=0                  desliga o agendador
+    FLOWFIT_MANUTENCAO_JANELA=02:00-05:00 janela de baixo movimento
+    FLOWFIT_MANUTENCAO_<TAREFA>=segundos  intervalo de cada tarefa
+    FLOWFIT_WAL_LIMITE_MB=16              tamanho do -wal que dispara o checkpoint
+    FLOWFIT_VACUUM_PAGINAS=256            páginas liberadas por passo de vacuum
+    FLOWFIT_MUDANCAS_RETENCAO_DIAS=90     dias que uma exclusão fica no feed de mudanças
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import admissao
+import backup
+import database
+
+ATIVO = os.environ.get('FLOWFIT_MANUTENCAO', '1') != '0'
+JANELA = os.environ.get('FLOWFIT_MANUTENCAO_JANELA', '02:00-05:00')
+WAL_LIMITE_BYTES = float(os.environ.get('FLOWFIT_WAL_LIMITE_MB', 16)) * 1024 * 1024
+VACUUM_PAGINAS = int(os.environ.get('FLOWFIT_VACUUM_PAGINAS', 256))
+RETENCAO_MUDANCAS_DIAS = int(os.environ.get('FLOWFIT_MUDANCAS_RETENCAO_DIAS', 90))
+
+# Exclusões apagadas por transação na poda do feed de mudanças
+PODA_LOTE = 1000
+
+# Quanto a conexão de manutenção espera por uma trava antes de desistir
+ESPERA_TRAVA = 0.05
+
+# Intervalo do laço do agendador e limite do adiamento exponencial
+INTERVALO_VERIFICACAO = 30
+ADIAMENTO_MAXIMO = 3600
+
+_local = threading.local()
+
+
+class BancoOcupado(Exception):
+    """
+    A tarefa desistiu porque o banco (ou o servidor) estava ocupado
+    """
+
+
+class Tarefa:
+    """
+    Tarefa periódica com o estado da última execução
+    O estado é lido pela rota de administração enquanto a thread do agendador o altera:
+    mexa nele só com o lock
+    """
+
+    def __init__(self, nome, intervalo, funcao, so_na_janela=False, exige_ocioso=False):
+        self.nome = nome
+        self.intervalo = float(os.environ.get(f'FLOWFIT_MANUTENCAO_{nome.upper()}', intervalo))
+        self.funcao = funcao
+        self.so_na_janela = so_na_janela
+        self.exige_ocioso = exige_ocioso
+
+        self.proxima = time.time() + min(self.intervalo, 60)
+        self.adiamento = INTERVALO_VERIFICACAO
+        self.execucoes = 0
+        self.ultima_execucao = None
+        self.duracao_ms = None
+        self.resultado = None   # 'ok', 'adiado' ou 'erro'
+        self.mensagem = None
+        self.pedida = False     # execução pedida pelo admin, à espera do agendador
+        self.em_execucao = False
+        self.lock = threading.Lock()
+
+    def situacao(self):
+        with self.lock:
+            return {
+                "tarefa": self.nome,
+                "intervalo_segundos": self.intervalo,
+                "so_na_janela": self.so_na_janela,
+                "execucoes": self.execucoes,
+                "ultima_execucao": self.ultima_execucao,
+                "duracao_ms": self.duracao_ms,
+                "resultado": self.resultado,
+                "mensagem": self.mensagem,
+                "pedida": self.pedida,
+                "em_execucao": self.em_execucao,
+                "proxima_execucao": datetime.fromtimestamp(self.proxima).isoformat(timespec='seconds')
+            }
+
+# ==================== TAREFAS ====================
+
+def _conectar(caminho):
+    """
+    Conexão própria da manutenção: autocommit e espera curtíssima por travas
+    """
+    return sqlite3.connect(caminho, timeout=ESPERA_TRAVA, isolation_level=None)
+
+def _checkpoint(caminho):
+    wal = caminho + '-wal'
+    tamanho = os.path.getsize(wal) if os.path.exists(wal) else 0
+    if tamanho < WAL_LIMITE_BYTES:
+        return f'wal com {tamanho // 1024} KB, abaixo do limite'
+
+    # PASSIVE nunca espera leitores/escritores; TRUNCATE (que zera o arquivo) só com o servidor parado
+    modo = 'TRUNCATE' if _servidor_ocioso() else 'PASSIVE'
+    conn = _conectar(caminho)
+    try:
+        ocupado, paginas_wal, paginas_copiadas = conn.execute(f'PRAGMA wal_checkpoint({modo})').fetchone()
+    finally:
+        conn.close()
+    if ocupado:
+        raise BancoOcupado('checkpoint não concluído, leitores ativos')
+    return f'{modo}: {paginas_copiadas}/{paginas_wal} páginas copiadas'
+
+def _optimize(caminho):
+    conn = _conectar(caminho)
+    try:
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return 'estatísticas atualizadas'
+
+def _analyze(caminho):
+    conn = _conectar(caminho)
+    try:
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return 'ANALYZE concluído'
+
+def _vacuum(caminho):
+    conn = _conectar(caminho)
+    try:
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        livres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+        if auto_vacuum != 2:
+            # Banco criado antes do auto_vacuum incremental: converte com um VACUUM completo
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            return f'VACUUM completo (modo incremental ativado, {livres} páginas livres)'
+
+        if livres == 0:
+            return 'nenhuma página livre'
+
+        # Passos pequenos: cada um é uma transação curta de escrita
+        liberadas = 0
+        while livres > 0:
+            if not _servidor_ocioso():
+                raise BancoOcupado(f'interrompido após liberar {liberadas} páginas')
+            conn.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGINAS})').fetchall()
+            restantes = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            liberadas += livres - restantes
+            if restantes == livres:
+                break
+            livres = restantes
+        return f'{liberadas} páginas devolvidas ao sistema'
+    finally:
+        conn.close()
+
+def _backup(caminho):
+    resultado = backup.criar_backup(database.tenant_atual())
+    if not resultado['success']:
+        raise RuntimeError(resultado['error'])
+    return f"{resultado['arquivo']} ({resultado['tamanho_comprimido'] // 1024} KB)"
+
+def _mudancas(caminho):
+    """
+    Apaga de mudancas_removidos o que passou da retenção, em lotes curtos, e guarda em
+    removidos_ate até onde apagou: cópias locais mais antigas que isso recebem
+    "recarregar" (models.obter_mudancas). Os '*' de backup restaurado ficam
+    """
+    conn = _conectar(caminho)
+    try:
+        limite = conn.execute('''
+            SELECT MAX(seq) FROM mudancas_removidos
+            WHERE tabela != '*' AND removido_em < datetime('now', ?)
+        ''', (f'-{RETENCAO_MUDANCAS_DIAS} days',)).fetchone()[0]
+        if limite is None:
+            return 'nenhuma exclusão fora da retenção'
+
+        apagadas = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                ate = conn.execute('''
+                    SELECT MAX(seq) FROM (
+                        SELECT seq FROM mudancas_removidos
+                        WHERE seq <= ? AND tabela != '*'
+                        ORDER BY seq LIMIT ?
+                    )
+                ''', (limite, PODA_LOTE)).fetchone()[0]
+                if ate is not None:
+                    apagadas += conn.execute('''
+                        DELETE FROM mudancas_removidos WHERE seq <= ? AND tabela != '*'
+                    ''', (ate,)).rowcount
+                    conn.execute('''
+                        UPDATE mudancas_contador SET removidos_ate = MAX(removidos_ate, ?) WHERE id = 1
+                    ''', (ate,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if ate is None or ate >= limite:
+                break
+            if not _servidor_ocioso():
+                raise BancoOcupado(f'interrompido após apagar {apagadas} exclusões')
+        return f'{apagadas} exclusões apagadas (feed completo a partir do seq {limite})'
+    finally:
+        conn.close()
+
+TAREFAS = {
+    'checkpoint': Tarefa('checkpoint', 60, _checkpoint),
+    'optimize': Tarefa('optimize', 3600, _optimize),
+    'analyze': Tarefa('analyze', 86400, _analyze, so_na_janela=True, exige_ocioso=True),
+    'vacuum': Tarefa('vacuum', 86400, _vacuum, so_na_janela=True, exige_ocioso=True),
+    'backup': Tarefa('backup', 86400, _backup, so_na_janela=True),
+    'mudancas': Tarefa('mudancas', 86400, _mudancas),
+}
+
+# ==================== AGENDADOR ====================
+
+def _na_janela(agora=None):
+    """
+    Verifica se o horário atual está na janela de baixo movimento (aceita virar a meia-noite)
+    """
+    agora = (agora or datetime.now()).strftime('%H:%M')
+    inicio, fim = JANELA.split('-')
+    if inicio <= fim:
+        return inicio <= agora < fim
+    return agora >= inicio or agora < fim
+
+def _servidor_ocioso():
+    """
+    Nenhuma escrita ou relatório em andamento/na fila
+    (execuções pedidas pelo admin ignoram essa verificação)
+    """
+    if getattr(_local, 'forcado', False):
+        return True
+    for nome in ('escrita', 'relatorio'):
+        estado = admissao.CLASSES[nome].situacao()
+        if estado['ativos'] or estado['na_fila']:
+            return False
+    return True
+
+def executar(tarefa, forcar=False):
+    """
+    Executa uma tarefa em todas as unidades e registra o resultado
+    (roda na thread do agendador; o admin usa pedir())
+    """
+    if not forcar:
+        if tarefa.so_na_janela and not _na_janela():
+            return
+        if tarefa.exige_ocioso and not _servidor_ocioso():
+            with tarefa.lock:
+                _adiar(tarefa, 'servidor ocupado')
+            return
+
+    with tarefa.lock:
+        tarefa.em_execucao = True
+    inicio = time.perf_counter()
+    mensagens = []
+    _local.forcado = forcar
+    try:
+        for tenant in database.listar_tenants():
+            caminho = database.caminho_banco(tenant)
+            if os.path.exists(caminho):
+                with database.usar_tenant(tenant):
+                    mensagens.append(f'{tenant}: {tarefa.funcao(caminho)}')
+    except (BancoOcupado, sqlite3.OperationalError) as e:
+        with tarefa.lock:
+            tarefa.duracao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            _adiar(tarefa, str(e))
+        return
+    except Exception as e:
+        with tarefa.lock:
+            tarefa.duracao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+            tarefa.resultado = 'erro'
+            tarefa.mensagem = str(e)
+            tarefa.ultima_execucao = datetime.now().isoformat(timespec='seconds')
+            tarefa.proxima = time.time() + tarefa.intervalo
+        print(f"✗ Erro na manutenção ({tarefa.nome}): {e}")
+        return
+    finally:
+        _local.forcado = False
+        with tarefa.lock:
+            tarefa.em_execucao = False
+
+    with tarefa.lock:
+        tarefa.duracao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        tarefa.execucoes += 1
+        tarefa.resultado = 'ok'
+        tarefa.mensagem = '; '.join(mensagens)
+        tarefa.ultima_execucao = datetime.now().isoformat(timespec='seconds')
+        tarefa.adiamento = INTERVALO_VERIFICACAO
+        tarefa.proxima = time.time() + tarefa.intervalo
+
+def _adiar(tarefa, motivo):
+    """
+    Reagenda com espera crescente (30s, 60s, 120s... até 1h); chamar com tarefa.lock
+    """
+    tarefa.resultado = 'adiado'
+    tarefa.mensagem = motivo
+    tarefa.proxima = time.time() + tarefa.adiamento
+    tarefa.adiamento = min(tarefa.adiamento * 2, ADIAMENTO_MAXIMO)
+
+def pedir(tarefa):
+    """
+    Pede uma execução forçada (admin): roda na thread do agendador, não na requisição
+    (um VACUUM completo pode levar minutos). Devolve False se já estava pedida ou rodando
+    """
+    with tarefa.lock:
+        if tarefa.pedida or tarefa.em_execucao:
+            return False
+        tarefa.pedida = True
+    _subir_thread()
+    _acordar.set()
+    return True
+
+def _laco():
+    while True:
+        _acordar.wait(INTERVALO_VERIFICACAO)
+        _acordar.clear()
+        for tarefa in TAREFAS.values():
+            with tarefa.lock:
+                pedida, tarefa.pedida = tarefa.pedida, False
+            if pedida:
+                executar(tarefa, forcar=True)
+            elif _iniciado and time.time() >= tarefa.proxima:
+                executar(tarefa)
+
+_iniciado = False        # agendamento periódico ligado
+_thread_viva = False
+_lock = threading.Lock()
+_acordar = threading.Event()
+
+def _subir_thread():
+    global _thread_viva
+    with _lock:
+        if _thread_viva:
+            return
+        _thread_viva = True
+    threading.Thread(target=_laco, name='manutencao', daemon=True).start()
+
+def iniciar():
+    """
+    Liga o agendamento periódico (uma vez por processo); com FLOWFIT_MANUTENCAO=0 a thread
+    só sobe no primeiro pedido do admin
+    """
+    global _iniciado
+    if not ATIVO:
+        return
+    with _lock:
+        if _iniciado:
+            return
+        _iniciado = True
+    _subir_thread()
+
+def situacao():
+    """
+    Estado de todas as tarefas (para a rota de administração)
+    """
+    return {
+        "ativo": ATIVO and _iniciado,
+        "janela": JANELA,
+        "na_janela": _na_janela(),
+        "tarefas": [tarefa.situacao() for tarefa in TAREFAS.values()]
+    }
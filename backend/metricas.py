@@ -0,0 +1,156 @@
+"""
+Métricas - Instrumentação de Latência e SQL por Rota
+Coleta latência das requisições, quantidade de consultas e tempo gasto no banco
+e exporta tudo no formato texto do Prometheus
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Limites (em segundos) dos buckets do histograma de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Estado da requisição em andamento (uma requisição por thread no servidor Flask)
+_local = threading.local()
+
+# Agregados globais protegidos por lock
+_lock = threading.Lock()
+_latencia = {}       # (metodo, rota) -> {"buckets": [...], "soma": float, "total": int}
+_status = {}         # (metodo, rota, status) -> contador
+_sql = {}            # (metodo, rota) -> {"consultas": int, "segundos": float}
+
+# ==================== COLETA POR REQUISIÇÃO ====================
+
+def iniciar_requisicao():
+    """
+    Marca o início de uma requisição na thread atual
+    """
+    _local.inicio = time.perf_counter()
+    _local.consultas = 0
+    _local.tempo_sql = 0.0
+    _local.ativo = True
+
+def registrar_comando(sql):
+    """
+    Callback de trace do sqlite3: conta cada comando executado na requisição
+    """
+    if getattr(_local, 'ativo', False):
+        _local.consultas += 1
+
+def registrar_tempo_sql(segundos):
+    """
+    Soma o tempo gasto dentro do SQLite (execute/fetch) na requisição atual
+    """
+    if getattr(_local, 'ativo', False):
+        _local.tempo_sql += segundos
+
+def finalizar_requisicao(metodo, rota, status):
+    """
+    Encerra a requisição atual e acumula seus números nos agregados globais
+    Retorna um resumo usado no cabeçalho Server-Timing
+    """
+    if not getattr(_local, 'ativo', False):
+        return None
+
+    duracao = time.perf_counter() - _local.inicio
+    resumo = {
+        "duracao": duracao,
+        "consultas": _local.consultas,
+        "tempo_sql": _local.tempo_sql
+    }
+    _local.ativo = False
+
+    chave = (metodo, rota)
+    indice = bisect_left(BUCKETS_LATENCIA, duracao)
+
+    with _lock:
+        histograma = _latencia.get(chave)
+        if histograma is None:
+            histograma = {"buckets": [0] * len(BUCKETS_LATENCIA), "soma": 0.0, "total": 0}
+            _latencia[chave] = histograma
+        if indice < len(BUCKETS_LATENCIA):
+            histograma["buckets"][indice] += 1
+        histograma["soma"] += duracao
+        histograma["total"] += 1
+
+        chave_status = (metodo, rota, status)
+        _status[chave_status] = _status.get(chave_status, 0) + 1
+
+        sql = _sql.get(chave)
+        if sql is None:
+            sql = {"consultas": 0, "segundos": 0.0}
+            _sql[chave] = sql
+        sql["consultas"] += resumo["consultas"]
+        sql["segundos"] += resumo["tempo_sql"]
+
+    return resumo
+
+def cabecalho_server_timing(resumo):
+    """
+    Monta o valor do cabeçalho Server-Timing a partir do resumo da requisição
+    """
+    return 'app;dur=%.2f, sql;dur=%.2f;desc="%d consultas"' % (
+        resumo["duracao"] * 1000,
+        resumo["tempo_sql"] * 1000,
+        resumo["consultas"]
+    )
+
+# ==================== EXPORTAÇÃO ====================
+
+def _rotulos(**valores):
+    """
+    Formata rótulos do Prometheus escapando aspas e barras
+    """
+    partes = []
+    for nome, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nome}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+def exportar_prometheus():
+    """
+    Gera o texto de exposição no formato do Prometheus
+    """
+    with _lock:
+        latencia = {chave: {"buckets": list(h["buckets"]), "soma": h["soma"], "total": h["total"]}
+                    for chave, h in _latencia.items()}
+        status = dict(_status)
+        sql = {chave: dict(valor) for chave, valor in _sql.items()}
+
+    linhas = [
+        '# HELP flowfit_http_request_duration_seconds Latência das requisições por rota',
+        '# TYPE flowfit_http_request_duration_seconds histogram'
+    ]
+    for (metodo, rota), histograma in sorted(latencia.items()):
+        acumulado = 0
+        for limite, quantidade in zip(BUCKETS_LATENCIA, histograma["buckets"]):
+            acumulado += quantidade
+            linhas.append('flowfit_http_request_duration_seconds_bucket%s %d' % (
+                _rotulos(method=metodo, route=rota, le=limite), acumulado))
+        linhas.append('flowfit_http_request_duration_seconds_bucket%s %d' % (
+            _rotulos(method=metodo, route=rota, le='+Inf'), histograma["total"]))
+        linhas.append('flowfit_http_request_duration_seconds_sum%s %.6f' % (
+            _rotulos(method=metodo, route=rota), histograma["soma"]))
+        linhas.append('flowfit_http_request_duration_seconds_count%s %d' % (
+            _rotulos(method=metodo, route=rota), histograma["total"]))
+
+    linhas.append('# HELP flowfit_http_requests_total Requisições atendidas por rota e status')
+    linhas.append('# TYPE flowfit_http_requests_total counter')
+    for (metodo, rota, codigo), quantidade in sorted(status.items()):
+        linhas.append('flowfit_http_requests_total%s %d' % (
+            _rotulos(method=metodo, route=rota, status=codigo), quantidade))
+
+    linhas.append('# HELP flowfit_sql_queries_total Comandos SQL executados por rota')
+    linhas.append('# TYPE flowfit_sql_queries_total counter')
+    for (metodo, rota), valor in sorted(sql.items()):
+        linhas.append('flowfit_sql_queries_total%s %d' % (
+            _rotulos(method=metodo, route=rota), valor["consultas"]))
+
+    linhas.append('# HELP flowfit_sql_duration_seconds_total Tempo gasto no SQLite por rota')
+    linhas.append('# TYPE flowfit_sql_duration_seconds_total counter')
+    for (metodo, rota), valor in sorted(sql.items()):
+        linhas.append('flowfit_sql_duration_seconds_total%s %.6f' % (
+            _rotulos(method=metodo, route=rota), valor["segundos"]))
+
+    return '\n'.join(linhas) + '\n'
@@ -3,8 +3,68 @@ Models - Modelos de Dados e Operações no Banco
 Contém todas as funções para manipular clientes e pagamentos
 """
 
-from database import get_connection
+from database import get_connection, get_connection_leitura, somente_digitos, tenant_atual
 from datetime import datetime, date
+import cache
+import escrita
+import eventos
+
+# ==================== PROJEÇÃO DE CAMPOS ====================
+
+# Campos que cada listagem aceita em fields= (campo -> expressão SQL) e os
+# campos devolvidos quando fields= não é informado (o que as telas exibem)
+PROJECOES = {
+    'clientes': ({
+        'id': 'c.id', 'nome': 'c.nome', 'email': 'c.email', 'telefone': 'c.telefone',
+        'cpf': 'c.cpf', 'endereco': 'c.endereco', 'observacoes': 'c.observacoes',
+        'data_cadastro': 'c.data_cadastro', 'ativo': 'c.ativo',
+    }, ('id', 'nome', 'cpf', 'telefone', 'email')),
+    'pagamentos': ({
+        'id': 'p.id', 'cliente_id': 'p.cliente_id', 'valor': 'p.valor',
+        'vencimento': 'p.vencimento', 'data_pagamento': 'p.data_pagamento', 'status': 'p.status',
+        'descricao': 'p.descricao', 'metodo_pagamento': 'p.metodo_pagamento',
+        'observacoes': 'p.observacoes', 'usuario_registro_id': 'p.usuario_registro_id',
+        'data_criacao': 'p.data_criacao',
+        # Só estes exigem o JOIN com clientes
+        'cliente_nome': 'c.nome', 'cliente_cpf': 'c.cpf', 'cliente_telefone': 'c.telefone',
+    }, ('id', 'cliente_id', 'valor', 'vencimento', 'data_pagamento', 'status', 'descricao',
+        'metodo_pagamento')),
+    'inadimplentes': ({
+        'id': 'c.id', 'nome': 'c.nome', 'telefone': 'c.telefone', 'email': 'c.email',
+        'qtd_pendencias': 'COUNT(p.id)', 'valor_total': 'SUM(p.valor)',
+        'vencimento_mais_antigo': 'MIN(p.vencimento)',
+    }, ('id', 'nome', 'telefone', 'email', 'qtd_pendencias', 'valor_total', 'vencimento_mais_antigo')),
+    'pagaram_mes': ({
+        'id': 'c.id', 'nome': 'c.nome', 'telefone': 'c.telefone',
+        'qtd_pagamentos': 'COUNT(p.id)', 'valor_total': 'SUM(p.valor)',
+        'ultimo_pagamento': 'MAX(p.data_pagamento)',
+    }, ('id', 'nome', 'telefone', 'qtd_pagamentos', 'valor_total', 'ultimo_pagamento')),
+}
+
+CAMPOS_JOIN_CLIENTE = {'cliente_nome', 'cliente_cpf', 'cliente_telefone'}
+
+def escolher_campos(fields, entidade):
+    """
+    Valida o parâmetro fields= (ex: "id,nome,cpf") contra os campos da listagem
+    Devolve (campos, erro); sem fields= usa os campos padrão
+    """
+    permitidos, padrao = PROJECOES[entidade]
+    if not fields:
+        return list(padrao), None
+    
+    campos = list(dict.fromkeys(campo.strip() for campo in fields.split(',') if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in permitidos]
+    if invalidos or not campos:
+        return None, (f"Campos inválidos: {', '.join(invalidos) or '(nenhum)'}. "
+                      f"Permitidos: {', '.join(permitidos)}")
+    return campos, None
+
+def _colunas(entidade, campos):
+    """
+    Lista de colunas do SELECT só com os campos pedidos
+    """
+    permitidos, padrao = PROJECOES[entidade]
+    return ', '.join(f'{permitidos[campo]} as {campo}' for campo in campos or padrao)
 
 # ==================== OPERAÇÕES DE CLIENTES ====================
 
@@ -12,52 +72,121 @@ def criar_cliente(nome, email, telefone, cpf, endereco='', observacoes=''):
     """
     Cria um novo cliente no banco de dados
     """
-    conn = get_connection()
-    cursor = conn.cursor()
+    def inserir(conn):
+        cursor = conn.execute('''
+            INSERT INTO clientes (nome, email, telefone, cpf, endereco, observacoes,
+                                  cpf_digitos, telefone_digitos)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (nome, email, telefone, cpf, endereco, observacoes,
+              somente_digitos(cpf), somente_digitos(telefone)))
+        return cursor.lastrowid
     
     try:
-        cursor.execute('''
-            INSERT INTO clientes (nome, email, telefone, cpf, endereco, observacoes)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (nome, email, telefone, cpf, endereco, observacoes))
-        
-        conn.commit()
-        cliente_id = cursor.lastrowid
-        conn.close()
-        return {"success": True, "id": cliente_id}
-    except Exception as e:
-        conn.close()
-        return {"success": False, "error": "CPF já cadastrado"}
+        cliente_id = escrita.executar(inserir)
+    except escrita.ErroRestricao as e:
+        return {"success": False, "error": escrita.mensagem_restricao(e, 'clientes.cpf', "CPF já cadastrado")}
+    
+    eventos.publicar('cliente', {"acao": "criado", "id": cliente_id})
+    return {"success": True, "id": cliente_id}
 
-def listar_clientes(busca=None):
+def listar_clientes(busca=None, campos=None):
     """
     Lista todos os clientes ou filtra por nome/CPF
+    campos: campos devolvidos (ver escolher_campos); padrão são os da tabela de clientes
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
+    colunas = _colunas('clientes', campos)
     
     if busca:
-        cursor.execute('''
-            SELECT * FROM clientes 
-            WHERE (nome LIKE ? OR cpf LIKE ?) AND ativo = 1
-            ORDER BY nome
-        ''', (f'%{busca}%', f'%{busca}%'))
+        # CPF/telefone com ou sem pontuação: compara também só os dígitos
+        digitos = somente_digitos(busca)
+        cursor.execute(f'''
+            SELECT {colunas} FROM clientes c
+            WHERE (c.nome LIKE ? OR c.cpf LIKE ? OR c.cpf_digitos LIKE ? OR c.telefone_digitos LIKE ?)
+              AND c.ativo = 1
+            ORDER BY c.nome
+        ''', (f'%{busca}%', f'%{busca}%', f'%{digitos}%' if digitos else None,
+              f'%{digitos}%' if digitos else None))
     else:
-        cursor.execute('SELECT * FROM clientes WHERE ativo = 1 ORDER BY nome')
+        cursor.execute(f'SELECT {colunas} FROM clientes c WHERE c.ativo = 1 ORDER BY c.nome')
     
     clientes = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return clientes
 
+# Dígitos mínimos para a busca por prefixo (menos que isso varreria meio índice)
+MIN_DIGITOS_BUSCA = 3
+
+def buscar_por_documento(documento, limite=20):
+    """
+    Busca clientes ativos pelo CPF ou telefone, com ou sem formatação
+    CPF completo (11 dígitos) -> igualdade; parcial -> prefixo.
+    As duas viram buscas no índice: o prefixo '123' é a faixa ['123', '123:')
+    (':' vem logo depois do '9' na tabela ASCII)
+    """
+    digitos = somente_digitos(documento)
+    if not digitos or len(digitos) < MIN_DIGITOS_BUSCA:
+        return {"success": False, "error": f"Informe pelo menos {MIN_DIGITOS_BUSCA} dígitos"}
+    
+    exato = len(digitos) == 11
+    if exato:
+        condicao_cpf = 'cpf_digitos = ?'
+        parametros_cpf = (digitos,)
+    else:
+        condicao_cpf = 'cpf_digitos >= ? AND cpf_digitos < ?'
+        parametros_cpf = (digitos, digitos + ':')
+    
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    
+    cursor.execute(f'''
+        SELECT id, nome, cpf, telefone, email, 'cpf' as encontrado_por
+        FROM clientes
+        WHERE {condicao_cpf} AND ativo = 1
+        UNION ALL
+        SELECT id, nome, cpf, telefone, email, 'telefone' as encontrado_por
+        FROM clientes
+        WHERE telefone_digitos >= ? AND telefone_digitos < ? AND ativo = 1
+        LIMIT ?
+    ''', (*parametros_cpf, digitos, digitos + ':', limite))
+    
+    clientes = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return {"success": True, "documento": digitos, "busca": "exata" if exato else "prefixo",
+            "clientes": clientes}
+
 def obter_cliente(cliente_id):
     """
     Obtém um cliente específico por ID com estatísticas
+    Passa pelo cache (cache.clientes); as escritas no cliente e nos pagamentos dele
+    invalidam a entrada
+    """
+    tenant = tenant_atual()
+    cache.conferir_unidade(tenant)
+    return cache.clientes.obter((tenant, cliente_id), lambda: _carregar_cliente(cliente_id))
+
+def _invalidar_cliente(cliente_id):
+    """
+    Descarta o cliente do cache e os relatórios em cache da unidade (aging)
+    """
+    tenant = tenant_atual()
+    cache.clientes.invalidar((tenant, cliente_id))
+    cache.relatorios.limpar(lambda chave: chave[0] == tenant)
+
+def _carregar_cliente(cliente_id):
+    """
+    Lê o cliente e as estatísticas de pagamentos no banco
     """
     conn = get_connection()
     cursor = conn.cursor()
     
     # Dados do cliente
-    cursor.execute('SELECT * FROM clientes WHERE id = ?', (cliente_id,))
+    # Colunas listadas: cpf_digitos, telefone_digitos e seq são internos
+    cursor.execute('''
+        SELECT id, nome, email, telefone, cpf, endereco, observacoes, data_cadastro, ativo
+        FROM clientes WHERE id = ?
+    ''', (cliente_id,))
     cliente = cursor.fetchone()
     
     if not cliente:
@@ -87,34 +216,34 @@ def atualizar_cliente(cliente_id, nome, email, telefone, cpf, endereco='', obser
     """
     Atualiza os dados de um cliente
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
+    def atualizar(conn):
+        conn.execute('''
             UPDATE clientes 
-            SET nome = ?, email = ?, telefone = ?, cpf = ?, endereco = ?, observacoes = ?
+            SET nome = ?, email = ?, telefone = ?, cpf = ?, endereco = ?, observacoes = ?,
+                cpf_digitos = ?, telefone_digitos = ?
             WHERE id = ?
-        ''', (nome, email, telefone, cpf, endereco, observacoes, cliente_id))
-        
-        conn.commit()
-        conn.close()
-        return {"success": True}
-    except Exception as e:
-        conn.close()
-        return {"success": False, "error": "CPF já cadastrado para outro cliente"}
+        ''', (nome, email, telefone, cpf, endereco, observacoes,
+              somente_digitos(cpf), somente_digitos(telefone), cliente_id))
+    
+    try:
+        escrita.executar(atualizar)
+    except escrita.ErroRestricao as e:
+        return {"success": False, "error": escrita.mensagem_restricao(
+            e, 'clientes.cpf', "CPF já cadastrado para outro cliente")}
+    
+    _invalidar_cliente(cliente_id)
+    eventos.publicar('cliente', {"acao": "atualizado", "id": cliente_id})
+    return {"success": True}
 
 def deletar_cliente(cliente_id):
     """
     Desativa um cliente (soft delete)
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('UPDATE clientes SET ativo = 0 WHERE id = ?', (cliente_id,))
-    conn.commit()
-    conn.close()
+    escrita.executar(lambda conn: conn.execute('UPDATE clientes SET ativo = 0 WHERE id = ?',
+                                               (cliente_id,)))
+    _invalidar_cliente(cliente_id)
     
+    eventos.publicar('cliente', {"acao": "desativado", "id": cliente_id})
     return {"success": True}
 
 # ==================== OPERAÇÕES DE PAGAMENTOS ====================
@@ -127,31 +256,35 @@ def criar_pagamento(cliente_id, valor, vencimento, descricao, usuario_id=None):
     if valor <= 0:
         return {"success": False, "error": "O valor do pagamento deve ser maior que zero"}
     
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO pagamentos (cliente_id, valor, vencimento, descricao, status, usuario_registro_id)
-        VALUES (?, ?, ?, ?, 'pendente', ?)
-    ''', (cliente_id, valor, vencimento, descricao, usuario_id))
+    def inserir(conn):
+        cursor = conn.execute('''
+            INSERT INTO pagamentos (cliente_id, valor, vencimento, descricao, status, usuario_registro_id)
+            VALUES (?, ?, ?, ?, 'pendente', ?)
+        ''', (cliente_id, valor, vencimento, descricao, usuario_id))
+        return cursor.lastrowid
     
-    conn.commit()
-    pagamento_id = cursor.lastrowid
-    conn.close()
+    pagamento_id = escrita.executar(inserir)
+    _invalidar_cliente(cliente_id)
     
+    eventos.publicar('pagamento', {"acao": "criado", "id": pagamento_id, "cliente_id": cliente_id,
+                                   "valor": valor, "vencimento": vencimento})
     return {"success": True, "id": pagamento_id}
 
-def listar_pagamentos(cliente_id=None, status=None, mes=None):
+def listar_pagamentos(cliente_id=None, status=None, mes=None, campos=None):
     """
     Lista pagamentos com filtros opcionais
+    campos: campos devolvidos (ver escolher_campos); os dados do cliente só
+    entram (com o JOIN) se cliente_nome/cliente_cpf/cliente_telefone forem pedidos
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
-    query = '''
-        SELECT p.*, c.nome as cliente_nome, c.cpf as cliente_cpf, c.telefone as cliente_telefone
+    campos = campos or PROJECOES['pagamentos'][1]
+    juncao = 'JOIN clientes c ON p.cliente_id = c.id' if CAMPOS_JOIN_CLIENTE.intersection(campos) else ''
+    query = f'''
+        SELECT {_colunas('pagamentos', campos)}
         FROM pagamentos p
-        JOIN clientes c ON p.cliente_id = c.id
+        {juncao}
         WHERE 1=1
     '''
     params = []
@@ -180,11 +313,13 @@ def obter_historico_pagamentos(cliente_id):
     """
     Obtém o histórico completo de pagamentos de um cliente
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
     cursor.execute('''
-        SELECT p.*, u.nome as usuario_nome
+        SELECT p.id, p.cliente_id, p.valor, p.vencimento, p.data_pagamento, p.status, p.descricao,
+               p.metodo_pagamento, p.observacoes, p.usuario_registro_id, p.data_criacao,
+               u.nome as usuario_nome
         FROM pagamentos p
         LEFT JOIN usuarios u ON p.usuario_registro_id = u.id
         WHERE p.cliente_id = ?
@@ -200,51 +335,48 @@ def registrar_pagamento(pagamento_id, metodo_pagamento):
     """
     Registra um pagamento como pago
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
     data_hoje = date.today().isoformat()
     
-    cursor.execute('''
+    afetados = escrita.executar(lambda conn: conn.execute('''
         UPDATE pagamentos 
         SET status = 'pago', data_pagamento = ?, metodo_pagamento = ?
         WHERE id = ?
-    ''', (data_hoje, metodo_pagamento, pagamento_id))
+        RETURNING cliente_id
+    ''', (data_hoje, metodo_pagamento, pagamento_id)).fetchall())
     
-    conn.commit()
-    conn.close()
+    for linha in afetados:
+        _invalidar_cliente(linha['cliente_id'])
     
+    eventos.publicar('pagamento', {"acao": "pago", "id": pagamento_id, "data_pagamento": data_hoje})
     return {"success": True}
 
 def cancelar_pagamento(pagamento_id):
     """
     Cancela um pagamento
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    afetados = escrita.executar(lambda conn: conn.execute('''
         UPDATE pagamentos 
         SET status = 'cancelado'
         WHERE id = ?
-    ''', (pagamento_id,))
+        RETURNING cliente_id
+    ''', (pagamento_id,)).fetchall())
     
-    conn.commit()
-    conn.close()
+    for linha in afetados:
+        _invalidar_cliente(linha['cliente_id'])
     
+    eventos.publicar('pagamento', {"acao": "cancelado", "id": pagamento_id})
     return {"success": True}
 
 def deletar_pagamento(pagamento_id):
     """
     Deleta permanentemente um pagamento
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM pagamentos WHERE id = ?', (pagamento_id,))
-    conn.commit()
-    conn.close()
+    afetados = escrita.executar(lambda conn: conn.execute(
+        'DELETE FROM pagamentos WHERE id = ? RETURNING cliente_id', (pagamento_id,)).fetchall())
+    for linha in afetados:
+        _invalidar_cliente(linha['cliente_id'])
     
+    eventos.publicar('pagamento', {"acao": "deletado", "id": pagamento_id})
     return {"success": True}
 
 # ==================== RELATÓRIOS E DASHBOARD ====================
@@ -253,7 +385,7 @@ def obter_estatisticas():
     """
     Obtém estatísticas gerais do sistema
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
     # Total de clientes ativos
@@ -305,25 +437,22 @@ def obter_estatisticas():
         "clientes_pagaram_mes": clientes_pagaram_mes
     }
 
-def obter_inadimplentes():
+def obter_inadimplentes(campos=None):
     """
     Lista clientes com pagamentos vencidos
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
     data_hoje = date.today().isoformat()
     
-    cursor.execute('''
-        SELECT c.id, c.nome, c.telefone, c.email,
-               COUNT(p.id) as qtd_pendencias,
-               SUM(p.valor) as valor_total,
-               MIN(p.vencimento) as vencimento_mais_antigo
+    cursor.execute(f'''
+        SELECT {_colunas('inadimplentes', campos)}
         FROM clientes c
         JOIN pagamentos p ON c.id = p.cliente_id
         WHERE p.status = 'pendente' AND p.vencimento < ?
         GROUP BY c.id
-        ORDER BY vencimento_mais_antigo
+        ORDER BY MIN(p.vencimento)
     ''', (data_hoje,))
     
     inadimplentes = [dict(row) for row in cursor.fetchall()]
@@ -331,20 +460,17 @@ def obter_inadimplentes():
     
     return inadimplentes
 
-def obter_clientes_pagaram_mes():
+def obter_clientes_pagaram_mes(campos=None):
     """
     Lista clientes que pagaram no mês atual
     """
-    conn = get_connection()
+    conn = get_connection_leitura()
     cursor = conn.cursor()
     
     mes_atual = datetime.now().strftime('%Y-%m')
     
-    cursor.execute('''
-        SELECT c.id, c.nome, c.telefone,
-               COUNT(p.id) as qtd_pagamentos,
-               SUM(p.valor) as valor_total,
-               MAX(p.data_pagamento) as ultimo_pagamento
+    cursor.execute(f'''
+        SELECT {_colunas('pagaram_mes', campos)}
         FROM clientes c
         JOIN pagamentos p ON c.id = p.cliente_id
         WHERE p.status = 'pago' AND p.data_pagamento LIKE ?
@@ -355,4 +481,86 @@ def obter_clientes_pagaram_mes():
     clientes = [dict(row) for row in cursor.fetchall()]
     conn.close()
     
-    return clientes
\ No newline at end of file
+    return clientes
+
+# ==================== FEED DE MUDANÇAS ====================
+
+# Colunas devolvidas por tabela no feed (a linha inteira, como a cópia local guarda)
+CAMPOS_MUDANCAS = {
+    'clientes': ('id', 'nome', 'email', 'telefone', 'cpf', 'endereco', 'observacoes',
+                 'data_cadastro', 'ativo'),
+    'pagamentos': ('id', 'cliente_id', 'valor', 'vencimento', 'data_pagamento', 'status', 'descricao',
+                   'metodo_pagamento', 'observacoes', 'usuario_registro_id', 'data_criacao'),
+    'usuarios': ('id', 'nome', 'email', 'tipo', 'ativo', 'data_criacao', 'ultimo_acesso'),
+}
+
+LIMITE_MUDANCAS = 1000
+MAX_LIMITE_MUDANCAS = 5000
+
+def obter_mudancas(desde=0, tabelas=('clientes', 'pagamentos'), limite=LIMITE_MUDANCAS):
+    """
+    Linhas criadas/alteradas e removidas depois do seq 'desde', em ordem de seq
+    Devolve no máximo 'limite' mudanças; com "mais": true, peça de novo com desde=ate.
+    "recarregar": true quando a cópia local não vale mais (ex: backup restaurado, ou
+    cópia mais antiga que a retenção das exclusões): descarte e sincronize de novo com desde=0
+    """
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    
+    # Lido antes das linhas: tudo com seq <= ultimo já está gravado (os seqs saem na
+    # ordem dos commits), então nada fica para trás entre uma consulta e outra
+    ultimo, removidos_ate = cursor.execute('''
+        SELECT valor, removidos_ate FROM mudancas_contador WHERE id = 1
+    ''').fetchone()
+    
+    if desde > 0:
+        cursor.execute('''
+            SELECT 1 FROM mudancas_removidos WHERE seq > ? AND tabela = '*' LIMIT 1
+        ''', (desde,))
+        # desde < removidos_ate: exclusões que essa cópia não viu já foram podadas (manutencao.py)
+        if desde > ultimo or desde < removidos_ate or cursor.fetchone():
+            conn.close()
+            return {"recarregar": True, "ultimo": ultimo}
+    
+    mudancas = []  # (seq, tabela, linha)
+    for tabela in tabelas:
+        cursor.execute(f'''
+            SELECT {', '.join(CAMPOS_MUDANCAS[tabela])}, seq FROM {tabela}
+            WHERE seq > ? AND seq <= ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (desde, ultimo, limite + 1))
+        mudancas.extend((linha['seq'], tabela, dict(linha)) for linha in cursor.fetchall())
+    
+    # Quem sincroniza do zero não tem o que remover
+    if desde > 0:
+        marcadores = ', '.join('?' for _ in tabelas)
+        cursor.execute(f'''
+            SELECT seq, tabela, registro_id FROM mudancas_removidos
+            WHERE seq > ? AND seq <= ? AND tabela IN ({marcadores})
+            ORDER BY seq
+            LIMIT ?
+        ''', (desde, ultimo, *tabelas, limite + 1))
+        mudancas.extend((linha['seq'], 'removidos',
+                         {"tabela": linha['tabela'], "id": linha['registro_id'], "seq": linha['seq']})
+                        for linha in cursor.fetchall())
+    conn.close()
+    
+    mudancas.sort(key=lambda mudanca: mudanca[0])
+    mais = len(mudancas) > limite
+    mudancas = mudancas[:limite]
+    
+    resultado = {tabela: [] for tabela in tabelas}
+    resultado['removidos'] = []
+    for _, tabela, linha in mudancas:
+        resultado[tabela].append(linha)
+    
+    resultado.update({
+        "desde": desde,
+        # Sem mais páginas, a cópia está em dia até o último seq do banco
+        "ate": mudancas[-1][0] if mais else ultimo,
+        "ultimo": ultimo,
+        "mais": mais,
+        "recarregar": False
+    })
+    return resultado
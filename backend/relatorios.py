@@ -0,0 +1,264 @@
+"""
+Relatórios - Séries Históricas de Receita e Aging de Recebíveis
+Lê do rollup receita_mensal (mantido por triggers em pagamentos) em vez de
+varrer a tabela de pagamentos a cada gráfico. O aging (valores em atraso por
+faixa de dias) sai de uma única passada pelo índice de status + vencimento e
+fica em cache até a próxima escrita em pagamentos ou a virada do dia
+
+Reconstruir o rollup manualmente:
+    python relatorios.py reconstruir
+"""
+
+import csv
+import io
+import re
+import sys
+from datetime import date, timedelta
+from database import init_db, get_connection_leitura, reconstruir_receita_mensal, tenant_atual
+import cache
+import escrita
+
+# Agrupamentos aceitos em obter_serie_receita()
+AGRUPAMENTOS = ('mes', 'metodo', 'status')
+
+_RE_MES = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# Faixas do aging: (nome, dias de atraso mínimo, máximo); None = sem limite
+FAIXAS_AGING = (('0-30', 0, 30), ('31-60', 31, 60), ('61-90', 61, 90), ('90+', 91, None))
+
+# ==================== RECEITA ====================
+
+def _mes_anterior(mes, quantidade):
+    """
+    Volta N meses a partir de um mês AAAA-MM
+    """
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    total = ano * 12 + (numero - 1) - quantidade
+    return f'{total // 12:04d}-{total % 12 + 1:02d}'
+
+def obter_serie_receita(de=None, ate=None, agrupar='mes'):
+    """
+    Série mensal de receita a partir do rollup
+
+    agrupar:
+        'mes'    -> faturado x recebido x pendente x cancelado por mês
+        'metodo' -> recebido por mês e método de pagamento
+        'status' -> quantidade e valor por mês e status
+    Meses no formato AAAA-MM; por padrão os últimos 12 meses
+    """
+    ate = ate or date.today().strftime('%Y-%m')
+    de = de or _mes_anterior(ate, 11)
+
+    if not _RE_MES.match(de) or not _RE_MES.match(ate):
+        return {"success": False, "error": "Meses devem estar no formato AAAA-MM"}
+    if de > ate:
+        return {"success": False, "error": "O mês inicial deve ser anterior ao final"}
+    if agrupar not in AGRUPAMENTOS:
+        return {"success": False, "error": f"agrupar deve ser um de: {', '.join(AGRUPAMENTOS)}"}
+
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+
+    if agrupar == 'mes':
+        cursor.execute('''
+            SELECT mes,
+                   SUM(CASE WHEN status != 'cancelado' THEN total ELSE 0 END) as faturado,
+                   SUM(CASE WHEN status = 'pago' THEN total ELSE 0 END) as recebido,
+                   SUM(CASE WHEN status = 'pendente' THEN total ELSE 0 END) as pendente,
+                   SUM(CASE WHEN status = 'cancelado' THEN total ELSE 0 END) as cancelado,
+                   SUM(CASE WHEN status != 'cancelado' THEN quantidade ELSE 0 END) as quantidade
+            FROM receita_mensal
+            WHERE mes BETWEEN ? AND ?
+            GROUP BY mes
+            ORDER BY mes
+        ''', (de, ate))
+    elif agrupar == 'metodo':
+        cursor.execute('''
+            SELECT mes, metodo_pagamento, SUM(quantidade) as quantidade, SUM(total) as total
+            FROM receita_mensal
+            WHERE mes BETWEEN ? AND ? AND status = 'pago'
+            GROUP BY mes, metodo_pagamento
+            ORDER BY mes, metodo_pagamento
+        ''', (de, ate))
+    else:
+        cursor.execute('''
+            SELECT mes, status, SUM(quantidade) as quantidade, SUM(total) as total
+            FROM receita_mensal
+            WHERE mes BETWEEN ? AND ?
+            GROUP BY mes, status
+            ORDER BY mes, status
+        ''', (de, ate))
+
+    serie = []
+    for row in cursor.fetchall():
+        ponto = dict(row)
+        # Arredonda para evitar resíduos de ponto flutuante das somas incrementais
+        for campo in ('faturado', 'recebido', 'pendente', 'cancelado', 'total'):
+            if campo in ponto:
+                ponto[campo] = round(ponto[campo] or 0, 2)
+        if 'metodo_pagamento' in ponto and not ponto['metodo_pagamento']:
+            ponto['metodo_pagamento'] = 'Não informado'
+        serie.append(ponto)
+    conn.close()
+
+    return {"success": True, "de": de, "ate": ate, "agrupar": agrupar, "serie": serie}
+
+# ==================== AGING ====================
+
+def _condicoes_aging(hoje):
+    """
+    (condição SQL, parâmetros) de cada faixa sobre vencimento (datas ISO, comparáveis
+    no índice); dias de atraso = hoje - vencimento
+    """
+    condicoes = []
+    for _, minimo, maximo in FAIXAS_AGING:
+        ate = (hoje - timedelta(days=minimo)).isoformat()
+        if maximo is None:
+            condicoes.append(('p.vencimento <= ?', [ate]))
+        else:
+            condicoes.append(('p.vencimento BETWEEN ? AND ?', [(hoje - timedelta(days=maximo)).isoformat(), ate]))
+    return condicoes
+
+def _calcular_aging(hoje, por_cliente, cliente_id):
+    """
+    Uma consulta: pendências vencidas no intervalo de idx_pagamentos_status_vencimento
+    """
+    condicoes = _condicoes_aging(hoje)
+    # Agregação condicional: todas as faixas na mesma passada
+    colunas = ',\n'.join(
+        f'SUM(CASE WHEN {condicao} THEN p.valor ELSE 0 END) AS valor_{i}, '
+        f'SUM(CASE WHEN {condicao} THEN 1 ELSE 0 END) AS qtd_{i}'
+        for i, (condicao, _) in enumerate(condicoes)
+    )
+    # Cada condição aparece duas vezes (valor e quantidade)
+    parametros = [p for _, parametros_faixa in condicoes for p in parametros_faixa * 2]
+    filtro = "p.status = 'pendente' AND p.vencimento < ?"
+    parametros.append(hoje.isoformat())
+    indice = ''
+    if cliente_id:
+        # Um cliente só: as poucas linhas dele pelo índice de cliente_id
+        indice = 'INDEXED BY idx_cliente_id'
+        filtro += ' AND p.cliente_id = ?'
+        parametros.append(cliente_id)
+
+    conn = get_connection_leitura()
+    cursor = conn.cursor()
+    detalhar = por_cliente or cliente_id
+    if detalhar:
+        # Intervalo em idx_pagamentos_status_vencimento (ou idx_cliente_id), agrupado por cliente
+        cursor.execute(f'''
+            SELECT p.cliente_id, c.nome, c.telefone,
+                   {colunas},
+                   COUNT(*) AS quantidade, SUM(p.valor) AS total, MIN(p.vencimento) AS vencimento_mais_antigo
+            FROM pagamentos p {indice}
+            JOIN clientes c ON c.id = p.cliente_id
+            WHERE {filtro}
+            GROUP BY p.cliente_id
+            ORDER BY total DESC
+        ''', parametros)
+    else:
+        cursor.execute(f'''
+            SELECT {colunas}, COUNT(*) AS quantidade, SUM(p.valor) AS total
+            FROM pagamentos p
+            WHERE {filtro}
+        ''', parametros)
+    linhas = cursor.fetchall()
+    conn.close()
+
+    faixas = [{"faixa": nome, "quantidade": 0, "valor": 0.0} for nome, _, _ in FAIXAS_AGING]
+    clientes = []
+    for row in linhas:
+        if not row['quantidade']:
+            continue  # sem GROUP BY o SELECT sempre devolve uma linha
+        for i, faixa in enumerate(faixas):
+            faixa['quantidade'] += row[f'qtd_{i}']
+            faixa['valor'] += row[f'valor_{i}']
+        if detalhar:
+            clientes.append({
+                "cliente_id": row['cliente_id'],
+                "nome": row['nome'],
+                "telefone": row['telefone'],
+                "quantidade": row['quantidade'],
+                "total": round(row['total'], 2),
+                "vencimento_mais_antigo": row['vencimento_mais_antigo'],
+                "faixas": {nome: round(row[f'valor_{i}'], 2) for i, (nome, _, _) in enumerate(FAIXAS_AGING)}
+            })
+
+    total = sum(f['valor'] for f in faixas)
+    for faixa in faixas:
+        faixa['percentual'] = round(faixa['valor'] / total * 100, 1) if total else 0
+        faixa['valor'] = round(faixa['valor'], 2)
+
+    resultado = {
+        "success": True,
+        "data_base": hoje.isoformat(),
+        "faixas": faixas,
+        "total": {"quantidade": sum(f['quantidade'] for f in faixas), "valor": round(total, 2)}
+    }
+    if detalhar:
+        resultado['clientes'] = clientes
+    return resultado
+
+def obter_aging(por_cliente=False, cliente_id=None, hoje=None):
+    """
+    Pendências vencidas por faixa de dias de atraso (0-30, 31-60, 61-90, 90+)
+    por_cliente: inclui a lista de clientes com o valor de cada faixa
+    cliente_id: só um cliente (já detalhado)
+    Fica em cache até a próxima escrita em pagamentos da unidade ou a virada do dia
+    """
+    hoje = hoje or date.today()
+    cache.conferir_unidade(tenant_atual())
+    chave = (tenant_atual(), 'aging', hoje.isoformat(), bool(por_cliente), cliente_id)
+    return cache.relatorios.obter(chave, lambda: _calcular_aging(hoje, por_cliente, cliente_id))
+
+def aging_csv(resultado):
+    """
+    Aging em CSV (separador ';' e vírgula decimal, como o Excel em português abre)
+    Com clientes: uma linha por cliente; sem: uma linha por faixa
+    """
+    def numero(valor):
+        return f'{valor:.2f}'.replace('.', ',')
+
+    saida = io.StringIO()
+    escritor = csv.writer(saida, delimiter=';')
+    nomes = [nome for nome, _, _ in FAIXAS_AGING]
+    if 'clientes' in resultado:
+        escritor.writerow(['cliente_id', 'nome', 'telefone', 'vencimento_mais_antigo']
+                          + [f'{nome} dias' for nome in nomes] + ['total'])
+        for cliente in resultado['clientes']:
+            escritor.writerow([cliente['cliente_id'], cliente['nome'], cliente['telefone'],
+                               cliente['vencimento_mais_antigo']]
+                              + [numero(cliente['faixas'][nome]) for nome in nomes]
+                              + [numero(cliente['total'])])
+    else:
+        escritor.writerow(['faixa', 'quantidade', 'valor', 'percentual'])
+        for faixa in resultado['faixas']:
+            escritor.writerow([f"{faixa['faixa']} dias", faixa['quantidade'], numero(faixa['valor']),
+                               str(faixa['percentual']).replace('.', ',')])
+        # Sem nada vencido as faixas ficam em 0%, e o total também
+        escritor.writerow(['total', resultado['total']['quantidade'], numero(resultado['total']['valor']),
+                           '100' if resultado['total']['valor'] else '0'])
+    return saida.getvalue()
+
+def reconstruir_rollup():
+    """
+    Recalcula o rollup receita_mensal do zero (ex: após importação manual de dados)
+    """
+    def reconstruir(conn):
+        cursor = conn.cursor()
+        reconstruir_receita_mensal(cursor)
+        return cursor.execute('SELECT COUNT(*) FROM receita_mensal').fetchone()[0]
+
+    # Pela thread escritora (escrita.py): a troca do rollup inteiro não disputa a trava
+    linhas = escrita.executar(reconstruir)
+    return {"success": True, "linhas": linhas}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'reconstruir':
+        init_db()
+        resultado = reconstruir_rollup()
+        print(f"✓ Rollup de receita reconstruído ({resultado['linhas']} linhas)")
+    else:
+        print("Uso: python relatorios.py reconstruir")
+        sys.exit(1)
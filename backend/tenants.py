@@ -0,0 +1,79 @@
+"""
+Tenants - Unidades (academias) com banco SQLite próprio
+Consolida consultas de todas as unidades e permite criar unidades pela linha de comando
+
+Uso:
+    python tenants.py listar
+    python tenants.py criar <id>
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import models
+
+# Máximo de unidades consultadas em paralelo na consolidação
+MAX_PARALELO = 8
+
+# ==================== CONSOLIDAÇÃO ====================
+
+def _estatisticas_da_unidade(tenant):
+    """
+    Estatísticas de uma unidade, lidas em snapshot no banco dela
+    """
+    try:
+        with database.usar_tenant(tenant), database.snapshot_leitura():
+            return {"tenant": tenant, "success": True, **models.obter_estatisticas()}
+    except Exception as e:
+        return {"tenant": tenant, "success": False, "error": str(e)}
+
+def estatisticas_consolidadas():
+    """
+    Executa obter_estatisticas() em todas as unidades em paralelo e soma os totais
+    """
+    tenants = database.listar_tenants()
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALELO, len(tenants)),
+                            thread_name_prefix='consolidacao') as executor:
+        unidades = list(executor.map(_estatisticas_da_unidade, tenants))
+
+    campos = ('total_clientes', 'pagamentos_pendentes', 'valor_em_aberto',
+              'pagamentos_vencidos', 'valor_recebido_mes', 'clientes_pagaram_mes')
+    total = {campo: 0 for campo in campos}
+    for unidade in unidades:
+        if unidade['success']:
+            for campo in campos:
+                total[campo] += unidade[campo] or 0
+
+    return {"total": total, "unidades": unidades}
+
+# ==================== ADMINISTRAÇÃO ====================
+
+def criar_tenant(tenant):
+    """
+    Cria o banco de uma nova unidade (com o admin padrão)
+    """
+    if not database._RE_TENANT.match(tenant or ''):
+        return {"success": False, "error": "Use apenas letras minúsculas, números, '-' e '_'"}
+    if database.tenant_valido(tenant) and tenant not in database.TENANTS_PERMITIDOS:
+        return {"success": False, "error": "Unidade já existe"}
+
+    database.init_db(database.caminho_banco(tenant))
+    return {"success": True, "tenant": tenant}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2 and sys.argv[1] == 'listar':
+        for nome in database.listar_tenants():
+            print(f"{nome}: {database.caminho_banco(nome)}")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'criar':
+        resultado = criar_tenant(sys.argv[2])
+        if resultado['success']:
+            print(f"✓ Unidade '{sys.argv[2]}' criada em {database.caminho_banco(sys.argv[2])}")
+        else:
+            print(f"✗ {resultado['error']}")
+            sys.exit(1)
+    else:
+        print("Uso: python tenants.py listar | criar <id>")
+        sys.exit(1)
@@ -21,10 +21,15 @@ function obterToken() {
 
 /**
  * Remove token do localStorage
+ * Apaga também as cópias locais das tabelas (sincronizarTabela): têm CPF e endereço
+ * dos clientes e não podem ficar no navegador do balcão depois da sessão
  */
 function removerToken() {
     localStorage.removeItem('token');
     localStorage.removeItem('usuario');
+    Object.keys(localStorage)
+        .filter(chave => chave.startsWith('copia_'))
+        .forEach(chave => localStorage.removeItem(chave));
 }
 
 /**
@@ -119,6 +124,46 @@ async function fetchAuth(url, options = {}) {
     }
 }
 
+/**
+ * Faz várias chamadas à API numa única requisição (POST /api/batch)
+ * @param {Array} requisicoes - Lista de {method, path, body}; path sem o API_URL (ex: '/clientes/1')
+ * @returns {Promise<Array>} Respostas na mesma ordem: {status, body}
+ */
+async function fetchLote(requisicoes) {
+    const response = await fetchAuth(`${API_URL}/batch`, {
+        method: 'POST',
+        body: JSON.stringify({
+            requisicoes: requisicoes.map(req => ({ ...req, path: `/api${req.path}` }))
+        })
+    });
+    const resultado = await response.json();
+    if (!resultado.success) {
+        throw new Error(resultado.error);
+    }
+    return resultado.respostas;
+}
+
+/**
+ * Assina o stream de eventos em tempo real da API (Server-Sent Events)
+ * O navegador reconecta sozinho e envia o Last-Event-ID para receber o que perdeu
+ * @param {Object} handlers - Funções por tipo de evento (pagamento, cliente, estatisticas, reset)
+ * @returns {EventSource|null} Conexão aberta ou null se o navegador não suportar
+ */
+function assinarEventos(handlers) {
+    const token = obterToken();
+    if (!token || typeof EventSource === 'undefined') return null;
+
+    const fonte = new EventSource(`${API_URL}/eventos?token=${encodeURIComponent(token)}`);
+
+    Object.entries(handlers).forEach(([tipo, handler]) => {
+        fonte.addEventListener(tipo, (evento) => {
+            handler(JSON.parse(evento.data || '{}'));
+        });
+    });
+
+    return fonte;
+}
+
 /**
  * Inicializa informações do usuário no header
  */
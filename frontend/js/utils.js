@@ -4,8 +4,9 @@
  * Contém funções auxiliares reutilizáveis
  */
 
-// URL base da API
-const API_URL = 'http://localhost:5000/api';
+// URL base da API (relativa: o frontend é servido pelo próprio Flask;
+// aberto direto do disco, continua apontando para o servidor local)
+const API_URL = window.location.protocol === 'file:' ? 'http://localhost:5000/api' : '/api';
 
 /**
  * Formata valor para moeda brasileira (R$)
@@ -175,4 +176,56 @@ function debounce(func, delay = 300) {
         clearTimeout(timeoutId);
         timeoutId = setTimeout(() => func.apply(this, args), delay);
     };
-}
\ No newline at end of file
+}
+
+/**
+ * Cópia local de uma tabela mantida pelo feed de mudanças (GET /api/mudancas)
+ * A primeira chamada baixa tudo; as seguintes trazem só o que mudou desde a anterior.
+ * A cópia fica no localStorage (por unidade) e sobrevive à troca de página; o logout
+ * (removerToken) apaga todas
+ * @param {string} tabela - 'clientes' ou 'pagamentos'
+ * @returns {Promise<Object[]>} Linhas da tabela (inclusive as inativas)
+ */
+async function sincronizarTabela(tabela) {
+    const usuario = obterUsuario() || {};
+    const chave = `copia_${tabela}_${usuario.tenant || 'principal'}`;
+
+    let copia = null;
+    try {
+        copia = JSON.parse(localStorage.getItem(chave));
+    } catch (error) {
+        copia = null;
+    }
+    if (!copia) {
+        copia = { seq: 0, linhas: {} };
+    }
+
+    while (true) {
+        const response = await fetchAuth(`${API_URL}/mudancas?tabelas=${tabela}&desde=${copia.seq}`);
+        const mudancas = await response.json();
+        if (!response.ok) {
+            throw new Error(mudancas.error || 'Erro ao sincronizar');
+        }
+
+        // Banco trocado (ex: backup restaurado): a cópia não vale mais
+        if (mudancas.recarregar) {
+            copia = { seq: 0, linhas: {} };
+            continue;
+        }
+
+        mudancas[tabela].forEach(linha => { copia.linhas[linha.id] = linha; });
+        mudancas.removidos.forEach(removido => { delete copia.linhas[removido.id]; });
+        copia.seq = mudancas.ate;
+        if (!mudancas.mais) {
+            break;
+        }
+    }
+
+    try {
+        localStorage.setItem(chave, JSON.stringify(copia));
+    } catch (error) {
+        // Sem espaço no navegador: na próxima vez baixa tudo de novo
+        localStorage.removeItem(chave);
+    }
+    return Object.values(copia.linhas);
+}